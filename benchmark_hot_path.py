@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# microbenchmarks of the operations every packet passes, each one is timed in isolation
+# every operation is called iterations times in a row, this is repeated and the fastest run counts
+# the results can be written as JSON and compared to a stored baseline, an operation which became slower by more
+# than the threshold is reported as a regression and the exit code is 1 then
+#
+# example: benchmark_hot_path.py --save-baseline baseline.json        before a change
+#          benchmark_hot_path.py --baseline baseline.json              after it
+
+import sys, time, json
+import numpy
+from optparse import OptionParser
+from gnuradio import gru
+from gnuradio.eng_option import eng_option
+from my_gnuradio.blks2impl import packet_utils
+import relaying
+import rs_codec
+try:
+    import reedsolomon
+except ImportError:
+    reedsolomon = None
+
+BATCH = 64  # frames handled by one call of the batch methods of rs_codec
+
+# returns the fastest time per call in seconds
+def measure(function, args, iterations, repeat):
+    best = None
+    loop = range(iterations)
+    for r in range(repeat):
+        start = time.time()
+        for i in loop:
+            function(*args)
+        delta = time.time() - start
+        if (best is None) or (delta < best):
+            best = delta
+    return best / iterations
+
+def benchmark(results, name, function, args, options):
+    if options.match and (options.match not in name):
+        return
+    per_call = measure(function, args, options.iterations, options.repeat)
+    results[name] = {'us_per_op': per_call * 1e6, 'ops_per_sec': 1.0 / per_call}
+    print "%40s: time: %8.2f us  ops/sec: %10.4g" % (name, per_call * 1e6, 1.0 / per_call)
+
+# sets up a station without flow graphs whose methods are benchmarked
+def make_station(member):
+    if member.timer is not None:
+        member.timer.stop()
+    member.verbose = False
+    return member
+
+def run_benchmarks(options):
+    results = {}
+    relaying.verbose = False
+    # the stations do not exchange frames with other ones, so they may use the codec written with NumPy if the module is missing
+    node = make_station(relaying.node(None, 'C', 'A', True, False, None, None, 1, 1, True, numpy_codec=reedsolomon is None))
+    relay = make_station(relaying.relay(None, True, True, False, None, None, 1, 1, numpy_codec=reedsolomon is None))
+    coder = node.mychannelcoder
+    header = node.myheader
+    relay_header = relay.myheader
+    data = '5' * node.data_size
+
+    # packets as they are handled by a node and the relay
+    packet_a = header.create_header_node(1, len(data), False) + data
+    packet_b = relaying.protocol_header('B').create_header_node(32769, len(data), False) + data
+    request = relay_header.create_header_relay(chr(0), req_node='A')     # pure request without acknowledgement
+    data_with_crc = gru.gen_and_append_crc32(packet_a + '\0' * (coder.SIZE_DATA - 4 - len(packet_a)))
+    request_with_crc = gru.gen_and_append_crc32(request)
+    coded_data = coder.channel_encode(data_with_crc)
+    coded_request = coder.channel_encode(request_with_crc)
+    corrupted_data = coded_data[0:10] + chr(ord(coded_data[10]) ^ 0x55) + coded_data[11:]  # has to be decoded
+    frame = coder.add_physical_header(coded_data)
+
+    benchmark(results, "wrap_in_frame", node.wrap_in_frame, (packet_a,), options)
+    benchmark(results, "channel_encode RS(255,223)", coder.channel_encode, (data_with_crc,), options)
+    benchmark(results, "channel_encode RS(12,8)", coder.channel_encode, (request_with_crc,), options)
+    benchmark(results, "channel_decode RS(255,223)", coder.channel_decode, (coded_data,), options)
+    benchmark(results, "channel_decode RS(255,223) 1 error", coder.channel_decode, (corrupted_data,), options)
+    benchmark(results, "channel_decode RS(12,8)", coder.channel_decode, (coded_request,), options)
+    benchmark(results, "gru.gen_and_append_crc32", gru.gen_and_append_crc32, (packet_a,), options)
+    benchmark(results, "gru.check_crc32", gru.check_crc32, (data_with_crc,), options)
+    benchmark(results, "packet_utils.make_packet", packet_utils.make_packet, (frame, 2, 1), options)
+    benchmark(results, "packet_utils.unmake_packet", packet_utils.unmake_packet, (coded_data,), options)
+    benchmark(results, "network_code.xor", node.mynetworkcoder.xor, (packet_a[3:], packet_b[3:]), options)
+    benchmark(results, "protocol_header.create_header_node", header.create_header_node, (1, len(data), False), options)
+    benchmark(results, "protocol_header.create_header_relay", relay_header.create_header_relay, (packet_a[3], False, False, packet_a[1:3], '', False, 'A'), options)
+    benchmark(results, "protocol_header.parse", header.parse, (packet_a,), options)
+    benchmark(results, "relay.assemble_data_pkt", relay.assemble_data_pkt, (packet_a, False, False), options)
+    benchmark(results, "relay.assemble_data_pkt nc", relay.assemble_data_pkt, (packet_a, True, False, packet_b), options)
+    benchmark_codecs(results, data_with_crc, options)
+    return results
+
+# the Reed-Solomon codec of rs_codec.py compared to the reedsolomon module (if it is installed), a batch counts as one operation
+def benchmark_codecs(results, data_with_crc, options):
+    codecs = [("rs_codec", rs_codec.Codec)]
+    if reedsolomon is not None:
+        codecs.append(("reedsolomon", reedsolomon.Codec))
+    batch = rs_codec.Codec(255, 223).encode_batch(numpy.frombuffer(data_with_crc * BATCH, numpy.uint8).reshape(BATCH, 223))
+    batch[0:BATCH:2, 10] ^= 0x55    # every second frame has an error
+    for (name, codec) in codecs:
+        data = codec(255, 223)
+        coded = data.encode(data_with_crc)
+        corrupted = coded[0:10] + chr(ord(coded[10]) ^ 0x55) + coded[11:100] + chr(ord(coded[100]) ^ 0x0f) + coded[101:]
+        request = codec(12, 8)
+        benchmark(results, name + " encode RS(255,223)", data.encode, (data_with_crc,), options)
+        benchmark(results, name + " decode RS(255,223)", data.decode, (coded,), options)
+        benchmark(results, name + " decode RS(255,223) 2 errors", data.decode, (corrupted,), options)
+        benchmark(results, name + " encode RS(12,8)", request.encode, (data_with_crc[0:8],), options)
+        benchmark(results, name + " decode RS(12,8)", request.decode, (request.encode(data_with_crc[0:8]),), options)
+    data = rs_codec.Codec(255, 223)
+    benchmark(results, "rs_codec encode_batch %d x RS(255,223)" % (BATCH), data.encode_batch, (batch[:, 0:223],), options)
+    benchmark(results, "rs_codec decode_batch %d x RS(255,223)" % (BATCH), data.decode_batch, (batch,), options)
+
+# compares the results to a baseline, returns the names of the operations which became slower by more than threshold (in percent)
+def compare(results, baseline, threshold):
+    regressions = []
+    print
+    print "%40s  %10s  %10s  %8s" % ("operation", "baseline", "now", "change")
+    for name in sorted(results.keys()):
+        if name not in baseline:
+            print "%40s  %10s  %8.2f us  %8s" % (name, "-", results[name]['us_per_op'], "new")
+            continue
+        before = baseline[name]['us_per_op']
+        now = results[name]['us_per_op']
+        change = (now - before) / before * 100
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        else:
+            flag = ""
+        print "%40s  %8.2f us  %8.2f us  %+7.1f%%%s" % (name, before, now, change, flag)
+    return regressions
+
+def main():
+    parser = OptionParser(option_class=eng_option)
+    parser.add_option("-n", "--iterations", type="int", default=10000, help="calls of an operation per run [default=%default]")
+    parser.add_option("-r", "--repeat", type="int", default=5, help="runs of which the fastest counts [default=%default]")
+    parser.add_option("-k", "--match", default=None, help="only run the operations whose name contains this string")
+    parser.add_option("-o", "--output", default=None, help="write the results as JSON into this file")
+    parser.add_option("-b", "--baseline", default=None, help="compare the results to this file")
+    parser.add_option("-s", "--save-baseline", default=None, help="write the results into this file to serve as baseline")
+    parser.add_option("-t", "--threshold", type="float", default=10, help="slowdown in percent which counts as regression [default=%default]")
+    (options, args) = parser.parse_args()
+    if len(args) != 0:
+        parser.print_help()
+        sys.exit(1)
+
+    results = run_benchmarks(options)
+    report = {'time': time.time(), 'iterations': options.iterations, 'repeat': options.repeat, 'results': results}
+    for path in (options.output, options.save_baseline):
+        if path is not None:
+            output = open(path, 'w')
+            json.dump(report, output, indent=1, sort_keys=True)
+            output.close()
+
+    if options.baseline is not None:
+        baseline = json.load(open(options.baseline))['results']
+        regressions = compare(results, baseline, options.threshold)
+        if regressions != []:
+            print
+            print "%d operations are slower by more than %g%%: %s" % (len(regressions), options.threshold, ', '.join(regressions))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# channel coding in worker processes, so the Reed-Solomon code is not limited to a single core
+# the codec holds the GIL, so threads would not help and the frames are coded by a pool of processes instead
+# each worker gets a copy of the channel_code of the station when it is started
+# a burst is encoded as a whole, its frames are split among the workers and come back in their order
+# received frames are handed to the pool as they arrive, a frame whose CRC is correct without decoding (see
+# channel_code.clean_frame) is not sent to a worker, the others are decoded concurrently, a thread of the pool passes the
+# results to the callback in the order in which the frames arrived, at most window frames are in flight, then the
+# receiving thread waits
+# without worker processes (workers = 0, or if the pool cannot be started) everything is coded synchronously
+# a worker which dies loses its frame, so the results are only waited for TIMEOUT seconds per frame, then the frame is coded
+# synchronously, after MAX_TIMEOUTS timeouts the workers are stopped and all following frames are coded synchronously (the pool
+# replaces a dead worker, so the frames in between may succeed, but waiting for the lost ones stalls the station every time)
+
+import multiprocessing, signal, threading, Queue
+
+_coder = None   # the channel_code of a worker process
+
+def _init_worker(coder):
+    global _coder
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)   # the handler of the station must not run in a worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # Ctrl-C is handled by the station, which terminates the workers
+    _coder = coder
+
+def _encode(payload_with_crc):
+    return _coder.channel_encode(payload_with_crc)
+
+def _decode(payload_coded):
+    return _coder.correct_frame(payload_coded)
+
+# stands in for the result of a worker for a frame which was not sent to one (it needed no decoding or the workers were stopped)
+class _clean_result:
+    def __init__(self, payload_with_crc):
+        self.payload_with_crc = payload_with_crc
+
+    def get(self, timeout = None):
+        return self.payload_with_crc
+
+    def ready(self):
+        return True
+# end of class _clean_result
+
+class coding_pool:
+    WINDOW = 64     # received frames being decoded at the same time
+    TIMEOUT = 1.0   # in seconds, the longest time the result of a worker is waited for per frame
+    MAX_TIMEOUTS = 3    # timeouts after which the workers are stopped
+
+    # coder: the channel_code of the station, it is used by the workers and for coding synchronously
+    # callback: gets (payload_coded, payload_with_crc, trace) for every received frame, in the order of arrival
+    # workers: number of worker processes, None: one per core, 0: no workers
+    def __init__(self, coder, callback, workers = None, window = WINDOW):
+        self.coder = coder
+        self.callback = callback
+        self.pool = None
+        self.thread = None      # passes the decoded frames to the callback, None without workers
+        self.closed = False
+        self.lock = threading.Lock()
+        self.workers = 0
+        self.timeout = self.TIMEOUT
+        self.timeouts = 0       # results of workers which were not ready in time
+        self.failures = 0       # frames which were coded synchronously as a worker failed or did not respond
+        if workers != 0:
+            try:
+                if workers is None:
+                    workers = multiprocessing.cpu_count()
+                self.pool = multiprocessing.Pool(workers, _init_worker, (coder,))
+                self.workers = workers
+            except (OSError, ImportError, NotImplementedError), error:
+                print "Warning: channel coding processes could not be started (%s), coding synchronously!" % (error)
+        if self.pool is not None:
+            self.in_flight = Queue.Queue(window)    # (received frame, result of the worker, trace), in the order of arrival
+            self.thread = threading.Thread(target=self.run)
+            self.thread.setDaemon(1)
+            self.thread.start()
+
+    # returns the channel encoded frames of a burst in the same order
+    def encode(self, payloads):
+        pool = self.pool
+        if (pool is None) or (len(payloads) < 2):
+            return map(self.coder.channel_encode, payloads)
+        chunk = -(-len(payloads) // self.workers)   # frames per worker
+        try:
+            return pool.map_async(_encode, payloads, chunk).get(self.timeout * chunk)
+        except multiprocessing.TimeoutError:
+            self.timed_out()
+        except Exception:
+            pass
+        self.failures += len(payloads)
+        return map(self.coder.channel_encode, payloads)
+
+    # hands a received frame to a worker, without workers it is decoded and passed to the callback right away
+    # trace: the trace of the frame (see tracing.py) which is passed on to the callback
+    # this waits while window frames are in flight
+    def decode(self, payload_coded, trace = None):
+        if (self.thread is None) or self.closed:
+            self.callback(payload_coded, self.coder.channel_decode(payload_coded), trace)
+            return
+        pool = self.pool
+        payload_with_crc = self.coder.clean_frame(payload_coded)
+        if payload_with_crc is not None:    # it still waits for the frames before it
+            result = _clean_result(payload_with_crc)
+        elif pool is None:  # the workers were stopped, the thread of the pool still keeps the order
+            result = _clean_result(self.coder.correct_frame(payload_coded))
+        else:
+            try:
+                result = pool.apply_async(_decode, (payload_coded,))
+            except Exception:   # the workers were stopped meanwhile
+                result = _clean_result(self.coder.correct_frame(payload_coded))
+        self.in_flight.put((payload_coded, result, trace))
+
+    # passes the decoded frames to the callback in the order in which they arrived
+    def run(self):
+        in_flight = self.in_flight
+        callback = self.callback
+        while True:
+            item = in_flight.get()
+            if item is None:
+                break
+            (payload_coded, result, trace) = item
+            try:
+                if (self.pool is None) and not result.ready():  # the workers were stopped, so it would never be ready
+                    raise multiprocessing.TimeoutError
+                payload_with_crc = result.get(self.timeout)
+            except multiprocessing.TimeoutError:
+                if self.pool is not None:
+                    self.timed_out()
+                self.failures += 1
+                payload_with_crc = self.coder.channel_decode(payload_coded)
+            except Exception:
+                self.failures += 1
+                payload_with_crc = self.coder.channel_decode(payload_coded)
+            callback(payload_coded, payload_with_crc, trace)
+
+    # counts a timeout, the workers are stopped after MAX_TIMEOUTS
+    def timed_out(self):
+        self.timeouts += 1
+        if self.timeouts < self.MAX_TIMEOUTS:
+            return
+        self.lock.acquire()
+        try:
+            pool = self.pool
+            self.pool = None
+        finally:
+            self.lock.release()
+        if pool is not None:
+            print "Warning: channel coding processes do not respond, coding synchronously!"
+            pool.terminate()
+
+    def __len__(self):
+        if self.thread is None:
+            return 0
+        return self.in_flight.qsize()
+
+    # stops the workers, frames which are still in flight are dropped
+    def close(self):
+        if (self.thread is None) or self.closed:
+            return
+        self.closed = True
+        self.lock.acquire()
+        try:
+            pool = self.pool
+            self.pool = None
+        finally:
+            self.lock.release()
+        if pool is not None:
+            pool.terminate()
+        try:
+            while True:
+                self.in_flight.get_nowait()
+        except Queue.Empty:
+            pass
+        self.in_flight.put(None)
+# end of class coding_pool
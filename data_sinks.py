@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# sinks for the data received by a node
+# file_sink writes a transferred file on its own thread, the receiving thread only puts the packets into a bounded queue
+# the position of a packet in the file follows from its packet ID, so packets which arrive out of order or are
+# retransmitted end up at the right place and a lost packet leaves a gap of zeros instead of shifting the rest of the file
+# the packets are collected and sorted, adjacent ones are written with a single system call
+# video_sink sends a video stream to a player over UDP from a jitter buffer, see below
+
+import os, socket, threading, time, Queue
+
+# turns the packet IDs of a node, which start again at the lowest one after the highest one, into sequence numbers counting the packets from the start
+# the sequence number closest to the highest one so far is taken, so packets may be late by half the range of the IDs
+class sequence_numbers:
+
+    def __init__(self, lower, upper):
+        self.lower = lower
+        self.id_range = upper - lower + 1
+        self.highest = 0    # highest sequence number so far
+
+    def number(self, packet_id):
+        id_range = self.id_range
+        highest = self.highest
+        number = highest - highest % id_range + ((packet_id - self.lower) % id_range)
+        if number > highest + id_range // 2:
+            number -= id_range
+        elif number < highest - id_range // 2:
+            number += id_range
+        if number > highest:
+            self.highest = number
+        return number
+# end of class sequence_numbers
+
+class file_sink:
+    QUEUE_SIZE = 65536          # packets waiting for the writer, they are dropped when the queue is full
+    BATCH_SIZE = 256 * 1024     # the collected packets are written when they hold this many bytes
+    FLUSH_INTERVAL = 0.5        # in seconds, the collected packets are written at the latest after this time
+
+    # packet_size: number of bytes of useful data in every packet (but the last one)
+    # lower, upper: lowest and highest packet ID of the data, the IDs start again at lower after upper
+    # fsync_interval: None: the file is synchronised when it is closed, 0: after every write, otherwise at most every fsync_interval seconds
+    def __init__(self, path, packet_size, lower, upper, fsync_interval = None, batch_size = BATCH_SIZE, queue_size = QUEUE_SIZE):
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+        self.packet_size = packet_size
+        self.sequence = sequence_numbers(lower, upper)
+        self.fsync_interval = fsync_interval
+        self.last_sync = time.time()
+        self.batch_size = batch_size
+        self.pending = {}   # sequence number -> data which was not written yet
+        self.pending_bytes = 0
+        self.queue = Queue.Queue(queue_size)
+        self.dropped = 0    # packets which were not written as the queue was full
+        self.written = 0    # bytes
+        self.writes = 0     # system calls for writing
+        self.closed = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(1)
+        self.thread.start()
+
+    # hands a packet to the writer, this never blocks
+    def write(self, packet_id, data):
+        try:
+            self.queue.put_nowait((packet_id, data))
+        except Queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        queue = self.queue
+        while True:
+            try:
+                item = queue.get(True, self.FLUSH_INTERVAL)
+            except Queue.Empty:
+                self.flush()
+                continue
+            if item is None:
+                break
+            (packet_id, data) = item
+            number = self.sequence.number(packet_id)
+            if number < 0:
+                continue    # a packet from before the start of the transfer
+            if number not in self.pending:
+                self.pending[number] = data
+                self.pending_bytes += len(data)
+            if self.pending_bytes >= self.batch_size:
+                self.flush()
+        self.flush()
+
+    # writes the collected packets, adjacent packets are joined into one block
+    def flush(self):
+        if self.pending != {}:
+            numbers = sorted(self.pending.keys())
+            pending = self.pending
+            size = self.packet_size
+            start = numbers[0]
+            block = [pending[start]]
+            previous = start
+            for number in numbers[1:]:
+                if (number == previous + 1) and (len(pending[previous]) == size):
+                    block.append(pending[number])
+                else:
+                    self.write_block(start, block)
+                    start = number
+                    block = [pending[number]]
+                previous = number
+            self.write_block(start, block)
+            self.pending = {}
+            self.pending_bytes = 0
+        if (self.fsync_interval is not None) and (time.time() - self.last_sync >= self.fsync_interval):
+            os.fsync(self.fd)
+            self.last_sync = time.time()
+
+    # writes the packets starting with sequence number start at their position in the file
+    def write_block(self, start, block):
+        data = ''.join(block)
+        os.lseek(self.fd, start * self.packet_size, os.SEEK_SET)
+        while data:
+            data = data[os.write(self.fd, data):]
+            self.writes += 1
+        self.written += sum([len(part) for part in block])
+
+    # writes the packets in the queue and closes the file
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        os.fsync(self.fd)
+        os.close(self.fd)
+        if self.dropped > 0:
+            print "Warning: %d received packets were not written as the writer could not keep up" % (self.dropped)
+# end of class file_sink
+
+# sends a received video stream to a player over UDP
+# the packets are kept in a jitter buffer for delay seconds and put back into the order of their packet IDs, then they are
+# joined into datagrams of at most datagram_size bytes which are sent at the rate of the stream, so bursts of the relay do not reach the player
+# the rate of the stream is measured from the received data, it is raised (lowered) a bit while the buffer holds more (less) than delay seconds
+# when the buffer runs empty (underrun) sending stops until it is filled again, packets which arrive after their turn are dropped (late)
+# and a missing packet is skipped when the packets behind it are due
+class video_sink:
+    DELAY = 0.5             # in seconds
+    DATAGRAM_SIZE = 1472    # fits into an Ethernet frame with IP and UDP header
+    QUEUE_SIZE = 65536      # packets waiting for the sending thread
+    RATE_WEIGHT = 0.2       # weight of the last second when the rate of the stream is measured
+
+    def __init__(self, address, lower, upper, delay = DELAY, datagram_size = DATAGRAM_SIZE, queue_size = QUEUE_SIZE):
+        self.address = address
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequence = sequence_numbers(lower, upper)
+        self.delay = delay
+        self.datagram_size = datagram_size
+        self.pending = {}       # sequence number -> (data, time of arrival)
+        self.pending_bytes = 0
+        self.next_number = None # sequence number of the next packet to be sent, None before the first one
+        self.playing = False
+        self.next_send = 0      # time when the next datagram is due
+        self.rate = None        # in byte/s
+        self.period_start = None
+        self.period_bytes = 0
+        self.queue = Queue.Queue(queue_size)
+        # statistics
+        self.dropped = 0        # packets which were not sent as the queue was full
+        self.late = 0
+        self.lost = 0           # missing packets which were skipped
+        self.underruns = 0
+        self.datagrams = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(1)
+        self.thread.start()
+
+    # hands a packet to the sending thread, this never blocks
+    def write(self, packet_id, data):
+        try:
+            self.queue.put_nowait((packet_id, data))
+        except Queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        queue = self.queue
+        while True:
+            now = time.time()
+            if self.playing:
+                timeout = max(0.0, self.next_send - now)
+            else:
+                timeout = 0.01
+            try:
+                item = queue.get(True, timeout)
+            except Queue.Empty:
+                item = ()
+            if item is None:
+                break
+            now = time.time()
+            if item != ():
+                self.insert(item[0], item[1], now)
+            if self.playing:
+                if now >= self.next_send:
+                    self.send_next(now)
+            elif (self.pending != {}) and (min([arrival for (data, arrival) in self.pending.values()]) + self.delay <= now):
+                if self.rate is None:   # the first period of the measurement is not over yet
+                    self.rate = self.period_bytes / max(now - self.period_start, self.delay)
+                self.playing = True
+                self.next_send = now
+        # the rest of the stream is sent without pacing
+        while self.pending != {}:
+            self.send_next(time.time(), True)
+
+    def insert(self, packet_id, data, now):
+        number = self.sequence.number(packet_id)
+        if (self.next_number is not None) and (number < self.next_number):
+            self.late += 1
+            return
+        if number not in self.pending:     # a duplicate is ignored
+            self.pending[number] = (data, now)  # an empty packet is never sent, it only keeps its place in the sequence
+            self.pending_bytes += len(data)
+        # the rate of the stream is measured in periods of one second
+        if self.period_start is None:
+            self.period_start = now
+        self.period_bytes += len(data)
+        if now - self.period_start >= 1.0:
+            rate = self.period_bytes / (now - self.period_start)
+            if self.rate is None:
+                self.rate = rate
+            else:
+                self.rate = (1 - self.RATE_WEIGHT) * self.rate + self.RATE_WEIGHT * rate
+            self.period_start = now
+            self.period_bytes = 0
+
+    # sends the next datagram, all: True if the missing packets are skipped without waiting
+    def send_next(self, now, all = False):
+        pending = self.pending
+        if self.next_number is None:
+            self.next_number = min(pending.keys())
+        parts = []
+        size = 0
+        while pending != {}:
+            number = self.next_number
+            if number in pending:
+                data = pending[number][0]
+                if size + len(data) > self.datagram_size:
+                    break
+                del pending[number]
+                if data != '':
+                    parts.append(data)
+                    size += len(data)
+                self.next_number = number + 1
+            else:
+                oldest = min(pending.keys())
+                if all or (pending[oldest][1] + self.delay <= now):     # the packets behind the missing ones are due
+                    self.lost += oldest - number
+                    self.next_number = oldest
+                else:
+                    break
+        if parts == []:
+            if pending == {}:
+                self.underruns += 1
+                self.playing = False
+            self.next_send = now + 0.01
+            return
+        self.pending_bytes -= size
+        try:
+            self.socket.sendto(''.join(parts), self.address)
+        except socket.error:
+            pass    # e.g. the player was closed
+        self.datagrams += 1
+        if all:
+            return
+        if self.rate > 0:
+            # the buffer is kept at about delay seconds of the stream by sending a bit faster or slower
+            fill = self.pending_bytes / (self.rate * self.delay)
+            rate = self.rate * min(2.0, max(0.5, fill))
+            self.next_send = max(self.next_send + size / rate, now - self.delay)
+        elif pending != {}:     # e.g. only empty packets were received for a while, the packets are sent delay seconds after their arrival
+            self.next_send = min([arrival for (data, arrival) in pending.values()]) + self.delay
+        else:
+            self.next_send = now
+
+    # sends the packets in the buffer and closes the socket
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        self.socket.close()
+        if self.dropped > 0:
+            print "Warning: %d received packets were not sent to the player as the sender could not keep up" % (self.dropped)
+# end of class video_sink
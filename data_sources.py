@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# sources of the data sent by a node, one packet is taken from a source at a time
+# every source has the same methods:
+#   read(size):   returns the next at most size bytes, '' when there is nothing left
+#   remaining():  returns the number of bytes which are left, None if the source never ends
+#   close()
+# a file is mapped into memory, so taking a packet needs no system call, the packet is a slice of the mapping
+# files which cannot be mapped (e.g. devices or pipes) are read in large chunks which are handed out packet by packet
+# random and constant data is prepared once, afterwards the same strings are handed out again without allocating new ones
+
+import mmap, os
+
+READAHEAD = 64 * 1024   # bytes which are fetched ahead of the current position
+PAGE_SIZE = mmap.PAGESIZE
+
+# data from a file which is mapped into memory
+# the pages ahead of the current position are touched before they are needed, so the kernel reads them in bigger steps
+class file_source:
+
+    def __init__(self, path, readahead = READAHEAD):
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.offset = 0
+        self.readahead = readahead
+        self.fetched = 0    # the pages up to this offset have been touched
+        if self.size > 0:
+            self.map = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+        else:
+            self.map = ''   # an empty file cannot be mapped
+
+    def read(self, size):
+        offset = self.offset
+        end = min(offset + size, self.size)
+        if end > self.fetched - (self.readahead // 2):
+            self.fetch(end)
+        self.offset = end
+        return self.map[offset:end]
+
+    # touches the pages from the last fetched one up to readahead bytes behind position
+    def fetch(self, position):
+        shared = self.map
+        end = min(position + self.readahead, self.size)
+        for page in xrange(self.fetched - self.fetched % PAGE_SIZE, end, PAGE_SIZE):
+            shared[page]
+        self.fetched = end
+
+    def remaining(self):
+        return self.size - self.offset
+
+    def close(self):
+        if self.size > 0:
+            self.map.close()
+        self.file.close()
+# end of class file_source
+
+# data from a file which cannot be mapped, it is read in chunks of readahead bytes
+class stream_source:
+
+    def __init__(self, path, readahead = READAHEAD):
+        self.file = open(path, 'rb')
+        self.readahead = readahead
+        self.chunk = ''
+        self.offset = 0     # in chunk
+        self.consumed = 0   # bytes handed out
+        try:
+            self.size = os.fstat(self.file.fileno()).st_size
+            if self.size == 0:
+                self.size = None    # a device or a pipe
+        except OSError:
+            self.size = None
+
+    def read(self, size):
+        if self.offset + size > len(self.chunk):
+            # the rest of the current chunk is kept for the next packet
+            self.chunk = self.chunk[self.offset:] + self.file.read(max(self.readahead, size))
+            self.offset = 0
+        offset = self.offset
+        data = self.chunk[offset:offset + size]
+        self.offset = offset + len(data)
+        self.consumed += len(data)
+        return data
+
+    def remaining(self):
+        if self.size is None:
+            return None
+        return max(0, self.size - self.consumed)
+
+    def close(self):
+        self.file.close()
+# end of class stream_source
+
+# random data, a number of random packets of each size is prepared once and handed out in turn
+class random_source:
+    BLOCKS = 256    # different packets of each size
+
+    def __init__(self, blocks = BLOCKS):
+        self.num = blocks
+        self.blocks = {}    # size -> list of packets
+        self.next = 0
+
+    def read(self, size):
+        try:
+            blocks = self.blocks[size]
+        except KeyError:
+            pool = os.urandom(size * self.num)
+            blocks = [pool[i * size:(i + 1) * size] for i in range(self.num)]
+            self.blocks[size] = blocks
+        self.next = (self.next + 1) % self.num
+        return blocks[self.next]
+
+    def remaining(self):
+        return None
+
+    def close(self):
+        self.blocks = {}
+# end of class random_source
+
+# the same packet over and over again
+class constant_source:
+
+    def __init__(self, value = '5'):
+        self.value = value
+        self.blocks = {}    # size -> packet
+
+    def read(self, size):
+        try:
+            return self.blocks[size]
+        except KeyError:
+            block = (self.value * (size // len(self.value) + 1))[0:size]
+            self.blocks[size] = block
+            return block
+
+    def remaining(self):
+        return None
+
+    def close(self):
+        self.blocks = {}
+# end of class constant_source
+
+# returns the source for the data of a file, it is mapped into memory if this is possible
+def open_file(path, readahead = READAHEAD):
+    try:
+        if os.path.isfile(path) and (os.path.getsize(path) > 0):
+            return file_source(path, readahead)
+    except EnvironmentError:   # e.g. the file cannot be mapped
+        pass
+    return stream_source(path, readahead)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# detects packets which were received before, e.g. over the direct link and from the relay, so every packet is stored only once
+# bit i of the bitmap is set if the packet i IDs before the highest one received so far was received
+# packet IDs wrap around inside the range [lower, upper] of the sender, a packet up to half of this range ahead of the highest one is
+# new, a packet which is more than window IDs behind it cannot be checked anymore and is treated as a duplicate
+class duplicate_filter:
+    WINDOW = 1024   # number of packet IDs behind the highest one which are remembered
+
+    def __init__(self, lower, upper, window = WINDOW):
+        self.span = upper - lower + 1
+        self.window = max(1, min(window, self.span // 2))
+        self.mask = (1 << self.window) - 1
+        self.highest = None     # highest packet ID received so far, None before the first packet
+        self.bitmap = 0
+        # variables for keeping statistical information
+        self.duplicates = 0
+        self.too_old = 0        # packets which were too far behind to be checked
+
+    # returns True if the packet is received for the first time, False if it is a duplicate
+    def first(self, packet_id):
+        highest = self.highest
+        if highest is None:
+            self.highest = packet_id
+            self.bitmap = 1
+            return True
+        distance = (packet_id - highest) % self.span
+        if distance == 0:
+            self.duplicates += 1
+            return False
+        if distance < self.span // 2:   # ahead of the highest packet
+            if distance < self.window:
+                self.bitmap = ((self.bitmap << distance) | 1) & self.mask
+            else:
+                self.bitmap = 1
+            self.highest = packet_id
+            return True
+        behind = self.span - distance
+        if behind >= self.window:
+            self.too_old += 1
+            self.duplicates += 1
+            return False
+        bit = 1 << behind
+        if self.bitmap & bit:
+            self.duplicates += 1
+            return False
+        self.bitmap |= bit
+        return True
+# end of class duplicate_filter
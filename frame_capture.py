@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# compact capture of the sent and received frames
+# a capture file starts with MAGIC and holds one record per frame: RECORD followed by the channel coded bytes of the frame
+# RECORD: length of the frame, time stamp, direction, result of decoding, flags of the header, packet ID(s) and length from the header
+# the file is only appended to, a second file (capture file + '.idx') holds the offset of each record for random access
+# the frames are handed to a background thread which does the parsing and writing, frames are dropped when it cannot keep up
+# when a file exceeds max_file_size the next one is started (capture file + '.1', '.2', ...)
+#
+# command line usage: frame_capture.py list <capture file>
+#                     frame_capture.py pcap <capture file> <pcap file>
+
+import mmap, os, sys, threading, time, Queue
+from struct import Struct
+
+MAGIC = 'RLYCAP01'
+RECORD = Struct('<IdBBBxHHH')
+INDEX = Struct('<Q')
+
+# directions
+RX = 0
+TX = 1
+
+# results of decoding a received frame, sent frames are always OK
+OK = 0
+CRC_ERROR = 1
+DECODE_FAILED = 2   # the channel code could not correct the errors
+MALFORMED = 3       # the CRC is correct but the header could not be parsed
+
+DIRECTION_NAMES = ('rx', 'tx')
+RESULT_NAMES = ('ok', 'crc error', 'decoding failed', 'malformed')
+
+# for pcap files, Wireshark needs a user DLT dissector for the frames
+PCAP_HEADER = Struct('<IHHiIII')
+PCAP_RECORD = Struct('<IIII')
+PCAP_PSEUDO_HEADER = Struct('!BBBBHHH')     # direction, result, flags, 0, packet ID, second packet ID, length
+DLT_USER0 = 147
+
+class frame_capture:
+    QUEUE_SIZE = 10000                      # frames waiting for the writer
+    MAX_FILE_SIZE = 1024 * 1024 * 1024      # in byte
+
+    # parse: function which returns (flags, packet ID, second packet ID or None, length) of a decoded packet, it may raise an exception
+    def __init__(self, path, parse, max_file_size = MAX_FILE_SIZE):
+        self.path = path
+        self.parse = parse
+        self.max_file_size = max_file_size
+        self.file_number = 0
+        self.queue = Queue.Queue(self.QUEUE_SIZE)
+        self.dropped = 0    # frames which were not captured as the queue was full
+        self.captured = 0
+        self.open_files(path)
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(1)
+        self.thread.start()
+
+    def open_files(self, path):
+        self.output = open(path, 'ab')
+        self.index = open(path + '.idx', 'ab')
+        self.output.seek(0, 2)
+        self.offset = self.output.tell()
+        if self.offset == 0:
+            self.output.write(MAGIC)
+            self.offset = len(MAGIC)
+
+    # hands a frame to the writer, this is called from the receiving and the sending path
+    # coded: the frame as it is sent over the air, decoded: the packet without CRC ('' if the channel code failed), ok: result of the CRC check
+    def record(self, direction, coded, decoded, ok):
+        try:
+            self.queue.put_nowait((time.time(), direction, coded, decoded, ok))
+        except Queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            self.write(*item)
+            if self.queue.empty():
+                self.output.flush()
+                self.index.flush()
+
+    def write(self, timestamp, direction, coded, decoded, ok):
+        (flags, packet_id, packet_id_b, length) = (0, 0, 0, 0)
+        if decoded == '':
+            result = DECODE_FAILED
+        else:
+            try:
+                (flags, packet_id, packet_id_b, length) = self.parse(decoded)
+                if packet_id_b is None:
+                    packet_id_b = 0
+                if ok:
+                    result = OK
+                else:
+                    result = CRC_ERROR
+            except:
+                if ok:
+                    result = MALFORMED
+                else:
+                    result = CRC_ERROR
+        if self.offset >= self.max_file_size:
+            self.next_file()
+        self.index.write(INDEX.pack(self.offset))
+        self.output.write(RECORD.pack(len(coded), timestamp, direction, result, flags, packet_id, packet_id_b, length))
+        self.output.write(coded)
+        self.offset += RECORD.size + len(coded)
+        self.captured += 1
+
+    def next_file(self):
+        self.output.close()
+        self.index.close()
+        self.file_number += 1
+        self.open_files('%s.%d' % (self.path, self.file_number))
+
+    # writes the frames in the queue and closes the files
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.output.close()
+        self.index.close()
+        if self.dropped > 0:
+            print "Warning: %d frames were not captured as the writer could not keep up" % (self.dropped)
+# end of class frame_capture
+
+# reads a capture file by mapping it into memory, the records are accessed by their number
+# (time stamp, direction, result, flags, packet ID, second packet ID, length, frame) is returned for each record
+class capture_reader:
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < len(MAGIC):
+            raise ValueError("not a capture file: " + path)
+        self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+        if self.map[0:len(MAGIC)] != MAGIC:
+            raise ValueError("not a capture file: " + path)
+        self.index_map = None   # the mapped index file
+        self.offsets = None     # offsets found by scanning the capture file if there is no usable index file
+        self.count = 0
+        if not self.map_index(path + '.idx', size):
+            self.scan(size)
+
+    # maps the index file, returns False if it does not exist or does not fit to the capture file
+    def map_index(self, path, size):
+        try:
+            index = open(path, 'rb')
+        except IOError:
+            return False
+        try:
+            count = os.fstat(index.fileno()).st_size // INDEX.size
+            if count == 0:
+                return False
+            self.index_map = mmap.mmap(index.fileno(), count * INDEX.size, access=mmap.ACCESS_READ)
+        finally:
+            index.close()
+        if INDEX.unpack_from(self.index_map, 0)[0] != len(MAGIC):
+            self.index_map.close()
+            self.index_map = None
+            return False
+        self.count = count
+        while (self.count > 0) and not self.complete(self.offset(self.count - 1), size):
+            self.count -= 1   # the writer was interrupted or has not written the record yet
+        return True
+
+    # finds the records by following their lengths
+    def scan(self, size):
+        self.offsets = []
+        offset = len(MAGIC)
+        while self.complete(offset, size):
+            self.offsets.append(offset)
+            offset += RECORD.size + RECORD.unpack_from(self.map, offset)[0]
+        self.count = len(self.offsets)
+
+    # True if the record at offset is completely in the file
+    def complete(self, offset, size):
+        if offset + RECORD.size > size:
+            return False
+        return offset + RECORD.size + RECORD.unpack_from(self.map, offset)[0] <= size
+
+    # returns the offset of a record in the capture file
+    def offset(self, number):
+        if self.offsets is not None:
+            return self.offsets[number]
+        return INDEX.unpack_from(self.index_map, number * INDEX.size)[0]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        if number < 0:
+            number += self.count
+        if (number < 0) or (number >= self.count):
+            raise IndexError("record number out of range")
+        offset = self.offset(number)
+        (frame_length, timestamp, direction, result, flags, packet_id, packet_id_b, length) = RECORD.unpack_from(self.map, offset)
+        start = offset + RECORD.size
+        return (timestamp, direction, result, flags, packet_id, packet_id_b, length, self.map[start:start + frame_length])
+
+    def __iter__(self):
+        for number in xrange(self.count):
+            yield self[number]
+
+    def close(self):
+        if self.index_map is not None:
+            self.index_map.close()
+        self.map.close()
+        self.file.close()
+# end of class capture_reader
+
+# writes the frames of a capture_reader into a pcap file
+# each frame is preceded by PCAP_PSEUDO_HEADER, so a dissector for DLT_USER0 can show the direction, the result of decoding and the header
+def export_pcap(reader, path):
+    output = open(path, 'wb')
+    try:
+        output.write(PCAP_HEADER.pack(0xa1b2c3d4, 2, 4, 0, 0, 65535, DLT_USER0))
+        for (timestamp, direction, result, flags, packet_id, packet_id_b, length, frame) in reader:
+            data = PCAP_PSEUDO_HEADER.pack(direction, result, flags, 0, packet_id, packet_id_b, length) + frame
+            seconds = int(timestamp)
+            output.write(PCAP_RECORD.pack(seconds, int((timestamp - seconds) * 1000000), len(data), len(data)))
+            output.write(data)
+    finally:
+        output.close()
+
+if __name__ == '__main__':
+    if (len(sys.argv) == 3) and (sys.argv[1] == 'list'):
+        reader = capture_reader(sys.argv[2])
+        for (timestamp, direction, result, flags, packet_id, packet_id_b, length, frame) in reader:
+            print "%.6f %s flags=0x%02x ID=%5d ID2=%5d length=%3d frame=%3d byte %s" % (timestamp, DIRECTION_NAMES[direction], flags, packet_id, packet_id_b, length, len(frame), RESULT_NAMES[result])
+        reader.close()
+    elif (len(sys.argv) == 4) and (sys.argv[1] == 'pcap'):
+        reader = capture_reader(sys.argv[2])
+        export_pcap(reader, sys.argv[3])
+        print "%d frames exported" % (len(reader))
+        reader.close()
+    else:
+        print "usage: frame_capture.py list <capture file>"
+        print "       frame_capture.py pcap <capture file> <pcap file>"
+        sys.exit(1)
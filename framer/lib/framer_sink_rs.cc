@@ -29,9 +29,20 @@
 #include <cstdio>
 #include <stdexcept>
 #include <string.h>
+#include <sys/time.h>
 
 #define VERBOSE 0
 
+// wall-clock time in seconds, it is passed as arg2 of each message
+// so that the application can measure how long the message waited in the queue
+static inline double
+current_time()
+{
+  struct timeval tv;
+  gettimeofday(&tv, 0);
+  return tv.tv_sec + tv.tv_usec * 1e-6;
+}
+
 inline void
 framer_sink_rs::enter_search()
 {
@@ -136,7 +147,7 @@ framer_sink_rs::work (int noutput_items,
 	      // build a zero-length message
 	      // NOTE: passing header field as arg1 is not scalable
 	      gr_message_sptr msg =
-		gr_make_message(0, d_packet_whitener_offset, 0, 0);
+		gr_make_message(0, d_packet_whitener_offset, current_time(), 0);
 	      
 	      d_target_queue->insert_tail(msg);		// send it
 	      msg.reset();  				// free it up
@@ -166,7 +177,7 @@ framer_sink_rs::work (int noutput_items,
 	    // build a message
 	    // NOTE: passing header field as arg1 is not scalable
 	    gr_message_sptr msg =
-	      gr_make_message(0, d_packet_whitener_offset, 0, d_packetlen_cnt);
+	      gr_make_message(0, d_packet_whitener_offset, current_time(), d_packetlen_cnt);
 	    memcpy(msg->msg(), d_packet, d_packetlen_cnt);
 
 	    d_target_queue->insert_tail(msg);		// send it
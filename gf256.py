@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# arithmetic in the finite field GF(2^8) with the primitive polynomial x^8 + x^4 + x^3 + x^2 + 1
+# addition is a XOR, multiplication and division are done with tables
+# MUL[a] holds the products of a with all field elements, so a whole row of bytes is multiplied by indexing MUL[a] with it
+
+from numpy import zeros, arange, bitwise_xor, uint8, intp
+
+PRIMITIVE_POLYNOMIAL = 0x11d
+
+EXP = zeros(512, intp)   # EXP[i] = 2^i, the table is doubled so that the sum of two logarithms needs no modulo operation
+LOG = zeros(256, intp)   # LOG[EXP[i]] = i, LOG[0] is undefined
+
+value = 1
+for i in range(255):
+    EXP[i] = value
+    LOG[value] = i
+    value <<= 1
+    if value & 0x100:
+        value ^= PRIMITIVE_POLYNOMIAL
+EXP[255:510] = EXP[0:255]
+del value, i
+
+MUL = zeros((256, 256), uint8)  # MUL[a, b] = a * b
+MUL[1:, 1:] = EXP[LOG[1:].reshape(255, 1) + LOG[1:].reshape(1, 255)]
+INV = zeros(256, uint8)         # INV[a] = 1 / a, INV[0] is undefined and set to 0
+INV[1:] = EXP[255 - LOG[1:]]
+
+# multiplies two field elements
+def mul(a, b):
+    return int(MUL[a, b])
+
+# returns the multiplicative inverse of a field element which must not be 0
+def inverse(a):
+    return int(INV[a])
+
+# multiplies each element of row (an uint8 array) with the field element factor, returns a new array
+def mul_row(factor, row):
+    return MUL[factor][row]
+
+# adds factor * row to target in place (target and row are uint8 arrays of the same length)
+def add_mul_row(target, row, factor):
+    if factor == 1:
+        bitwise_xor(target, row, target)
+    elif factor != 0:
+        bitwise_xor(target, MUL[factor][row], target)
+
+# returns the linear combinations of rows given by coefficients
+# coefficients: n x k uint8 array, rows: k x w uint8 array, the result is a n x w uint8 array
+def combine(coefficients, rows):
+    products = MUL[coefficients.reshape(coefficients.shape + (1,)), rows.reshape((1,) + rows.shape)]   # n x k x w
+    return bitwise_xor.reduce(products, axis=1)
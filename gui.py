@@ -22,8 +22,8 @@ from subprocess import Popen
 sys.argv = [""]
 sys.argv[0] = "GUI" # clue to distinguish in the alternating module whether there is a GUI or not
 from relaying import *
+from shared_statistics import shared_statistics
 import os   # operating system functionality (e.g. signals)
-import re   # regular expressions
 import ctypes   # for renaming the subprocess
 
 class App:
@@ -33,14 +33,23 @@ class App:
     # variables for basic set-up
     nc = None
     nc_button = None
+    rlnc = None
+    rlnc_button = None
     myself = None
     direct_link = None
     direct_button = None
+    arq = None
+    arq_button = None
     frequency = None
     rate = None
     tx_gain = None
     rx_gain = None
     side = None
+    metrics_port = None
+    trace_every = None
+    capture = None
+    coding_workers = None
+    numpy_codec = None
     
     # variables for relay control
     relay_frame = None
@@ -51,11 +60,15 @@ class App:
     label_id = None
     A_button = None
     B_button = None
+    id_entry = None
+    nodes = None
     node_frame = None
     file_source = None
     file_name_field = None
     file_name_button = None
     fixed_data = None
+    adaptive_burst = None
+    max_burst_size = None
     
     # variables for displaying results
     frame_errors = None
@@ -68,6 +81,15 @@ class App:
     running = False
     timeout_entry = None
     timeout_label = None
+    rtt = None
+    rtt_label = None
+    rtt_entry = None
+    rto = None
+    rto_label = None
+    rto_entry = None
+    current_burst = None
+    current_burst_label = None
+    current_burst_entry = None
     
     # variables for controlling the flow graph
     tb_tx = None
@@ -78,9 +100,16 @@ class App:
     cancel_button = None
     pid = None
 
+    # variables for reading the statistical information of the running gnuradio
+    master = None
+    statistics = None   # shared memory block written by the process running gnuradio
+    POLL_INTERVAL = 200 # in ms
+    poll_id = None      # the scheduled call of poll_statistics
+
     def __init__(self, master):
 
         master.title("GNU Radio Relaying")
+        self.master = master
 
         network_frame = Frame(master)
         network_frame.grid(sticky=NW)
@@ -101,11 +130,21 @@ class App:
         self.nc_button = Checkbutton(frame, state=NORMAL, text="Network Coding", variable=self.nc)
         self.nc_button.grid(sticky=NW)
 
+        # Checkbox for network coding with random linear combinations instead of XOR
+        self.rlnc = IntVar()
+        self.rlnc_button = Checkbutton(frame, state=NORMAL, text="Random linear network coding", variable=self.rlnc)
+        self.rlnc_button.grid(sticky=NW)
+
         # Checkbox for enabling usage of direct link
         self.direct_link = IntVar()
         self.direct_button = Checkbutton(frame, state=NORMAL, text="Direct link usage", variable=self.direct_link)
         self.direct_button.grid(sticky=NW)
 
+        # Checkbox for enabling the selective-repeat ARQ between the relay and the nodes
+        self.arq = IntVar()
+        self.arq_button = Checkbutton(frame, state=NORMAL, text="Selective-repeat ARQ", variable=self.arq)
+        self.arq_button.grid(sticky=NW)
+
         # list with different channel coding possiblities
         Label(frame, text="Channel Coding:").grid(sticky=NW)
         self.channel_code = IntVar()
@@ -140,6 +179,8 @@ class App:
         self.A_button.grid(sticky=NW)
         self.B_button = Radiobutton(id_frame, text="B", variable=self.node_id, value='B')
         self.B_button.grid(sticky=NW)
+        self.id_entry = Entry(id_frame, textvariable=self.node_id, width=3)    # for the IDs of further nodes
+        self.id_entry.grid(sticky=NW)
         
         # general parameters which must be equal for the hole network
         parameter_frame = Frame(network_frame)
@@ -155,6 +196,11 @@ class App:
         self.rate = StringVar()
         Entry(parameter_frame, textvariable=self.rate, width=5).grid(column=1, row=1, sticky=NW)
         self.rate.set('1024k')        #512 is also possible
+        # nodes of the network, they are paired in this order (A with B, C with D, ...)
+        Label(parameter_frame,  text="Nodes: ").grid(sticky=NW)
+        self.nodes = StringVar()
+        Entry(parameter_frame, textvariable=self.nodes, width=5).grid(column=1, row=2, sticky=NW)
+        self.nodes.set('AB')
 
         # setting of general settings for this station
         settings_frame = Frame(master)
@@ -183,6 +229,27 @@ class App:
         db.grid(sticky=NW)
         Radiobutton(add_settings_frame, text='B', variable=self.side, value='B', state=NORMAL).grid(sticky=NW)
         db.invoke()
+        # TCP port for serving the metrics on the local host
+        Label(add_settings_frame, text='Metrics port (0 = off):').grid(sticky=NW)
+        self.metrics_port = IntVar()
+        Entry(add_settings_frame, textvariable=self.metrics_port, width=5).grid(column=1, row=3, sticky=NW)
+        self.metrics_port.set(0)
+        # tracing of packets through the stack
+        Label(add_settings_frame, text='Trace every n-th packet (0 = off):').grid(sticky=NW)
+        self.trace_every = IntVar()
+        Entry(add_settings_frame, textvariable=self.trace_every, width=5).grid(column=1, row=4, sticky=NW)
+        self.trace_every.set(0)
+        # compact capture of all frames
+        self.capture = IntVar()
+        Checkbutton(add_settings_frame, text="Capture frames (into ./frames.cap)", variable=self.capture).grid(sticky=NW)
+        # channel coding in worker processes
+        Label(add_settings_frame, text='Channel coding processes (0 = off):').grid(sticky=NW)
+        self.coding_workers = IntVar()
+        Entry(add_settings_frame, textvariable=self.coding_workers, width=5).grid(column=1, row=6, sticky=NW)
+        self.coding_workers.set(0)
+        # Reed-Solomon codec of rs_codec.py, all stations have to use the same codec
+        self.numpy_codec = IntVar()
+        Checkbutton(add_settings_frame, text="Reed-Solomon codec written with NumPy", variable=self.numpy_codec).grid(sticky=NW)
         
         # setting of relay settings
         self.relay_frame= Frame(master)
@@ -190,7 +257,7 @@ class App:
         Label(self.relay_frame, text="Relay settings:", font=("Times", "12", "bold underline")).grid(sticky=NW)
         # timeout:
         Label(self.relay_frame, text="Timeoutlimit (in s): ").grid(sticky=NW)
-        self.timeout=IntVar()
+        self.timeout=DoubleVar()    # fractions of a second are possible
         Entry(self.relay_frame, textvariable=self.timeout, width=4).grid(column=1, row=1, sticky=NW)
         self.timeout.set(2)    # give a default value
 
@@ -205,7 +272,7 @@ class App:
         self.burst_size.set(1)
         Label(self.node_frame, text="Select data source:").grid(sticky=NW)
         self.type_transmission = StringVar()
-        self.fixed_data = Radiobutton(self.node_frame, text="Fixed data (213 times a 5)", variable=self.type_transmission, value='C', command=self.source_select)
+        self.fixed_data = Radiobutton(self.node_frame, text="Fixed data (a 5 in each byte)", variable=self.type_transmission, value='C', command=self.source_select)
         self.fixed_data.grid(sticky=NW)
         Radiobutton(self.node_frame, text="File transfer", variable=self.type_transmission, value='F', command=self.source_select).grid(sticky=NW)
         self.file_source = StringVar()
@@ -215,6 +282,33 @@ class App:
         self.file_name_button.grid(column=1, row=5, sticky=NW)
         Radiobutton(self.node_frame, text="Video transfer", variable=self.type_transmission, value='V', command=self.source_select).grid(sticky=NW)
         Radiobutton(self.node_frame, text="Random data (from /dev/urandom)", variable=self.type_transmission, value='R', command=self.source_select).grid(sticky=NW)
+        # adapting the burst size at runtime, the burst size above is the initial one then
+        self.adaptive_burst = IntVar()
+        Checkbutton(self.node_frame, text="Adaptive burst size", variable=self.adaptive_burst).grid(sticky=NW)
+        Label(self.node_frame, text="Max. burst size:").grid(sticky=NW)
+        self.max_burst_size = IntVar()
+        Entry(self.node_frame, textvariable=self.max_burst_size, width=5).grid(column=1, row=9, sticky=NW)
+        self.max_burst_size.set(32)
+        # generated traffic with the arrival model given in the field, see traffic.py
+        Radiobutton(self.node_frame, text="Generated traffic:", variable=self.type_transmission, value='G', command=self.source_select).grid(sticky=NW)
+        self.traffic_model = StringVar()
+        self.traffic_model_field = Entry(self.node_frame, textvariable=self.traffic_model, width=15)
+        self.traffic_model_field.grid(column=1, row=10, sticky=NW)
+        self.traffic_model.set('saturated')
+        self.traffic_model_field["state"] = DISABLED
+        # datagrams of local applications are tunnelled through the network, see tunnel.py
+        Radiobutton(self.node_frame, text="Datagram tunnel, listen on:", variable=self.type_transmission, value='T', command=self.source_select).grid(sticky=NW)
+        self.tunnel_listen = StringVar()
+        self.tunnel_listen_field = Entry(self.node_frame, textvariable=self.tunnel_listen, width=20)
+        self.tunnel_listen_field.grid(column=1, row=11, sticky=NW)
+        self.tunnel_listen.set('udp:127.0.0.1:7000')
+        Label(self.node_frame, text="Deliver to:").grid(sticky=NW)
+        self.tunnel_deliver = StringVar()
+        self.tunnel_deliver_field = Entry(self.node_frame, textvariable=self.tunnel_deliver, width=20)
+        self.tunnel_deliver_field.grid(column=1, row=12, sticky=NW)
+        self.tunnel_deliver.set('udp:127.0.0.1:7001')
+        self.tunnel_listen_field["state"] = DISABLED
+        self.tunnel_deliver_field["state"] = DISABLED
 
         # space
         space_frame = Frame(master)
@@ -270,6 +364,26 @@ class App:
         self.timeout_entry = Entry(result_frame_details, textvariable=self.num_timeouts, width=10)
         self.timeout_entry.grid(column=1, row=9, sticky=NW)
         self.num_timeouts.set("0")
+        # estimated round trip times and resulting timeouts for node A and B, only for relay
+        self.rtt_label = Label(result_frame_details, text="Smoothed round trip time per node (ms): ")
+        self.rtt_label.grid(sticky=NW)
+        self.rtt = StringVar()
+        self.rtt_entry = Entry(result_frame_details, textvariable=self.rtt, width=10)
+        self.rtt_entry.grid(column=1, row=10, sticky=NW)
+        self.rtt.set("0 / 0")
+        self.rto_label = Label(result_frame_details, text="Current timeout per node (ms): ")
+        self.rto_label.grid(sticky=NW)
+        self.rto = StringVar()
+        self.rto_entry = Entry(result_frame_details, textvariable=self.rto, width=10)
+        self.rto_entry.grid(column=1, row=11, sticky=NW)
+        self.rto.set("0 / 0")
+        # current burst size, only for a node
+        self.current_burst_label = Label(result_frame_details, text="Current burst size: ")
+        self.current_burst_label.grid(sticky=NW)
+        self.current_burst = StringVar()
+        self.current_burst_entry = Entry(result_frame_details, textvariable=self.current_burst, width=10)
+        self.current_burst_entry.grid(column=1, row=12, sticky=NW)
+        self.current_burst.set("0")
 
         # bottom part of the window
         lower_frame = Frame(master)
@@ -298,6 +412,7 @@ class App:
             self.label_id["state"]=DISABLED
             self.A_button["state"]=DISABLED
             self.B_button["state"]=DISABLED
+            self.id_entry["state"]=DISABLED
             # disable the frame with the node settings
             for child in self.node_frame.winfo_children():
                 child["state"]=DISABLED
@@ -307,10 +422,15 @@ class App:
             self.direct_button["state"] = DISABLED
             self.timeout_label["state"] = NORMAL
             self.timeout_entry["state"] = NORMAL
+            for widget in (self.rtt_label, self.rtt_entry, self.rto_label, self.rto_entry):
+                widget["state"] = NORMAL
+            self.current_burst_label["state"] = DISABLED
+            self.current_burst_entry["state"] = DISABLED
         else:
             self.label_id["state"]=NORMAL
             self.A_button["state"]=NORMAL
             self.B_button["state"]=NORMAL
+            self.id_entry["state"]=NORMAL
             # enable the frame with the node settings
             for child in self.node_frame.winfo_children():
                 child["state"]=NORMAL
@@ -322,6 +442,10 @@ class App:
                 self.direct_button["state"] = NORMAL
             self.timeout_label["state"] = DISABLED
             self.timeout_entry["state"] = DISABLED            
+            for widget in (self.rtt_label, self.rtt_entry, self.rto_label, self.rto_entry):
+                widget["state"] = DISABLED
+            self.current_burst_label["state"] = NORMAL
+            self.current_burst_entry["state"] = NORMAL
 
     def select_file(self):
         myPath = askopenfilename(filetypes=[("all formats", "*")])
@@ -334,6 +458,16 @@ class App:
         else:
             self.file_name_field["state"]=DISABLED
             self.file_name_button["state"]=DISABLED
+        if self.type_transmission.get() == 'G':   # only when generated traffic is selected
+            self.traffic_model_field["state"]=NORMAL
+        else:
+            self.traffic_model_field["state"]=DISABLED
+        if self.type_transmission.get() == 'T':   # only when the tunnel is selected
+            self.tunnel_listen_field["state"]=NORMAL
+            self.tunnel_deliver_field["state"]=NORMAL
+        else:
+            self.tunnel_listen_field["state"]=DISABLED
+            self.tunnel_deliver_field["state"]=DISABLED
 
     def runstate(self):
         if self.running == True:
@@ -350,6 +484,9 @@ class App:
             self.rx_num.set(str(0))
             self.rx_data.set(str(0))  # in byte
             self.num_timeouts.set(str(0))
+            self.rtt.set("0 / 0")
+            self.rto.set("0 / 0")
+            self.current_burst.set(str(0))
                 
             if self.myself.get() == 0:
                 relay = True
@@ -365,6 +502,15 @@ class App:
                 benchmark = False
             timeout = self.timeout.get()
             burst = self.burst_size.get()
+            if self.adaptive_burst.get() == 0:
+                adaptive_burst = False
+            else:
+                adaptive_burst = True
+            max_burst_size = self.max_burst_size.get()
+            if self.capture.get() == 0:
+                capture_file = None
+            else:
+                capture_file = "./frames.cap"
             if self.nc.get() == 0:
                 nc = False
             else:
@@ -373,20 +519,32 @@ class App:
                 direct_link = False
             else:
                 direct_link = True
+            if self.arq.get() == 0:
+                arq = False
+            else:
+                arq = True
+            if (self.rlnc.get() == 0) or (nc == False):
+                rlnc = False
+            else:
+                rlnc = True
+            if self.numpy_codec.get() == 0:
+                numpy_codec = False
+            else:
+                numpy_codec = True
             try:
                 if (self.type_transmission.get() == 'V') and (self.node_id.get() == 'B'):
                     self.video = True
                 else:
                     self.video = False
-                self.read, self.write = os.pipe() # these are file descriptors, not file objects
+                self.statistics = shared_statistics()  # has to be created before fork() so that both processes share it
                 self.pid = os.fork()
                 if self.pid != 0:    # parent
-                    signal.signal(signal.SIGCONT, self.update_statistic)
+                    self.poll_id = self.master.after(self.POLL_INTERVAL, self.poll_statistics)
                 else:           # child
                     self.myframe.quit()
                     libc = ctypes.CDLL("libc.so.6")
                     libc.prctl(15, 'GNURadio\x00', 0, 0, 0)
-                    main(relay, self.side.get(), self.frequency.get(), self.rate.get(), self.tx_gain.get(), self.rx_gain.get(), self.type_transmission.get(), nc, direct_link, bidirectional, benchmark, self, self.write, timeout, self.node_id.get(), burst, self.channel_code.get())
+                    main(relay, self.side.get(), self.frequency.get(), self.rate.get(), self.tx_gain.get(), self.rx_gain.get(), self.type_transmission.get(), nc, direct_link, bidirectional, benchmark, self, self.statistics, timeout, self.node_id.get(), burst, self.channel_code.get(), arq, self.nodes.get(), rlnc, adaptive_burst, max_burst_size, self.metrics_port.get(), self.trace_every.get(), capture_file, self.traffic_model.get(), self.tunnel_listen.get(), self.tunnel_deliver.get(), self.coding_workers.get(), numpy_codec)
             except:
                 print "Stopped due to exception!"
                 pass        # stopped due to user interaction or due to timeout
@@ -400,10 +558,15 @@ class App:
             if self.video == True:
                 Popen(["killall", "-9", "vlc"])   # shut down VLC
             try:
-                os.waitpid(self.pid, 0) # there will be a last update of the gui which will interrupt this
+                os.waitpid(self.pid, 0)
             except:
                 pass
             self.running = False
+            if self.poll_id is not None:
+                self.master.after_cancel(self.poll_id)
+                self.poll_id = None
+            self.poll_statistics()  # show the last update
+            self.statistics = None
             self.cancel_button["state"] = DISABLED
             self.run_button["state"] = NORMAL   # it is assumed that gnuradio can be started again
         else:
@@ -417,34 +580,38 @@ class App:
         if (self.dualway.get() == 0):
             self.nc_button["state"]=DISABLED
             self.nc.set(False)
+            self.rlnc_button["state"]=DISABLED
+            self.rlnc.set(False)
             self.direct_button["state"]=DISABLED
             self.direct_link.set(False)
         elif (self.dualway.get() == 1):
             self.nc_button["state"]=DISABLED
             self.nc.set(False)
+            self.rlnc_button["state"]=DISABLED
+            self.rlnc.set(False)
             if self.myself.get() != 0:
                 self.direct_button["state"]=NORMAL
         else:
             self.nc_button["state"]=NORMAL
+            self.rlnc_button["state"]=NORMAL
             if self.myself.get() != 0:
                 self.direct_button["state"]=NORMAL
             
-    def update_statistic(self, signum, frame):
-        try:
-            update = os.read(self.read, 100)    # read the update information from the pipe
-        except:
-            print "update failed"
-        #print "I read from pipe nr. " + str(self.read)
-        content = re.match(r"(\w+) (\w+) (\w+) (\w+\.\w+) (\w+) (\w+) (\w+)", update)    # 7 parts
-        if content is not None:
-            #print "updated my statistic!"
-            self.update_statistic_direct(int(content.group(1)), int(content.group(2)), int(content.group(3)), float(content.group(4)), int(content.group(5)), int(content.group(6)), int(content.group(7)))
-        else:
-            print str(update)
-            print "update failed"
+    # reads the statistical information from the shared memory block, this is repeated every POLL_INTERVAL ms while gnuradio is running
+    def poll_statistics(self):
+        self.poll_id = None
+        if self.statistics is None:
+            return
+        update = self.statistics.read()
+        if update is not None:
+            self.update_statistic_direct(*update)
+        if self.running:
+            self.poll_id = self.master.after(self.POLL_INTERVAL, self.poll_statistics)
             
     # function to update the display statistical information inside the GUI
-    def update_statistic_direct(self, rx_num, rx_right, tx_num, elapsed_time, rx_data, tx_data, timeouts = 0):
+    # extra: additional values sent by the relay: smoothed round trip time and timeout for each node (in ms)
+    #        or sent by a node: its current burst size
+    def update_statistic_direct(self, rx_num, rx_right, tx_num, elapsed_time, rx_data, tx_data, timeouts = 0, extra = []):
         #error rate
         if (rx_num is not 0) or (tx_num is not 0):  # only if any packet has been sent or received
             if rx_num != 0:
@@ -458,7 +625,12 @@ class App:
             #timeouts
             if self.myself.get() == 0:   # only the relay has a timeout
                 self.num_timeouts.set(str(timeouts))
-        else:   # data in pipe consits only of zeros, nothing to do
+                if extra != []:
+                    self.rtt.set(" / ".join([str(value) for value in extra[0::2]]))
+                    self.rto.set(" / ".join([str(value) for value in extra[1::2]]))
+            elif extra != []:
+                self.current_burst.set(str(extra[0]))
+        else:   # nothing has been sent or received yet, nothing to do
             pass
 
 root = Tk()
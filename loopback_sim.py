@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# simulation of the relay and the nodes in one process without USRPs
+# every station has the same transmit and receive path as in the field, only the USRP sink and source are replaced by a channel:
+# the samples sent by the stations are summed up for every receiver (without its own signal) and passed through gr.channel_model,
+# which adds noise, a frequency offset and a timing offset
+# the message sources of idle transmitters block, so the sum cannot be built by gr.add_cc, it is built by the loopback_channel thread
+# which fills in silence and keeps the samples flowing at the sample rate, so the timeouts of the relay behave as in the field
+# after the given duration the goodput and the latency of each flow and the frame error rate of each station are reported
+# the nodes send a sequence number and a time stamp at the beginning of their packets for measuring the latency
+#
+# example: loopback_sim.py --duration 30 --noise 0.05 --burst 4
+
+import sys, time, threading
+from optparse import OptionParser
+from struct import Struct
+from numpy import frombuffer, zeros, complex64
+
+from gnuradio import gr, modulation_utils
+from gnuradio.eng_option import eng_option
+import transmit_path
+import receive_path
+import relaying
+
+STAMP = Struct('!cId')  # source node, sequence number and time of creation at the beginning of the data of every packet
+
+# mixes the signals of the stations as the air would
+# gains[i][j] is the amplitude with which station i is received by station j
+class loopback_channel:
+    BLOCK_SIZE = 4096   # samples which are mixed at a time
+    QUEUE_LIMIT = 8     # blocks waiting for a receiver, the channel slows down when the receivers cannot keep up
+
+    def __init__(self, sample_rate, gains):
+        num = len(gains)
+        self.num = num
+        self.sample_rate = sample_rate
+        self.gains = gains
+        self.tx_queues = [gr.msgq() for i in range(num)]
+        self.rx_queues = [gr.msgq(self.QUEUE_LIMIT) for i in range(num)]
+        self.sinks = [gr.message_sink(gr.sizeof_gr_complex, queue, False) for queue in self.tx_queues]
+        self.sources = [gr.message_source(gr.sizeof_gr_complex, queue) for queue in self.rx_queues]
+        self.pending = [[] for i in range(num)]     # sample arrays of each station which are not on air yet
+        self.samples = 0    # samples which have been mixed
+        self.keep_running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(1)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.keep_running = False
+        self.thread.join(1.0)
+
+    # returns the next BLOCK_SIZE samples sent by station number i, zeros when it is silent
+    def next_block(self, i):
+        queue = self.tx_queues[i]
+        pending = self.pending[i]
+        while queue.count() > 0:
+            pending.append(frombuffer(queue.delete_head().to_string(), complex64))
+        size = self.BLOCK_SIZE
+        block = zeros(size, complex64)
+        filled = 0
+        while (pending != []) and (filled < size):
+            part = pending[0]
+            num = min(len(part), size - filled)
+            block[filled:filled + num] = part[0:num]
+            if num == len(part):
+                del pending[0]
+            else:
+                pending[0] = part[num:]
+            filled += num
+        return block
+
+    def run(self):
+        step = float(self.BLOCK_SIZE) / self.sample_rate
+        next_time = time.time()
+        stations = range(self.num)
+        while self.keep_running:
+            blocks = [self.next_block(i) for i in stations]
+            for j in stations:
+                mixed = zeros(self.BLOCK_SIZE, complex64)
+                for i in stations:
+                    gain = self.gains[i][j]
+                    if gain != 0:
+                        mixed += gain * blocks[i]
+                self.rx_queues[j].insert_tail(gr.message_from_string(mixed.tostring()))
+            self.samples += self.BLOCK_SIZE
+            next_time += step
+            delay = next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+# end of class loopback_channel
+
+# gives a station the interface of mytx_top_block, the paths of all stations are part of one flow graph
+class loopback_tx:
+    def __init__(self, txpath):
+        self.txpath = txpath
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+# end of class loopback_tx
+
+# packets of one node which were received by another one
+class flow_statistics:
+    def __init__(self):
+        self.sequence_numbers = set()   # duplicates are only counted once
+        self.data_rcvd = 0
+        self.latencies = []
+
+    def received(self, sequence_number, created, length):
+        if sequence_number not in self.sequence_numbers:
+            self.sequence_numbers.add(sequence_number)
+            self.data_rcvd += length
+            self.latencies.append(time.time() - created)
+# end of class flow_statistics
+
+# replaces the data source of a node by packets carrying a STAMP
+def stamp_data(member):
+    sequence = [0]
+    def get_data():
+        sequence[0] += 1
+        stamp = STAMP.pack(member.NODE_ID, sequence[0], time.time())
+        return stamp + '5' * (member.data_size - len(stamp))
+    member.get_data = get_data
+
+# counts the packets of the other nodes stored by a node in flows (source node -> flow_statistics)
+def count_stored_data(member, flows):
+    store = member.store_data
+    def store_data(data = '', pid = 0):
+        if len(data) >= STAMP.size:
+            (source, sequence_number, created) = STAMP.unpack(data[0:STAMP.size])
+            if source in flows:
+                flows[source].received(sequence_number, created, len(data))
+        return store(data, pid)
+    member.store_data = store_data
+
+# returns the value below which the given fraction of the sorted values lies
+def percentile(values, fraction):
+    if values == []:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def parse_options():
+    parser = OptionParser(option_class=eng_option, conflict_handler="resolve")
+    expert = parser.add_option_group("Expert")
+    mods = modulation_utils.type_1_mods()
+    demods = modulation_utils.type_1_demods()
+    parser.add_option("-m", "--modulation", type="choice", choices=mods.keys(), default='gmsk',
+                      help="Select modulation from: %s [default=%%default]" % (', '.join(mods.keys()),))
+    parser.add_option("", "--duration", type="eng_float", default=20, help="simulated time in seconds [default=%default]")
+    parser.add_option("", "--nodes", default='AB', help="IDs of the nodes [default=%default]")
+    parser.add_option("", "--burst", type="int", default=3, help="burst size of the nodes [default=%default]")
+    parser.add_option("", "--channel-code", type="int", default=1, help="0: no channel code, 1: RS [default=%default]")
+    parser.add_option("", "--numpy-codec", action="store_true", default=False, help="use the Reed-Solomon codec of rs_codec.py instead of the reedsolomon module")
+    parser.add_option("", "--no-nc", action="store_false", dest="nc", default=True, help="disable network coding")
+    parser.add_option("", "--arq", action="store_true", default=False, help="enable the selective-repeat ARQ")
+    parser.add_option("", "--rlnc", action="store_true", default=False, help="network coding with random linear combinations")
+    parser.add_option("", "--timeout", type="eng_float", default=1, help="timeout of the relay in seconds [default=%default]")
+    parser.add_option("", "--noise", type="eng_float", default=0.01, help="noise voltage at every receiver [default=%default]")
+    parser.add_option("", "--freq-offset", type="eng_float", default=0.0, help="frequency offset at every receiver, normalized to the sample rate [default=%default]")
+    parser.add_option("", "--timing-offset", type="eng_float", default=1.0, help="ratio of the sample clocks of receiver and transmitter [default=%default]")
+    parser.add_option("", "--direct-gain", type="eng_float", default=0.0, help="amplitude with which the nodes receive each other, 0: no direct link [default=%default]")
+    parser.add_option("", "--seed", type="int", default=3021, help="seed of the noise [default=%default]")
+    transmit_path.transmit_path.add_options(parser, expert)
+    receive_path.receive_path.add_options(parser, expert)
+    for mod in mods.values():
+        mod.add_options(expert)
+    for demod in demods.values():
+        demod.add_options(expert)
+    (options, args) = parser.parse_args()
+    return (options, mods[options.modulation], demods[options.modulation])
+
+def main():
+    (options, modulator, demodulator) = parse_options()
+    relaying.verbose = False
+    names = ['R'] + list(options.nodes)
+    num = len(names)
+    # every station hears all others, the nodes hear each other only with a direct link
+    gains = [[0.0] * num for i in range(num)]
+    for i in range(num):
+        for j in range(num):
+            if i == j:
+                continue
+            if (i == 0) or (j == 0):
+                gains[i][j] = 1.0
+            else:
+                gains[i][j] = options.direct_gain
+    direct_link = options.direct_gain != 0
+
+    sample_rate = options.bitrate * options.samples_per_symbol
+    channel = loopback_channel(sample_rate, gains)
+    tb = gr.top_block()
+    stations = []
+    flows = {}  # (source, destination) -> flow_statistics
+    for i in range(num):
+        txpath = transmit_path.transmit_path(modulator, options)
+        tb.connect(txpath, channel.sinks[i])
+        if i == 0:
+            member = relaying.relay(loopback_tx(txpath), options.nc, True, False, None, None, options.timeout, options.channel_code, options.arq, options.nodes, options.rlnc, bitrate=options.bitrate, numpy_codec=options.numpy_codec)
+        else:
+            member = relaying.node(loopback_tx(txpath), 'C', names[i], options.nc, direct_link, None, None, options.burst, options.channel_code, True,
+                                   arq=options.arq, nodes=options.nodes, rlnc=options.rlnc, numpy_codec=options.numpy_codec)
+            stamp_data(member)
+            received = {}
+            for source in options.nodes:
+                if source != names[i]:
+                    received[source] = flow_statistics()
+                    flows[(source, names[i])] = received[source]
+            count_stored_data(member, received)
+        rxpath = receive_path.receive_path(demodulator, member.rx_callback, options)
+        impairment = gr.channel_model(options.noise, options.freq_offset, options.timing_offset, [1.0 + 0j], options.seed + i)
+        tb.connect(channel.sources[i], impairment, rxpath)
+        stations.append(member)
+
+    print "simulating %s for %.1f s at %d samples/s" % (', '.join(names), options.duration, sample_rate)
+    tb.start()
+    channel.start()
+    start = time.time()
+    relay = stations[0]
+    for member in stations:
+        member.start_time = start
+    relay.lock.acquire()    # packets may already be received
+    relay.send_request()    # kick-off
+    relay.start_timeout()
+    relay.lock.release()
+    try:
+        time.sleep(options.duration)
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.time() - start
+    # the counters are taken before the flow graph is stopped
+    results = [(member.n_trans, member.n_rcvd, member.n_right) for member in stations]
+    air_time = channel.samples / float(sample_rate)
+    for member in stations:
+        if member.timer is not None:
+            member.timer.stop()
+    channel.stop()
+    tb.stop()
+
+    print
+    print "%.1f s simulated in %.1f s" % (air_time, elapsed)
+    for (source, destination) in sorted(flows.keys()):
+        flow = flows[(source, destination)]
+        latencies = sorted(flow.latencies)
+        if latencies != []:
+            mean = sum(latencies) / len(latencies)
+        else:
+            mean = 0.0
+        print "flow %s -> %s: goodput %.1f kbit/s, %d packets, latency mean %.1f ms, median %.1f ms, 95%% %.1f ms" % \
+              (source, destination, flow.data_rcvd * 8 / elapsed / 1000, len(latencies), mean * 1000, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000)
+    for j in range(num):
+        (n_trans, n_rcvd, n_right) = results[j]
+        heard = sum([results[i][0] for i in range(num) if gains[i][j] != 0])    # frames sent by the stations this one can hear
+        if heard > 0:
+            fer = 1.0 - float(n_right) / heard
+        else:
+            fer = 0.0
+        print "station %s: %d frames sent, %d of %d heard frames received, %d correct, FER %.4f" % (names[j], n_trans, n_rcvd, heard, n_right, fer)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# registry of counters, gauges and histograms which can be scraped over HTTP in the Prometheus text format
+# the value of a counter or a gauge can also be read from a function when it is scraped, so existing counters need no extra work in the hot path
+# a histogram has fixed buckets, rates and percentiles are calculated by the tool which scrapes it
+# updates are not locked, there should be only one thread updating a metric
+
+import threading, BaseHTTPServer
+from bisect import bisect_left
+
+# upper bounds of the buckets for latencies in seconds
+LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# returns labels (a dictionary) in the format of the text output
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(['%s="%s"' % (key, str(labels[key]).replace('\\', '\\\\').replace('"', '\\"')) for key in sorted(labels.keys())]) + '}'
+
+# returns a number in the format of the text output
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class counter:
+    TYPE = 'counter'
+
+    def __init__(self, name, help, labels = None, function = None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.function = function    # returns the value if it is given
+        self.value = 0
+
+    def inc(self, amount = 1):
+        self.value += amount
+
+    def get(self):
+        if self.function is not None:
+            return self.function()
+        return self.value
+
+    # returns the lines of the text output
+    def samples(self):
+        return [self.name + format_labels(self.labels) + ' ' + format_value(self.get())]
+# end of class counter
+
+class gauge (counter):
+    TYPE = 'gauge'
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount = 1):
+        self.value -= amount
+# end of class gauge
+
+class histogram:
+    TYPE = 'histogram'
+
+    def __init__(self, name, help, labels = None, buckets = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last bucket holds the values above the largest bound
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # returns the lines of the text output, the buckets are cumulative
+    def samples(self):
+        res = []
+        total = 0
+        for i in range(len(self.counts)):
+            total += self.counts[i]
+            if i < len(self.bounds):
+                bound = self.bounds[i]
+            else:
+                bound = float('inf')
+            labels = dict(self.labels or {})
+            labels['le'] = format_value(bound)
+            res.append(self.name + '_bucket' + format_labels(labels) + ' ' + str(total))
+        res.append(self.name + '_sum' + format_labels(self.labels) + ' ' + format_value(self.sum))
+        res.append(self.name + '_count' + format_labels(self.labels) + ' ' + str(self.count))
+        return res
+# end of class histogram
+
+class metrics_registry:
+
+    def __init__(self):
+        self.metrics = []   # in the order of registration
+        self.lock = threading.Lock()
+        self.server = None
+
+    # registers a metric, an already registered metric with the same name and labels is returned instead
+    def register(self, metric):
+        self.lock.acquire()
+        try:
+            for registered in self.metrics:
+                if (registered.name == metric.name) and (registered.labels == metric.labels):
+                    return registered
+            self.metrics.append(metric)
+        finally:
+            self.lock.release()
+        return metric
+
+    def counter(self, name, help, labels = None, function = None):
+        return self.register(counter(name, help, labels, function))
+
+    def gauge(self, name, help, labels = None, function = None):
+        return self.register(gauge(name, help, labels, function))
+
+    def histogram(self, name, help, labels = None, buckets = LATENCY_BUCKETS):
+        return self.register(histogram(name, help, labels, buckets))
+
+    # returns all metrics in the Prometheus text format
+    def text(self):
+        self.lock.acquire()
+        try:
+            metrics = list(self.metrics)
+        finally:
+            self.lock.release()
+        # the metrics with the same name but different labels have to be written together
+        families = {}
+        names = []
+        for metric in metrics:
+            if metric.name not in families:
+                families[metric.name] = []
+                names.append(metric.name)
+            families[metric.name].append(metric)
+        lines = []
+        for name in names:
+            family = families[name]
+            lines.append('# HELP %s %s' % (name, family[0].help))
+            lines.append('# TYPE %s %s' % (name, family[0].TYPE))
+            for metric in family:
+                try:
+                    lines.extend(metric.samples())
+                except:
+                    pass    # a function of a metric failed, e.g. as the flow graph does not exist
+        return '\n'.join(lines) + '\n'
+
+    # starts a thread serving the text output over HTTP, by default only on the local host
+    def start_server(self, port, address = '127.0.0.1'):
+        registry = self
+
+        class handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.text()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass    # no output for every scrape
+
+        self.server = BaseHTTPServer.HTTPServer((address, port), handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(1)
+        thread.start()
+        print "Info: serving metrics on http://%s:%d/" % (address, self.server.server_port)
+        return self.server
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+# end of class metrics_registry
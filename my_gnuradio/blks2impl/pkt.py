@@ -24,6 +24,11 @@ from gnuradio import gr
 import packet_utils
 import gnuradio.gr.gr_threading as _threading
 import framer
+import time
+try:
+    import tracing      # optional tracing of packets, part of the relaying application
+except ImportError:
+    tracing = None
 
 # /////////////////////////////////////////////////////////////////////////////
 #                   mod/demod with packets as i/o
@@ -80,6 +85,10 @@ class mod_pkts(gr.hier_block2):
         @param payload: data to send
         @type payload: string
         """
+        trace = None
+        if (tracing is not None) and (tracing.active is not None):
+            trace = tracing.active.current()
+            start = time.time()
         if eof:
             msg = gr.message(1) # tell self._pkt_input we're not sending any more packets
         else:
@@ -94,8 +103,13 @@ class mod_pkts(gr.hier_block2):
             msg = gr.message_from_string(pkt)
             if self._use_whitener_offset is True:
                 self._whitener_offset = (self._whitener_offset + 1) % 16
+        if trace is not None:
+            tracing.active.span(trace, 'make_packet', start)
+            start = time.time()
                 
         self._pkt_input.msgq().insert_tail(msg)
+        if trace is not None:
+            tracing.active.span(trace, 'msgq_insert', start)
 
 
 
@@ -161,6 +175,18 @@ class _queue_watcher_thread(_threading.Thread):
     def run(self):
         while self.keep_running:
             msg = self.rcvd_pktq.delete_head()
+            tr = None
+            if tracing is not None:
+                tr = tracing.active
+            if tr is not None:
+                dequeued = time.time()
+                trace = tr.begin('rx')
+                if (trace is not None) and (msg.arg2() > 0):  # the framer sink passes the time when it inserted the message as arg2
+                    tr.span(trace, 'framer_queue', msg.arg2(), dequeued)
             payload = packet_utils.unmake_packet(msg.to_string())
+            if (tr is not None) and (trace is not None):
+                tr.span(trace, 'unmake_packet', dequeued)
             if self.callback:
                 self.callback(payload)
+            if tr is not None:
+                tr.end()
@@ -16,7 +16,11 @@
 # You should have received a copy of the GNU General Public License
 # along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
 
-from reedsolomon import Codec
+try:
+    import reedsolomon
+except ImportError:     # only the Reed-Solomon codec written with NumPy can be used then, see rs_codec.py
+    reedsolomon = None
+import rs_codec
 from gnuradio import gr, gru, modulation_utils
 from gnuradio import usrp
 from gnuradio import eng_notation
@@ -24,21 +28,34 @@ from gnuradio.eng_option import eng_option
 from optparse import OptionParser
 
 import random, time, sys
-from struct import pack, unpack
+from struct import pack, unpack, Struct
 
 from subprocess import Popen
 
-import os, signal
-from numpy import frombuffer,bitwise_xor,byte, zeros, int8
-import socket
+import os, signal, threading
+from numpy import frombuffer,bitwise_xor,byte, zeros, int8, uint8, nonzero
+from numpy.random import randint
 
 # from current dir
 import usrp_transmit_path
 import usrp_receive_path
+from timer_service import timer_service
+from coding_pool import coding_pool
+from duplicate_filter import duplicate_filter
+import data_sources
+import data_sinks
+import traffic
+import tunnel
+from metrics import metrics_registry
+import tracing
+import frame_capture
+import gf256
+from gf256 import add_mul_row
 
 global verbose, test, measurement
 verbose = False # enables debug output
 measurement = False # stops the relay after 20000 transmissions
+TRACE_FILE = "./packet_trace.log"   # spans of the traced packets, one JSON object per line
 
 # path for transmitting data
 
@@ -163,60 +180,151 @@ class protocol_header:
     QB = 0x10       #source of packet is B
     NC = 0x20       # packet included network coded data
     LIB = 0x40      # last in burst bit, station will not send data immediatly after this packet
-    RESERVED = 0x80 # reserved bit
-    REQUEST_ADRESS_A = 0
-    REQUEST_ADRESS_B = 32768
+    ACK = 0x80      # packet carries an acknowledgement block of the selective-repeat ARQ
+    
+    # precompiled layouts of the header: first byte with the flags, packet ID(s), length of the useful data
+    HEADER = Struct('!BHB')         # node packets, relay packets which are not network-coded and requests
+    HEADER_NC = Struct('!BHHB')     # network-coded relay packets
+    REQUEST = Struct('!BH')         # header of a pure request without the length
+    ACK_BLOCK = Struct('!HI')       # acknowledgement: next expected packet ID, bitmap of the following packets
+    # network-coded relay packets in RLNC mode: first byte, lowest packet ID and bitmap of the combined packets of A, the same for B
+    # one coefficient for each combined packet (first the ones of A) and the coded data (length inclusive) follow
+    RLNC = Struct('!BHBHB')
+    RLNC_GENERATION_SIZE = 8        # maximum number of packets of a node which are combined, a bitmap covers the IDs lowest ID ... lowest ID + 7
+    RLNC_OVERHEAD = RLNC.size + 2 * RLNC_GENERATION_SIZE + 1 - HEADER_NC.size    # the useful data of the nodes has to be shorter by this number of bytes in RLNC mode
+    MASK_BITS = tuple([i for i in range(8) if mask & (1 << i)] for mask in range(256))  # the positions of the set bits of each bitmap
+
+    # addressing of the nodes
+    # the packet IDs are divided equally among the nodes, the first ID of the part of a node is the address of a pure request to it
+    # so the source of a packet follows from its packet ID, the source bits are only set for A and B
+    # requests to A and B are marked by their request bits, requests to other nodes have both request bits set and are always pure requests
+    # nodes are paired in the order of NODES (A with B, C with D, ...), the data of a node is sent to its partner
+    ID_SPACE = 65536
+    NODES = 'AB'            # IDs of the nodes in the network
+    span = None             # number of packet IDs per node
+    id_range = None         # for each node: (lowest, highest) packet ID of its data packets
+    request_address = None  # for each node: packet ID of a pure request to it
+    peer = None             # for each node: the node its data is sent to, None for the last node of an odd number of nodes
     
     packet_id = 0
     MY_REQUEST = 0x00   # default value ensures that for a relay there cannot be a request
+    MY_SOURCE = 0x00    # source flag which is set in the header of packets sent by a node
+    flag_table = None   # decoded flags for each of the 256 possible values of the first header byte
     
-    def __init__(self, node_id = None):   # node id is only neccessary if we have a node
+    def __init__(self, node_id = None, nodes = None):   # node id is only neccessary if we have a node
+        if nodes is not None:
+            self.NODES = nodes
+        self.span = self.ID_SPACE // len(self.NODES)
+        self.id_range = {}
+        self.request_address = {}
+        self.peer = {}
+        for i in range(len(self.NODES)):
+            current = self.NODES[i]
+            self.request_address[current] = i * self.span
+            self.id_range[current] = (i * self.span + 1, (i + 1) * self.span - 1)
+            if (i ^ 1) < len(self.NODES):
+                self.peer[current] = self.NODES[i ^ 1]
+            else:
+                self.peer[current] = None
         if node_id is not None:
             if node_id == 'A':
                 self.MY_REQUEST = self.RQA
+                self.MY_SOURCE = self.QA
             elif node_id == 'B':
                 self.MY_REQUEST = self.RQB
+                self.MY_SOURCE = self.QB
+            elif node_id in self.NODES:
+                self.MY_REQUEST = self.RQA | self.RQB   # the request address has to be checked as well
             else:
                 print "Error: No request bit is defined for this ID!"
         else:
             pass    # no node-id -> relay and nothing has to be done
+        # the flags of the first header byte only depend on its value, so they are decoded once for all values
+        self.flag_table = [self.decode_flags(header_first) for header_first in range(256)]
     
     # for checking if the current packet is the last one in a packet burst
     def check_for_burst_end(self, header_first):
-        if (header_first & self.LIB) != 0:
-            return True
-        else:
-            return False
+        return self.flag_table[header_first][3]
+    
+    # for checking if the current packet includes a request to any of the nodes
+    # as the relay only adds a request to the last packet of a burst, this marks the end of a burst of the relay
+    def check_for_request(self, header_first):
+        return self.flag_table[header_first][6]
     
     # a function used to analyse the content of the first byte of the header of a packet
     # returns a tuple of true/false values indicating the the values of the corresponding bits in the first header byte
-    # format of tuple: R-Bit, NC-Bit, Request of this station - Bit, Last In Burst - Bit, Source of packet is A - Bit, Source of packet is B - Bit
+    # format of tuple: R-Bit, NC-Bit, Request of this station - Bit, Last In Burst - Bit, Source of packet is A - Bit, Source of packet is B - Bit, Request of any station - Bit, ACK-Bit
     def analyse_header(self, header_first):
-        if (header_first & self.R_BIT) != 0:
-            r_bit = True
-        else:
-            r_bit = False
-        if (header_first & self.NC) != 0:
-            nc = True
-        else:
-            nc = False
-        if (header_first & self.MY_REQUEST) != 0:
-            request = True
-        else:
-            request = False
-        if (header_first & self.LIB) != 0:
-            last_in_burst = True
-        else:
-            last_in_burst = False
-        if (header_first & self.QA) != 0:
-            source_is_A = True
-        else:
-            source_is_A = False
-        if (header_first & self.QB) != 0:
-            source_is_B = True
-        else:
-            source_is_B = False
-        return (r_bit, nc, request, last_in_burst, source_is_A,  source_is_B)
+        return self.flag_table[header_first]
+    
+    # this function decodes the flags of the first header byte, it is only used to fill flag_table
+    def decode_flags(self, header_first):
+        r_bit = (header_first & self.R_BIT) != 0
+        nc = (header_first & self.NC) != 0
+        request = (self.MY_REQUEST != 0) and ((header_first & (self.RQA | self.RQB)) == self.MY_REQUEST)
+        last_in_burst = (header_first & self.LIB) != 0
+        source_is_A = (header_first & self.QA) != 0
+        source_is_B = (header_first & self.QB) != 0
+        any_request = (header_first & (self.RQA | self.RQB)) != 0
+        ack = (header_first & self.ACK) != 0
+        return (r_bit, nc, request, last_in_burst, source_is_A,  source_is_B, any_request, ack)
+    
+    # this function parses the whole header of a packet with a single call and without copying parts of the packet
+    # returns a tuple: (flags as returned by analyse_header, packet ID A, packet ID B, length of the useful data)
+    # packet ID A is the only packet ID (or the request address) if the packet is not network-coded, packet ID B is None then
+    # raises struct.error if the packet is too short to hold a header
+    def parse(self, payload):
+        flags = self.flag_table[ord(payload[0])]
+        if flags[1]:    # network-coded
+            (header_first, id_a, id_b, length) = self.HEADER_NC.unpack_from(payload)
+            return (flags, id_a, id_b, length)
+        (header_first, id_a, length) = self.HEADER.unpack_from(payload)
+        return (flags, id_a, None, length)
+    
+    # returns the node which sent the data packet with the given packet ID, None if the ID does not belong to the data of any node
+    def source_of(self, packet_id):
+        index = packet_id // self.span
+        if (index >= len(self.NODES)) or (packet_id == index * self.span):
+            return None
+        return self.NODES[index]
+    
+    # this function returns the tuple (lowest ID of A, bitmap of A, lowest ID of B, bitmap of B) which describes the packets of an RLNC generation
+    # ids_a, ids_b: sorted lists of the IDs of the packets, each one has to fit into a bitmap
+    def rlnc_generation(self, ids_a, ids_b):
+        res = ()
+        for ids in (ids_a, ids_b):
+            if ids == []:
+                res += (0, 0)
+            else:
+                mask = 0
+                for packet_id in ids:
+                    mask |= 1 << (packet_id - ids[0])
+                res += (ids[0], mask)
+        return res
+
+    # this function creates the header of an RLNC- packet without the coefficients
+    # generation: the tuple returned by rlnc_generation
+    # req_node: the node which should be requested to send data, only A and B are possible
+    def create_header_rlnc(self, generation, req_node = None):
+        first = self.R_BIT | self.NC | self.QA | self.QB
+        if req_node == 'A':
+            first |= self.RQA
+        elif req_node == 'B':
+            first |= self.RQB
+        elif req_node is not None:
+            print "Error: a request to node " + req_node + " has to be a pure request!"
+            sys.exit(1)
+        return self.RLNC.pack(first, generation[0], generation[1], generation[2], generation[3])
+
+    # this function parses the header of an RLNC- packet
+    # returns a tuple: (generation as returned by rlnc_generation, IDs of the packets of A, IDs of the packets of B, coefficients as a string, offset of the coded data)
+    # raises struct.error if the packet is too short to hold a header
+    def parse_rlnc(self, payload):
+        (first, base_a, mask_a, base_b, mask_b) = self.RLNC.unpack_from(payload)
+        ids_a = [base_a + i for i in self.MASK_BITS[mask_a]]
+        ids_b = [base_b + i for i in self.MASK_BITS[mask_b]]
+        offset = self.RLNC.size + len(ids_a) + len(ids_b)
+        return ((base_a, mask_a, base_b, mask_b), ids_a, ids_b, payload[self.RLNC.size:offset], offset)
     
     # this function creates the header of the relay- packet
     # the arguments are as follows:
@@ -227,8 +335,9 @@ class protocol_header:
     # packet_id_b: the ID of the packet formerly sent from B , which is now part of the network-coded packet
     # nc:     is the packet network-coded? this also means that all source bits are set
     # source: this parameter is only necessary if nc == False in order to indicate the source of the packet, valid values are 'A' and 'B'
-    def create_header_relay(self, length = '', req_a = False, req_b = False, packet_id_a = '', packet_id_b = '', nc = False, source = None):
-        header = ['', '', '', '', '', '']
+    # ack:    does an acknowledgement block follow the header? this is only allowed for pure requests
+    # req_node: the node which should be requested to send data, an alternative to req_a and req_b which also works for the other nodes
+    def create_header_relay(self, length = '', req_a = False, req_b = False, packet_id_a = '', packet_id_b = '', nc = False, source = None, ack = False, req_node = None):
         # check for errors first
         if (req_a == True) and (req_b == True):      #this should not occure!
             print "Error: only a single request is allowed!"
@@ -236,110 +345,64 @@ class protocol_header:
         if ((nc == True) and (packet_id_a == '')) or ((nc == True) and (packet_id_b == '')):
             print "Error: networkcoding is only allowed for two specified packets with a packet ID!"
             sys.exit(1)
+        if (packet_id_a == '') and (packet_id_b == '') and (req_a == False) and (req_b == False) and (req_node is None):
+            print "Error: a packet without data has to contain a request!"
+            sys.exit(1)
 
-        if req_a == True:   #request to A
-            header[0] = 0 | self.RQA | self.R_BIT
-            header[1:3] = pack('!H', self.REQUEST_ADRESS_A)
-        elif req_b == True: #request to B
-            header[0] = 0 | self.RQB | self.R_BIT
-            header[1:3] = pack('!H', self.REQUEST_ADRESS_B)
+        if req_a == True:
+            req_node = 'A'
+        elif req_b == True:
+            req_node = 'B'
+        if req_node == 'A':   #request to A
+            first = self.RQA | self.R_BIT
+        elif req_node == 'B': #request to B
+            first = self.RQB | self.R_BIT
+        elif req_node is not None:  # request to another node, it is addressed by the packet ID
+            if packet_id_a != '':
+                print "Error: a request to node " + req_node + " has to be a pure request!"
+                sys.exit(1)
+            first = self.RQA | self.RQB | self.R_BIT
         else:
-            header[0] = 0 | self.R_BIT
+            first = self.R_BIT
+        if req_node is not None:
+            address = self.request_address[req_node]
 
         if (packet_id_a == '') and (packet_id_b == ''):
-            header[3] = length    # pure request => length is 0
-        else:   # data packet
-            header[1] = packet_id_a[0]
-            header[2] = packet_id_a[1]
-            if nc == True:          # networkcoded packet
-                header[0] |= self.NC   # set NC-bit
-                # a network coded packet contains always data from both nodes
-                header[0] |= self.QA | self.QB
-                
-                header[3] = packet_id_b[0]
-                header[4] = packet_id_b[1]
-                header[5] = length
-            else:
-                header[3] = length
-                if source == 'A':
-                    header[0] |= self.QA
-                elif source == 'B':
-                    header[0] |= self.QB
-                else:
-                    print "Error: data has no source!"
-        header[0] = pack('!B', int(header[0]))
-        slist = [str(elt) for elt in header] # does (str(header[0]) + str(header[1]) + str(header[2]) + str(header[3]) + str(header[4]) + str(header[5])) more performant
-        return "".join(slist)
+            # pure request => length is 0 or the size of the acknowledgement block
+            if ack == True:
+                first |= self.ACK
+            return self.REQUEST.pack(first, address) + length
+        elif nc == True:          # networkcoded packet
+            # a network coded packet contains always data from both nodes
+            first |= self.NC | self.QA | self.QB
+            return ''.join((chr(first), packet_id_a, packet_id_b, length))
+        else:
+            if source == 'A':
+                first |= self.QA
+            elif source == 'B':
+                first |= self.QB
+            elif source is None:
+                print "Error: data has no source!"
+            return ''.join((chr(first), packet_id_a, length))
     # end of create_header_relay-------------------------------------------------------------------
     
     # this function creates the header of a node- packet
     # the length of the useful data has to be provided
-    def create_header_node(self, packet_id, length = 0, last_in_burst = False):
-        header = ['', '', '', '', '']
+    # ack: does an acknowledgement block follow the useful data? this is only allowed for the last packet in a burst
+    def create_header_node(self, packet_id, length = 0, last_in_burst = False, ack = False):
         # set the source flag in the first byte of the header
-        if self.RQA == self.MY_REQUEST: # node_id == A
-            first = 0 | self.QA
-        else:   # node_id == B
-            first = 0 | self.QB
         if last_in_burst == True:
-            first |= self.LIB   # set LIB bit
+            if ack == True:
+                return self.HEADER.pack(self.MY_SOURCE | self.LIB | self.ACK, packet_id, length)
+            return self.HEADER.pack(self.MY_SOURCE | self.LIB, packet_id, length)   # set LIB bit
         else:
-            pass    # do not set LIB bit
-        header[0] = pack('!B', first)
-        header[1:2] = pack('!H', packet_id)
-        header[3] = pack('!B', length)
-        slist = [str(elt) for elt in header]    # does (str(header[0]) + str(header[1]) + str(header[2]) + str(header[3]))
-        return "".join(slist)
+            return self.HEADER.pack(self.MY_SOURCE, packet_id, length)
     # end of create_header_node-------------------------------------------------------------------
 # end of class protocol_header
 
 # class for holding the functionality being specific for the relay
 
 class network_code:
-    # this function performs the network coding
-    # paramters:
-    # payload_A: the part of the packet from A (as a string) which should be network-coded
-    # payload_B: the part of the packet from B (as a string) which should be network-coded
-    def network_code(self, payload_A = '', payload_B=''):
-        size_a = len(payload_A)
-        size_b = len(payload_B)
-        # adjust both strings to the same length
-        if size_a == size_b:
-            pass    # no enlargment neccessary
-        elif size_a > size_b:
-            payload_B = self.padding(payload_B, size_a - size_b) #payload_B must be enlarged
-        else:   #size_a < size_b and payload_A must be enlarged
-            payload_A = self.padding(payload_A, size_b - size_a)
-
-        return self.xor(payload_A, payload_B)    # networkcode via xor between the two messages
-
-    def network_decode(self, payload = '', mypacket=''):
-        length_coded = self.xor(mypacket[0], payload[0])    #network decode the length of the useful data
-        length = unpack('!B',  length_coded)[0]
-        real_length = len(payload[1:])
-        mylength = unpack('!B',  mypacket[0])[0]
-        if real_length > mylength: 
-            mypacket = self.padding(mypacket, real_length - mylength)
-        if (len(mypacket[1:]) == 0) and (len(payload[1:]) == 0):
-            return "" # nothing to decode, both packets were empty
-        if len(mypacket[1:]) == len(payload[1:]):
-            coded_data = self.xor(mypacket[1:],  payload[1:])
-        else:
-            print "Error: false padding!"
-        data = self.remove_padding(coded_data, length)
-        return (str(length_coded) + data)
-
-    # this function adds 0s to a string in order to prepare it for networkcoding
-    # paramters:
-    # res:      the string which should get the additional 0s at its end
-    # number:   the number of 0s which should be added to res
-    def padding(self, res='', number=0):
-        return (res + zeros(number,int8).tostring())
-
-    #remove padding which was added before networkcoding
-    def remove_padding(self, payload = '', size=0):
-        return payload[0:size]
-
     # this function does a bytewise xor operation of two given input strings in order to networkcode them
     # paramters:
     # payload_A: the first part of the input data which should be combined with the second part by byte-wise XOR
@@ -358,8 +421,113 @@ class network_code:
             print "Error: arguments do not have equal length!"
             raise ValueError
         return res
+
+    # buffer which is reused for network coding whole bursts, it is enlarged when a burst does not fit into it
+    burst_buffer = zeros((0, 256), uint8)   # 256 columns hold the length byte and the maximum amount of useful data
+
+    # this function returns the first rows of the burst buffer, the buffer is only reallocated if it is too small
+    def get_burst_buffer(self, rows):
+        if rows > self.burst_buffer.shape[0]:
+            self.burst_buffer = zeros((max(rows, 2 * self.burst_buffer.shape[0]), 256), uint8)
+        return self.burst_buffer[0:rows]
+
+    # this function performs the network coding of a whole burst at once
+    # all payloads are copied into one preallocated 2-D array and combined by a single XOR operation
+    # paramters:
+    # payloads_A: list of the parts of the packets from A (as strings) which should be network-coded
+    # payloads_B: list of the parts of the packets from B (as strings), payloads_B[i] is combined with payloads_A[i]
+    # returns a 2-D array, row i is the network-coded combination of payloads_A[i] and payloads_B[i]
+    # the rows are views into the burst buffer, the shorter payload is padded with 0s (only the first max(len(payloads_A[i]), len(payloads_B[i])) bytes of a row are valid)
+    # the rows are only valid until the next call of network_code_burst or network_decode_burst
+    def network_code_burst(self, payloads_A, payloads_B):
+        num = len(payloads_A)
+        if num != len(payloads_B):
+            print "Error: both bursts must contain the same number of packets for network coding!"
+            raise ValueError
+        buffer = self.get_burst_buffer(2 * num)
+        buffer.fill(0)  # padding
+        coded = buffer[0:num]
+        other = buffer[num:2 * num]
+        for i in range(num):
+            coded[i, 0:len(payloads_A[i])] = frombuffer(payloads_A[i], dtype = uint8)
+            other[i, 0:len(payloads_B[i])] = frombuffer(payloads_B[i], dtype = uint8)
+        bitwise_xor(coded, other, coded)   # networkcode the whole burst in place
+        return coded
+
+    # this function network decodes all network-coded packets of a burst at once
+    # paramters:
+    # payloads:  list of the network-coded parts of the received packets (length inclusive)
+    # mypackets: list of the parts of our own packets (length inclusive) which are part of the network-coded packets
+    # returns a 2-D array, row i starts with the length of the decoded useful data followed by the data itself
+    # the rows are only valid until the next call of network_code_burst or network_decode_burst
+    def network_decode_burst(self, payloads, mypackets):
+        # the length byte of our own packets tells how much of them was used for network coding, everything behind it is not part of the coded data
+        mypackets = [mypacket[0:ord(mypacket[0]) + 1] for mypacket in mypackets]
+        return self.network_code_burst(payloads, mypackets)
+
+    # this function codes a generation of packets with random linear network coding (RLNC) over GF(256)
+    # paramters:
+    # sources: list of the parts of the packets (as strings) which should be combined (length inclusive)
+    # num:     number of coded packets which should be created
+    # returns a tuple (coefficients, coded, size): coefficients is a num x len(sources) array of random nonzero coefficients,
+    # row i of coded is the combination of the sources with the coefficients in row i of coefficients, its length is size (the longest source)
+    def rlnc_encode(self, sources, num):
+        k = len(sources)
+        buffer = self.get_burst_buffer(k)
+        buffer.fill(0)  # padding
+        size = 0
+        for i in range(k):
+            buffer[i, 0:len(sources[i])] = frombuffer(sources[i], dtype = uint8)
+            size = max(size, len(sources[i]))
+        coefficients = randint(1, 256, (num, k)).astype(uint8)
+        coded = gf256.combine(coefficients, buffer[:, 0:size])
+        return (coefficients, coded, size)
 # end of class network_code
 
+# class for decoding a generation of packets which were combined by random linear network coding
+# the received combinations are reduced by Gauss-Jordan elimination as soon as they arrive
+# when enough independent combinations were received, the rows of symbols are the decoded packets
+class rlnc_decoder:
+    def __init__(self, size):   # size: number of unknown packets
+        self.size = size
+        self.rank = 0
+        self.present = [False] * size   # present[i]: there is a row with its leading 1 in column i
+        self.coefficients = zeros((size, size), uint8)
+        self.symbols = zeros((size, 256), uint8)
+
+    # adds a combination of the unknown packets, coefficients and symbol (uint8 arrays) are modified
+    # returns True if the combination is independent of the ones which were added before
+    def add(self, coefficients, symbol):
+        present = self.present
+        # remove the columns which already have a leading 1
+        for j in range(self.size):
+            factor = coefficients[j]
+            if factor and present[j]:
+                add_mul_row(coefficients, self.coefficients[j], factor)
+                add_mul_row(symbol, self.symbols[j], factor)
+        columns = nonzero(coefficients)[0]
+        if len(columns) == 0:
+            return False    # nothing new
+        pivot = columns[0]
+        factor = gf256.INV[coefficients[pivot]]
+        coefficients = gf256.mul_row(factor, coefficients)
+        symbol = gf256.mul_row(factor, symbol)
+        # remove the new column from the other rows
+        for j in range(self.size):
+            factor = self.coefficients[j, pivot]
+            if factor and present[j]:
+                add_mul_row(self.coefficients[j], coefficients, factor)
+                add_mul_row(self.symbols[j], symbol, factor)
+        self.coefficients[pivot] = coefficients
+        self.symbols[pivot] = symbol
+        present[pivot] = True
+        self.rank += 1
+        return True
+
+    def complete(self):
+        return self.rank == self.size
+# end of class rlnc_decoder
+
 class channel_code:
     SIZE_DATA = 223 # 6 Byte header + 213 Byte payload + 4 Byte CRC
     SIZE_CODED_DATA = 255
@@ -367,8 +535,19 @@ class channel_code:
     SIZE_CODED_REQUEST = 12
     
     code_nr = 0
+    clean_frames = 0    # received frames whose CRC was correct without decoding
     
-    def __init__(self):
+    # numpy_codec: True = the Reed-Solomon codec of rs_codec.py is used instead of the reedsolomon module
+    # it is not known whether both codecs create the same code words, so all stations of a network have to use the same one
+    def __init__(self, numpy_codec = False):
+        if numpy_codec:
+            print "Warning: using the Reed-Solomon codec written with NumPy, stations using the reedsolomon module may not understand us!"
+            Codec = rs_codec.Codec
+        elif reedsolomon is not None:
+            Codec = reedsolomon.Codec
+        else:
+            print "Error: the reedsolomon module is not installed, the codec written with NumPy can be used instead if all stations use it (numpy_codec)!"
+            sys.exit(1)
         self.my_codec_data = Codec(self.SIZE_CODED_DATA, self.SIZE_DATA)
         self.my_codec_request = Codec(self.SIZE_CODED_REQUEST, self.SIZE_REQUEST)
         try:
@@ -401,29 +580,51 @@ class channel_code:
             print "ERROR: no channel code with this code number defined!"
         return ""
         
+    # the code is systematic, so a frame without errors starts with the packet and its CRC, then decoding is skipped
     def channel_decode(self, payload_with_crc):
         if self.code_nr == 0:   # no channel coding
             return payload_with_crc
         elif self.code_nr == 1: # RS
-            try:
-                if len(payload_with_crc) == self.SIZE_CODED_DATA:
-                    payload_with_crc = self.my_codec_data.decode(payload_with_crc)[0]
-                elif len(payload_with_crc) == self.SIZE_CODED_REQUEST:
-                    payload_with_crc = self.my_codec_request.decode(payload_with_crc)[0]
-                else:
-                    # wrong size detected
-                    print "Cannot decode packet due to wrong size!"
-                    print "size is: %d" % len(payload_with_crc)
-                    payload_with_crc = ""
-            except:
-                print "Too many errors or erasures!"
-                print payload_with_crc
-                payload_with_crc = ''
-            return payload_with_crc
+            clean = self.clean_frame(payload_with_crc)
+            if clean is not None:
+                return clean
+            return self.correct_frame(payload_with_crc)
         else:
             print "ERROR: no channel code with this code number defined!"
         return ""
 
+    # returns the packet with CRC of an RS-coded frame if the CRC is correct, otherwise None
+    def clean_frame(self, payload_coded):
+        length = len(payload_coded)
+        if length == self.SIZE_CODED_DATA:
+            payload_with_crc = payload_coded[0:self.SIZE_DATA]
+        elif length == self.SIZE_CODED_REQUEST:
+            payload_with_crc = payload_coded[0:self.SIZE_REQUEST]
+        else:
+            return None
+        if gru.check_crc32(payload_with_crc)[0]:
+            self.clean_frames += 1
+            return payload_with_crc
+        return None
+
+    # RS decodes a frame, returns the packet with CRC, '' if the errors could not be corrected
+    def correct_frame(self, payload_with_crc):
+        try:
+            if len(payload_with_crc) == self.SIZE_CODED_DATA:
+                payload_with_crc = self.my_codec_data.decode(payload_with_crc)[0]
+            elif len(payload_with_crc) == self.SIZE_CODED_REQUEST:
+                payload_with_crc = self.my_codec_request.decode(payload_with_crc)[0]
+            else:
+                # wrong size detected
+                print "Cannot decode packet due to wrong size!"
+                print "size is: %d" % len(payload_with_crc)
+                payload_with_crc = ""
+        except:
+            print "Too many errors or erasures!"
+            print payload_with_crc
+            payload_with_crc = ''
+        return payload_with_crc
+
     # add the channel encoded header
     def add_physical_header(self, payload):
         payload_len = len(payload)
@@ -434,15 +635,193 @@ class channel_code:
         #print "offset =", whitener_offset, " len =", payload_len, " val=", val
         return ''.join((pack('!HH', val, val), payload))
 
+# class for keeping the packets sent by a node until they are needed for network decoding
+# the packets are held in a fixed number of slots, the slot of a packet is its packet ID modulo the window size
+# a packet is removed when it was used for network decoding or when a newer packet needs its slot, i.e. when it falls out of the window
+class packet_store:
+    WINDOW_SIZE = 1024  # number of slots, must be larger than the number of packets sent before the relay network-codes them
+
+    def __init__(self, window_size = None):
+        if window_size is not None:
+            self.WINDOW_SIZE = window_size
+        self.ids = [None] * self.WINDOW_SIZE    # packet ID stored in each slot, None for an empty slot
+        self.packets = [None] * self.WINDOW_SIZE
+        self.size = 0   # number of occupied slots
+        # variables for keeping statistical information
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # packets which were removed without being used as they fell out of the window
+
+    def __len__(self):
+        return self.size
+
+    # stores a packet under its packet ID, an older packet in the same slot is evicted
+    def put(self, packet_id, packet):
+        slot = packet_id % self.WINDOW_SIZE
+        stored_id = self.ids[slot]
+        if stored_id is None:
+            self.size += 1
+        elif stored_id != packet_id:
+            self.evictions += 1
+        self.ids[slot] = packet_id
+        self.packets[slot] = packet
+
+    # returns the packet with the given packet ID and removes it from the store, None if it is not stored (anymore)
+    def pop(self, packet_id):
+        slot = packet_id % self.WINDOW_SIZE
+        if self.ids[slot] != packet_id:
+            self.misses += 1
+            return None
+        self.hits += 1
+        packet = self.packets[slot]
+        self.ids[slot] = None
+        self.packets[slot] = None
+        self.size -= 1
+        return packet
+
+    # returns the packet with the given packet ID without removing it, None if it is not stored (anymore)
+    def get(self, packet_id):
+        slot = packet_id % self.WINDOW_SIZE
+        if self.ids[slot] != packet_id:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.packets[slot]
+# end of class packet_store
+
+# classes for a selective-repeat ARQ between the relay and the nodes
+# an acknowledgement consists of the next expected packet ID (base) and a bitmap in which bit i is set if packet base + 1 + i was received
+# packet IDs wrap around inside the range [lower, upper] of the sender, so all distances are calculated modulo the size of this range
+
+# keeps track of the packets received from one sender and generates the acknowledgements for it
+class arq_receiver:
+    WINDOW = 32     # number of packets after base which can be acknowledged by the bitmap
+
+    def __init__(self, lower, upper):
+        self.lower = lower
+        self.upper = upper
+        self.span = upper - lower + 1
+        self.base = lower   # next expected packet ID, all packets before it were received or given up
+        self.bitmap = 0
+        # variables for keeping statistical information
+        self.duplicates = 0
+        self.skipped = 0    # packets which were given up as a packet too far ahead was received
+
+    # marks a packet as received, returns False if the packet was received before
+    def receive(self, packet_id):
+        distance = (packet_id - self.base) % self.span
+        if distance >= self.span // 2:  # behind base
+            self.duplicates += 1
+            return False
+        if distance > self.WINDOW:
+            # the bitmap cannot reach this packet, the missing packets in between are given up
+            self.skipped += distance - bin(self.bitmap).count('1')
+            self.base = packet_id
+            self.bitmap = 0
+            distance = 0
+        if distance == 0:
+            # move base to the next missing packet
+            self.base = self.next_id(self.base)
+            bitmap = self.bitmap
+            while bitmap & 1:
+                bitmap >>= 1
+                self.base = self.next_id(self.base)
+            self.bitmap = bitmap >> 1
+            return True
+        bit = 1 << (distance - 1)
+        if self.bitmap & bit:
+            self.duplicates += 1
+            return False
+        self.bitmap |= bit
+        return True
+
+    def next_id(self, packet_id):
+        if packet_id == self.upper:
+            return self.lower
+        return packet_id + 1
+
+    # returns True if a packet is missing which was sent before a received one
+    def has_gaps(self):
+        return self.bitmap != 0
+
+    # returns the acknowledgement as a tuple (base, bitmap)
+    def ack(self):
+        return (self.base, self.bitmap)
+# end of class arq_receiver
+
+# keeps the packets which were sent to one receiver until they are acknowledged
+class arq_sender:
+    CAPACITY = 256              # maximum number of unacknowledged packets, the oldest one is given up if it is exceeded
+    MAX_TRANSMISSIONS = 4       # a packet is given up after it was sent this number of times without being acknowledged
+
+    def __init__(self, lower, upper):
+        self.span = upper - lower + 1
+        self.unacked = {}   # packet ID -> [packet, number of transmissions]
+        self.order = []     # IDs of the unacknowledged packets in the order of their first transmission
+        # variables for keeping statistical information
+        self.retransmissions = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    # has to be called whenever a packet is sent (also for retransmissions)
+    def sent(self, packet_id, packet):
+        entry = self.unacked.get(packet_id)
+        if entry is not None:
+            entry[1] += 1
+            self.retransmissions += 1
+            return
+        if len(self.order) >= self.CAPACITY:
+            del self.unacked[self.order.pop(0)]
+            self.dropped += 1
+        self.unacked[packet_id] = [packet, 1]
+        self.order.append(packet_id)
+
+    # all packets sent so far were received
+    def ack_all(self):
+        self.unacked = {}
+        self.order = []
+
+    # processes an acknowledgement which covers all packets sent so far
+    # returns the packets which have to be retransmitted in the order of their first transmission
+    def ack(self, base, bitmap):
+        unacked = self.unacked
+        window = arq_receiver.WINDOW
+        half = self.span // 2
+        order = []
+        lost = []
+        for packet_id in self.order:
+            distance = (packet_id - base) % self.span
+            if (distance >= half) or ((distance != 0) and (distance <= window) and (bitmap & (1 << (distance - 1)))):
+                del unacked[packet_id]  # received
+            elif unacked[packet_id][1] >= self.MAX_TRANSMISSIONS:
+                del unacked[packet_id]
+                self.dropped += 1
+            else:
+                order.append(packet_id)
+                lost.append(unacked[packet_id][0])
+        self.order = order
+        return lost
+# end of class arq_sender
+
 # the class network_member is the top level class for the relay and the node class
 class network_member:
     # references to the flow graphs
     tb_tx = None
     tb_rx = None
     
-    # variables for enabling communication between this process and a GUI (if there is one)
-    parent_id = None
-    write_pipe = None
+    # block of shared memory for passing statistical information to a GUI (if there is one), None if there is none
+    statistics = None
+    
+    # registry of the metrics of this station and the histograms which are updated in the hot path
+    metrics = None
+    rx_service_time = None      # time for handling a received packet
+    frame_decode_time = None    # time for channel decoding a received frame and checking its CRC
+    frame_encode_time = None    # time for adding the CRC and channel encoding a frame
+    burst_assembly_time = None  # time for assembling all packets of a burst before they are sent
+    
+    capture = None      # a frame_capture which records the sent and received frames, None if they are not captured
     
     # variables for keeping fixed design parameters
     HEADER_LEN_NODE = 4
@@ -455,14 +834,12 @@ class network_member:
     data_rcvd = 0
     data_trans = 0
     n_trans = 0
-        
-    # variables for controlling the update frequency of statistical information displayed in the GUI
-    UPDATE = 100                            # if update_count reaches UPDATE an update is performed
-    update_count = 0                     # counter for controlling the update frequency of the gui
     
-    # instace of the network_code class for enabling the usage of network coding
-    mynetworkcoder = network_code()
-    mychannelcoder = channel_code()
+    # instaces of the network_code and the channel_code class, each station has its own ones as they keep state (buffers, code number)
+    mynetworkcoder = None
+    mychannelcoder = None
+    coding = None           # a coding_pool if the frames are channel coded by worker processes, otherwise None
+    timer = None            # a timer_service if the station needs timeouts (only the relay), otherwise None
     
     # time measurement
     start_time = 0
@@ -471,35 +848,87 @@ class network_member:
     
     # basic set-up criteria
     NETWORK_CODING = True
-    output_buffer = []
+    output_buffer = None    # the sent frames when there is no flow graph (test mode)
     verbose = False
     
-    def __init__(self, write_pipe, gui, channel_code_nr):
-        self.write_pipe = write_pipe
+    # coding_workers: number of processes for channel coding, None: one per core, 0: coding in the sending and the receiving thread
+    # numpy_codec: True = the Reed-Solomon codec written with NumPy is used instead of the reedsolomon module, see channel_code
+    def __init__(self, statistics, gui, channel_code_nr, coding_workers = 0, numpy_codec = False):
+        self.statistics = statistics
         signal.signal(signal.SIGTERM, self.stop_execution)
-        if gui is not None:
-            self.parent_id = os.getppid()
+        self.mynetworkcoder = network_code()
+        self.mychannelcoder = channel_code(numpy_codec)
         self.mychannelcoder.code_nr = channel_code_nr
+        if (channel_code_nr != 0) and (coding_workers != 0):   # the workers are started before the other threads
+            self.coding = coding_pool(self.mychannelcoder, self.rx_decoded, coding_workers)
+        self.output_buffer = []
+        self.metrics = metrics_registry()
         #print "Kanalcode Nr. " + str(channel_code_nr)
 
+    # writes the statistical information into the shared memory block which is polled by the GUI
+    # this needs no system call, so it is done for every packet
     def update_statistics(self, timeouts = 0):
-        update = (str(self.n_rcvd) + ' ' + str(self.n_right) + ' ' + str(self.n_trans) + ' ' + str((time.time())-self.start_time) + ' ' + str(self.data_rcvd) + ' ' + str(self.data_trans) + ' ' + str(timeouts))
-        try:
-            os.write(self.write_pipe, str(update))
-        except:
-            os.write(int(sys.argv[0]), str(update))
-        if self.verbose:
-            print "I write to pipe nr. " + str(self.write_pipe)
-            print "wrote into pipeline: " + str(update)
-        try:
-            os.kill(self.parent_id, signal.SIGCONT)    # inform the GUI that there is an update available
-        except:
-            os.kill(os.getppid(), signal.SIGCONT)
+        if self.statistics is not None:
+            self.statistics.write(self.n_rcvd, self.n_right, self.n_trans, time.time() - self.start_time, self.data_rcvd, self.data_trans, timeouts, self.extra_statistics())
+        
+    # returns a list of additional statistical values (integers) which are appended to the update for the GUI
+    def extra_statistics(self):
+        return []
+
+    # registers the metrics which relay and node have in common, has to be called at the end of __init__ of the subclass
+    def register_metrics(self):
+        metrics = self.metrics
+        metrics.counter('relaying_frames_received_total', 'Received frames', function = lambda: self.n_rcvd)
+        metrics.counter('relaying_frames_correct_total', 'Received frames with a correct CRC', function = lambda: self.n_right)
+        metrics.counter('relaying_frames_sent_total', 'Sent frames', function = lambda: self.n_trans)
+        metrics.counter('relaying_data_received_bytes_total', 'Received useful data in byte', function = lambda: self.data_rcvd)
+        metrics.counter('relaying_data_sent_bytes_total', 'Sent useful data in byte', function = lambda: self.data_trans)
+        metrics.gauge('relaying_tx_queue_depth', 'Frames waiting in the message queue of the transmitting flow graph', function = self.tx_queue_depth)
+        metrics.gauge('relaying_output_buffer_frames', 'Frames kept in the output buffer (test mode)', function = lambda: len(self.output_buffer))
+        self.rx_service_time = metrics.histogram('relaying_rx_callback_seconds', 'Time for handling a received frame')
+        self.frame_decode_time = metrics.histogram('relaying_frame_decode_seconds', 'Time for channel decoding a frame and checking its CRC')
+        metrics.counter('relaying_frames_clean_total', 'Received frames whose CRC was correct without channel decoding', function = lambda: self.mychannelcoder.clean_frames)
+        self.frame_encode_time = metrics.histogram('relaying_frame_encode_seconds', 'Time for adding the CRC and channel encoding a frame')
+        self.burst_assembly_time = metrics.histogram('relaying_burst_assembly_seconds', 'Time for assembling the packets of a burst')
+        if self.coding is not None:
+            metrics.gauge('relaying_coding_in_flight_frames', 'Received frames being decoded by the channel coding processes', function = lambda: len(self.coding))
+            metrics.counter('relaying_coding_failures_total', 'Frames coded synchronously as a channel coding process failed', function = lambda: self.coding.failures)
+
+    # returns the number of frames waiting in the message queue of the transmitting flow graph
+    def tx_queue_depth(self):
+        return self.tb_tx.txpath.packet_transmitter._pkt_input.msgq().count()
+
+    # returns (flags, packet ID, second packet ID, length) of a packet for the frame capture, this is called by the thread of the capture
+    def capture_header(self, payload):
+        (flags, packet_id, packet_id_b, length) = self.myheader.parse(payload)
+        return (ord(payload[0]), packet_id, packet_id_b, length)
+
+    # returns the trace of the packet which is handled by this thread, None if it is not traced or tracing is switched off
+    def current_trace(self):
+        tr = tracing.active
+        if tr is None:
+            return None
+        return tr.current()
+
+    # records the spans of channel decoding (from start until decoded) and of the CRC check (until now) if the received frame is traced
+    def trace_decoding(self, start, decoded):
+        tr = tracing.active
+        if tr is not None:
+            trace = tr.current()
+            if trace is not None:
+                tr.span(trace, 'channel_decode', start, decoded)
+                tr.span(trace, 'crc_check', decoded)
         
     # stops the execution
     def stop_execution(self, signum, frame):
         print "Got SIGTERM, stopping."
-        signal.alarm(0) # reset timeout
+        if self.timer is not None:
+            self.timer.stop()   # reset timeouts
+        if self.coding is not None:
+            self.coding.close()
+        tracing.stop()      # write the remaining spans
+        if self.capture is not None:
+            self.capture.close()
         # perform last update of statistic
         try:
             self.update_statistics(self.timeouts_all)   #this will fail for a node as there is no timeout-counter
@@ -517,8 +946,20 @@ class network_member:
             pass
         sys.exit(0)
     
-    # expects a packet
-    def wrap_in_frame(self, payload):
+    # called by the coding pool with a decoded frame, the trace of the frame is resumed in the thread of the pool
+    def rx_decoded(self, payload_coded, payload_with_crc, trace):
+        tr = tracing.active
+        if tr is None:
+            self.rx_callback(payload_coded, payload_with_crc)
+            return
+        tr.resume(trace)
+        try:
+            self.rx_callback(payload_coded, payload_with_crc)
+        finally:
+            tr.end()
+
+    # pads a packet to the size of a frame of the channel code (without the CRC)
+    def pad_payload(self, payload):
         if self.mychannelcoder.code_nr == 0:
             length= len(payload)
             if length <= 8: #12 - 4
@@ -544,31 +985,151 @@ class network_member:
                 "Error: Data too long!"
         else:
             print "ERROR: cannot wrap in frame because selected channel code is not configured here!"
-        
+        return payload
+
+    # expects a packet
+    def wrap_in_frame(self, payload):
+        start = time.time()
+        payload = self.pad_payload(payload)
         # append the CRC
         payload_with_crc = gru.gen_and_append_crc32(payload)
         # channel encode
+        tr = tracing.active
+        if tr is not None:
+            trace = tr.current()
+            if (trace is not None) and (trace[1] != 'tx'):
+                trace = None    # e.g. a request sent while a received packet is handled, it has no trace of its own
+            if trace is not None:
+                encode_start = time.time()
         payload_coded = self.mychannelcoder.channel_encode(payload_with_crc)
+        if (tr is not None) and (trace is not None):
+            tr.span(trace, 'channel_encode', encode_start)
+        if self.capture is not None:
+            self.capture.record(frame_capture.TX, payload_coded, payload, True)
         
         # add the channel encoded header
         payload_with_head = self.mychannelcoder.add_physical_header(payload_coded)
+        self.frame_encode_time.observe(time.time() - start)
+        if (tr is not None) and (trace is not None):
+            tr.span(trace, 'wrap_in_frame', start)
         return payload_with_head
+
+    # wraps the packets of a burst into frames like wrap_in_frame, the frames are channel encoded by the coding pool in parallel
+    # traces: the trace of each packet (None if it is not traced), the frame keeps it until it is sent
+    def wrap_burst(self, payloads, traces):
+        start = time.time()
+        payloads = map(self.pad_payload, payloads)
+        coded = self.coding.encode(map(gru.gen_and_append_crc32, payloads))
+        encoded = time.time()
+        add_physical_header = self.mychannelcoder.add_physical_header
+        tr = tracing.active
+        frames = []
+        for i in range(len(payloads)):
+            if self.capture is not None:
+                self.capture.record(frame_capture.TX, coded[i], payloads[i], True)
+            frame = add_physical_header(coded[i])
+            if (tr is not None) and (traces[i] is not None):
+                tr.span(traces[i], 'channel_encode', start, encoded)   # of the whole burst
+                frame = tr.attach(frame, traces[i])
+            frames.append(frame)
+        if frames != []:
+            self.frame_encode_time.observe((time.time() - start) / len(frames))
+        return frames
         
 # end of class network_member
 
+# class for estimating the time between sending a request to a node and receiving the first packet of its response
+# the timeout is derived from the smoothed round trip time and its variation like in TCP (Jacobson/Karels)
+# after consecutive timeouts the timeout is doubled until a new round trip time is measured
+class rtt_estimator:
+    ALPHA = 0.125   # gain of the smoothed round trip time
+    BETA = 0.25     # gain of the variation of the round trip time
+    K = 4           # weight of the variation in the timeout
+    MIN_TIMEOUT = 0.01  # in seconds
+    MAX_TIMEOUT = 10.0  # in seconds
+    MAX_BACKOFF = 6     # maximum number of doublings of the timeout
+
+    def __init__(self, initial_timeout):
+        self.srtt = None     # smoothed round trip time in seconds, None until the first measurement
+        self.rttvar = None   # variation of the round trip time in seconds
+        self.rto = min(max(initial_timeout, self.MIN_TIMEOUT), self.MAX_TIMEOUT)    # timeout without backoff
+        self.backoff = 0     # number of consecutive timeouts
+        self.samples = 0
+
+    # updates the estimates with a new measurement of the round trip time (in seconds)
+    def add_sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2.0
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.rto = min(max(self.srtt + self.K * self.rttvar, self.MIN_TIMEOUT), self.MAX_TIMEOUT)
+        self.backoff = 0
+        self.samples += 1
+
+    # has to be called when the timeout expired
+    def timeout_expired(self):
+        if self.backoff < self.MAX_BACKOFF:
+            self.backoff += 1
+
+    # returns the current timeout in seconds
+    def timeout(self):
+        return min(self.rto * (2 ** self.backoff), self.MAX_TIMEOUT)
+# end of class rtt_estimator
+
+# class for adapting the burst size of a node at runtime (additive increase, multiplicative decrease)
+# the burst grows by one packet after each burst which got through without losses while the source had data backlogged
+# it is halved when packets of a burst were lost or frames with errors were received, but it stays within the bounds
+class burst_controller:
+    DEFAULT_MAX_BURST_SIZE = 32     # with ARQ a burst must not be longer than the window of the receiver
+
+    def __init__(self, initial_size, min_size = 1, max_size = DEFAULT_MAX_BURST_SIZE):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial_size, self.min_size), self.max_size)
+        self.increases = 0
+        self.decreases = 0
+
+    # the last burst was received completely, backlogged: True if the source could have filled a longer burst
+    def success(self, backlogged):
+        if backlogged and (self.size < self.max_size):
+            self.size += 1
+            self.increases += 1
+
+    # packets of the last burst or frames received afterwards were lost
+    def loss(self):
+        if self.size > self.min_size:
+            self.size = max(self.size // 2, self.min_size)
+            self.decreases += 1
+# end of class burst_controller
+
 class relay (network_member):
-    TIMEOUTLIMIT = 2      #if this limit is exceeded we transmit a new request as we exepect package(s) was/were lost
+    TIMEOUTLIMIT = 2      #if this limit (in seconds, fractions are possible) is exceeded we transmit a new request as we exepect package(s) was/were lost
     MAX_TIMEOUTS = 10   # if the variable timeouts exceeds this limit we assume that the connection is totally broken and the program is interrupted
+    NODES = 'AB'                            # IDs of the nodes served by the relay
     NEXT_AIM = {'A': 'B', 'B': 'A'}      # list which defines the order of requests to be sent to the different nodes
     INITIAL_AIM = 'A'
     current_aim = 'A'                       # first time request for data transmission is sent to A by default
-    myheader = protocol_header()    # get an instance of the protocol header class
+    myheader = None     # an instance of the protocol header class
     timeouts = 0
     timeouts_all = 0
-    buffered_data = False
-    packet_buffer_A = []
-    packet_buffer_B = []
-    alarm_requested = False     # flag to indicate if an ALARM signal is currently requested
+    packet_buffer = None    # for each node: its received packets which have not been forwarded yet
+    rtt = None                  # an rtt_estimator for each node, the timeout depends on the node we are waiting for
+    response_time = None        # a histogram of the times between a request and the first packet of the response for each node
+    request_time = None         # estimated time when the last request was on the air, None if it was answered or if it was repeated after a timeout
+    bitrate = None              # bits per second on the air, the airtime of the queued frames is estimated from it, None if it is unknown
+    tx_idle_time = 0            # estimated time when the transmitter has sent all frames which were handed to it
+    FRAME_OVERHEAD = 15         # bytes added by the packet framer (preamble, access code, header and trailer)
+    timeout_timer = None        # the currently armed timeout, None if there is none
+    timeout_generation = 0      # incremented whenever the timeout is started or stopped, an expired timeout of an older generation is ignored
+    lock = None                 # serializes the handling of received packets and of timeouts as they run in different threads
+    ARQ = False                 # selective-repeat ARQ for the packets of the nodes
+    arq_rx = None               # an arq_receiver for the packets of each node
+    arq_tx = None               # an arq_sender for the packets forwarded to each node, None if no data is forwarded to the nodes
+    arq_uncertain = None        # for each node: True if a request to it or its response may have been lost, then the acknowledgement has to be sent explicitly
+    RLNC = False                # network coding by random linear combinations instead of XOR
+    RLNC_REDUNDANCY = 1         # number of coded packets per generation in addition to the number needed for decoding
 
     gui = None
     test_node = None
@@ -580,28 +1141,75 @@ class relay (network_member):
     BIDIRECTIONAL = True
     POINT2POINT = False
     
-    def __init__(self, tx, nc, bidirectional, point2point, gui, write_pipeline, timeout, channel_code_nr):
-        network_member.__init__(self, write_pipeline, gui, channel_code_nr)
+    def __init__(self, tx, nc, bidirectional, point2point, gui, statistics, timeout, channel_code_nr, arq = False, nodes = 'AB', rlnc = False, coding_workers = 0, bitrate = None, numpy_codec = False):
+        network_member.__init__(self, statistics, gui, channel_code_nr, coding_workers, numpy_codec)
+        self.timer = timer_service()    # timers can be armed and cancelled from the receiving thread as well as from any other thread
         global verbose
         self.verbose = verbose
+        self.NODES = nodes
+        self.myheader = protocol_header(None, nodes)
+        if (bidirectional == True) or (nc == True):
+            polled = nodes  # all nodes send data
+        else:
+            polled = nodes[0::2]    # only the first node of each pair sends data
+        if point2point == False:    # the data of a node without partner would be dropped, so polling it only wastes airtime
+            for current in polled:
+                if self.myheader.peer[current] is None:
+                    print "Warning: node " + current + " has no partner, so it is not polled!"
+            polled = [current for current in polled if self.myheader.peer[current] is not None]
+        if len(polled) == 0:
+            print "Error: there is no node to poll!"
+            sys.exit(1)
+        # the nodes are requested in turn
+        self.NEXT_AIM = dict([(polled[i], polled[(i + 1) % len(polled)]) for i in range(len(polled))])
+        self.INITIAL_AIM = polled[0]
         self.current_aim = self.INITIAL_AIM
-        # for receiver timeout:
-        signal.signal(signal.SIGALRM, self.timeout_handler)
+        self.packet_buffer = dict([(current, []) for current in nodes])
+        self.lock = threading.RLock()
         self.tb_tx = tx
         self.gui = gui
         self.NETWORK_CODING = nc
+        self.RLNC = nc and rlnc
         self.BIDIRECTIONAL = bidirectional
         self.POINT2POINT = point2point
-        self.TIMEOUTLIMIT = timeout
+        self.TIMEOUTLIMIT = timeout     # initial timeout until the round trip times have been measured
+        self.bitrate = bitrate
+        self.rtt = dict([(aim, rtt_estimator(timeout)) for aim in self.NEXT_AIM])
+        self.ARQ = arq
+        if arq:
+            id_range = self.myheader.id_range
+            self.arq_rx = dict([(aim, arq_receiver(id_range[aim][0], id_range[aim][1])) for aim in self.NEXT_AIM])
+            self.arq_uncertain = dict([(aim, False) for aim in self.NEXT_AIM])
+            if (point2point == False) and ((bidirectional == True) or (nc == True)):   # all nodes are polled, so they can acknowledge what we forwarded
+                # the packets forwarded to a node are the ones of its partner
+                peer = self.myheader.peer
+                self.arq_tx = dict([(aim, arq_sender(id_range[peer[aim]][0], id_range[peer[aim]][1])) for aim in nodes if peer[aim] is not None])
         if self.verbose:
             print "network coding is " + str(self.NETWORK_CODING)
+            print "RLNC is " + str(self.RLNC)
             print "bidirectional is " + str(self.BIDIRECTIONAL)
             print "point to point is " + str(self.POINT2POINT)
             print "ran through init"
-
-    # this function is called when a packet was received
-    def rx_callback(self, payload_coded):
-        signal.alarm(0)    #package recognised, therefore stop timeout
+        self.register_metrics()
+
+    # this function is called by the thread of the receiving flow graph when a packet was received
+    # with a coding pool it is called again by the thread of the pool with the decoded frame (payload_with_crc)
+    def rx_callback(self, payload_coded, payload_with_crc = None):
+        if (payload_with_crc is None) and (self.coding is not None):
+            self.coding.decode(payload_coded, self.current_trace())
+            return
+        start = time.time()
+        self.lock.acquire()
+        try:
+            self.handle_packet(payload_coded, payload_with_crc)
+        finally:
+            self.lock.release()
+            self.rx_service_time.observe(time.time() - start)
+
+    # this function handles a received packet, the lock has to be held
+    # payload_with_crc: the decoded frame if it was decoded already, otherwise None
+    def handle_packet(self, payload_coded, payload_with_crc = None):
+        self.stop_timeout()    #package recognised, therefore stop timeout
         verb = self.verbose
         if verb:
             print "Relay got a packet!"
@@ -609,8 +1217,24 @@ class relay (network_member):
         #update statistical information
         self.n_rcvd += 1         # count number of received packets
         
-        payload_with_crc = self.mychannelcoder.channel_decode(payload_coded)
+        start = time.time()
+        if payload_with_crc is None:
+            payload_with_crc = self.mychannelcoder.channel_decode(payload_coded)
+        decoded = time.time()
         ok, payload = gru.check_crc32(payload_with_crc)
+        self.frame_decode_time.observe(time.time() - start)
+        self.trace_decoding(start, decoded)
+        if self.capture is not None:
+            if payload_with_crc == '':  # the channel code could not correct the errors
+                self.capture.record(frame_capture.RX, payload_coded, '', False)
+            else:
+                self.capture.record(frame_capture.RX, payload_coded, payload, ok)
+        
+        try:
+            (first, pid, pid_b, length) = self.myheader.parse(payload)    # this is also done when the CRC is incorrect, therefore it may fail with a malformed packet
+        except:
+            pid = 9999  # unused value for marking the error
+            ok = False
         
         if ok:
             self.n_right += 1    # count number of correctly received packets
@@ -620,40 +1244,49 @@ class relay (network_member):
                 print "packet was ok!"
             self.timeouts = 0    # we got a correct packet, therefore we assume that the link is working properly
             self.data_rcvd += len(payload) - self.HEADER_LEN_NODE - 2 # two byte padding
-            first = self.myheader.analyse_header(unpack('!B', payload[0])[0])
-            if first[4] == True:    # source of data is A
-                self.packet_buffer_A.append(payload)
-                if self.packet_buffer_B != []:
-                    self.buffered_data = True
-            elif first[5] == True:  # source of data is B
-                self.packet_buffer_B.append(payload)
-                if self.packet_buffer_A != []:
-                    self.buffered_data = True
-            else:
+            source = self.myheader.source_of(pid)
+            if source is None:
                 print "Error: data has no valid source!"
+            new = True
+            if self.ARQ and (source in self.arq_rx):
+                new = self.arq_rx[source].receive(pid)  # a retransmission of a packet which was received before is not forwarded again
+                if first[7] == True:    # the node acknowledges the packets which were forwarded to it
+                    self.process_ack(source, payload[self.HEADER_LEN_NODE + length:])
+                if first[3] == True:    # the whole burst was received, so missing packets show up as gaps
+                    self.arq_uncertain[source] = False
+            if (new == True) and (source is not None) and (self.POINT2POINT == False) and (self.myheader.peer[source] is not None):
+                self.packet_buffer[source].append(payload)  # in the point to point scenario the relay is the sink of the data
+            if (self.request_time is not None) and (source == self.current_aim):    # first packet of the response to our request
+                rtt = max(time.time() - self.request_time, 0)   # the airtime of the request may have been overestimated
+                self.rtt[source].add_sample(rtt)
+                self.response_time[source].observe(rtt)
+                self.request_time = None
                 
-            if self.myheader.check_for_burst_end(unpack('!B', payload[0])[0]) == True:   # the node will not send more packets during this burst
+            if first[3] == True:   # the node will not send more packets during this burst
                 if verb:
                     print "End of burst detected!"
-                if (self.BIDIRECTIONAL == True) or (self.NETWORK_CODING == True):   # network coding requires packets from at least 2 sources
-                    # change the aim for the next request
-                    self.current_aim = self.NEXT_AIM[self.current_aim]
-                    if verb:
-                        print "Changed my aim!"
+                pair = (source, self.myheader.peer.get(source))
                 #here we have 3 possiblities
                 #1. we can directly forward the packet
                 #2. we can request another packet from the other node to apply network coding
                 #3. we can combine the packet with an earlier received packet by network coding and than send out this new packet
+                # the aim for the next request is changed first as the request is part of the last packet which is sent
                 if self.NETWORK_CODING == True:
-                    if self.buffered_data == True:    #we have packet(s) in the buffer with which we can combine the ones from the last burst
-                        self.send_data()
+                    if self.pair_ready(source):    #we have packet(s) in the buffer with which we can combine the ones from the last burst
+                        self.current_aim = self.next_aim(pair)
+                        self.send_data(pair)
                     else:
+                        self.current_aim = self.next_aim()
                         self.send_request()          #get data from the other node
                 elif self.POINT2POINT == True:
                     # do nothing with received data
+                    self.current_aim = self.next_aim()
                     self.send_request() # just requesting the next packet burst
                 else:       # send data without manipulating it
-                    self.send_data()
+                    self.current_aim = self.next_aim(pair)
+                    self.send_data(pair)
+                if verb:
+                    print "Next aim: " + self.current_aim
                 
             else:   # more data to come in this burst
                 pass # just wait for the rest of the burst
@@ -662,35 +1295,36 @@ class relay (network_member):
             pass
             #self.send_request()
             #print payload
-        
-        try:
-            pid = unpack('!H', payload[1:3])[0]    # this is also done when the CRC is incorrect, therefore it may fail with a malformed packet
-        except:
-            pid = 9999  # unused value for marking the error
             
         if verb:
             print "ok = %5s  ID = %4d  n_rcvd = %4d  n_right = %4d" % (ok, pid, self.n_rcvd, self.n_right)
-        self.update_count += 1
-        if (self.update_count == self.UPDATE) and (self.gui is not None):
-            self.update_statistics(self.timeouts_all)
-            self.update_count = 0
+        self.update_statistics(self.timeouts_all)
         # start the timeout
-        signal.alarm(self.TIMEOUTLIMIT)
+        self.start_timeout()
         return
 
     measure = 0
     def send_pkt(self, payload='', eof=False):
+        tr = tracing.active
+        if tr is not None:
+            tr.resume(tr.detach(payload))   # the transmitting flow graph records its stages for the trace of the frame
         try:
             #print (time.time() - self.last)
             #self.last = time.time()
             res = self.tb_tx.txpath.send_pkt(payload, eof)
         except: # for a test there is no flow graph
+            res = True
             self.output_buffer.append(payload)
+        # the frame is sent after the ones which are still queued in the transmitter
+        now = time.time()
+        if self.bitrate:
+            self.tx_idle_time = max(self.tx_idle_time, now) + (len(payload) + self.FRAME_OVERHEAD) * 8.0 / self.bitrate
+        else:
+            self.tx_idle_time = now
+        if tr is not None:
+            tr.end()
         self.n_trans += 1
-        self.update_count += 1
-        if (self.update_count == self.UPDATE) and (self.gui is not None):
-            self.update_statistics(self.timeouts_all)
-            self.update_count = 0
+        self.update_statistics(self.timeouts_all)
         if self.verbose:
             print "Sent a packet! "
         
@@ -702,17 +1336,21 @@ class relay (network_member):
         return res
 
     # this function initiates a single request for data
+    # with ARQ the request carries an acknowledgement of the packets of the node if it cannot be given implicitly, see explicit_ack_needed
     def send_request(self):
-        if self.current_aim == 'A':
-            payload = self.myheader.create_header_relay(str(pack('!B', 0)), True,  False)
-        elif self.current_aim == 'B':
-            payload = self.myheader.create_header_relay(str(pack('!B', 0)), False,  True)
+        ack = self.ARQ and self.explicit_ack_needed(self.current_aim)
+        if ack:
+            length = pack('!B', protocol_header.ACK_BLOCK.size)
         else:
-            print "This should not happen!"
-            print "Current aim is: " + str(self.current_aim)
+            length = pack('!B', 0)
+        payload = self.myheader.create_header_relay(length, ack=ack, req_node=self.current_aim)
+        if ack:
+            (base, bitmap) = self.arq_rx[self.current_aim].ack()
+            payload += protocol_header.ACK_BLOCK.pack(base, bitmap)
         # wrap in physical frame
         payload_coded = self.wrap_in_frame(payload)
         self.send_pkt(payload_coded)
+        self.request_time = self.tx_idle_time   # the request is on the air after the frames queued before it
         if self.verbose:
             print "packet with pure request sent out to " + self.current_aim
         return
@@ -721,146 +1359,336 @@ class relay (network_member):
     # parameters:
     # payload_A: this parameter can have two meanings
     #                    1. nc == True:  the payload of the packet from node A
-    #                    2. nc == False: the payload of the packet which has to be send, can be from node A or B
+    #                    2. nc == False: the payload of the packet which has to be send, can be from any node
+    #                    with another pair of nodes than A and B, node A stands for the first node of the pair and node B for the second one
     # nc:          should the packet be a network-coded one?
     # request:  should the packet header include a request?
     # payload_B: this paramter is only necessary if nc == True as then it will hold the payload of the packet from node B, otherwise it will be ignored
-    def assemble_data_pkt(self, payload_A, nc, request, payload_B=''):
+    # coded:     the network-coded combination of payload_A and payload_B (length inclusive) as returned by network_code_burst, if it is not given it is calculated here
+    def assemble_data_pkt(self, payload_A, nc, request, payload_B='', coded=None, wrap=True):
         # determine if we should request a burst and if so, who should be requested to send data
         if request == True:
-            if self.current_aim == 'A':
-                req_a = True
-                req_b = False
-            elif self.current_aim == 'B':
-                req_a = False
-                req_b = True
-            else:
-                print "This should not occore!"
-                self.stop_execution(None, None)
+            req_node = self.current_aim
         else:
-            req_a = False
-            req_b = False
+            req_node = None
             
         if nc == False:
-            first = self.myheader.analyse_header(unpack('!B', payload_A[0])[0])
-            if first[4] == True:
-                origin = 'A'
-            elif first[5] == True:
-                origin = 'B'
-            else:
+            (first, packet_id, packet_id_b, length) = self.myheader.parse(payload_A)
+            origin = self.myheader.source_of(packet_id)
+            if origin is None:
                 print "Error: data has no origin!"
-            header = self.myheader.create_header_relay(payload_A[3], req_a, req_b, payload_A[1:3], '', False, origin)
-            length = unpack('!B', payload_A[3])[0]
+            header = self.myheader.create_header_relay(payload_A[3], False, False, payload_A[1:3], '', False, origin, req_node=req_node)
             payload = header + payload_A[self.HEADER_LEN_NODE:length+self.HEADER_LEN_NODE]  # assemble the new packet
             self.data_trans += len(payload) - self.HEADER_LEN_RELAY # header is 4 byte long
         else:
-            encode = self.mynetworkcoder.network_code
-            new_length = encode(payload_A[3], payload_B[3])
-            header = self.myheader.create_header_relay(new_length, req_a, req_b, payload_A[1:3], payload_B[1:3], True)
-            if (len(payload_A[4:]) == 0) and (len(payload_B[4:]) == 0):
-                new_payload = ""    # both packets contain no data, e.g. both files have been transmitted => there is not data to combine anymore
-            else:
-                length_a = unpack('!B', payload_A[3])[0]
-                if self.verbose:
-                    print "length data of A: " + str(length_a)
-                length_b = unpack('!B', payload_B[3])[0]
-                if self.verbose:
-                    print "length data of B:" + str(length_b)
-                new_payload = encode(payload_A[self.HEADER_LEN_NODE:length_a + self.HEADER_LEN_NODE], payload_B[self.HEADER_LEN_NODE:length_b + self.HEADER_LEN_NODE])
-                if (len(new_payload) is not length_a) and (len(new_payload) is not length_b):
-                    print "Error in network coding!"
-            payload = header + new_payload      # assemble the new packet
+            length_a = ord(payload_A[3])
+            length_b = ord(payload_B[3])
+            if self.verbose:
+                print "length data of A: " + str(length_a)
+                print "length data of B:" + str(length_b)
+            if coded is None:
+                coded = self.mynetworkcoder.network_code_burst([payload_A[3:length_a + self.HEADER_LEN_NODE]], [payload_B[3:length_b + self.HEADER_LEN_NODE]])[0]
+            # the network-coded part consists of the coded length and the data padded to the longer one of both packets
+            # if both packets contain no data, e.g. both files have been transmitted, only the length is left
+            size = max(length_a, length_b) + 1
+            header = self.myheader.create_header_relay(coded[0:1].tostring(), False, False, payload_A[1:3], payload_B[1:3], True, req_node=req_node)
+            payload = header + coded[1:size].tostring()      # assemble the new packet
             self.data_trans += len(payload) - self.HEADER_LEN_RELAY_NC    # header has 6 byte length
             
-        payload = self.wrap_in_frame(payload)
+        if wrap:
+            payload = self.wrap_in_frame(payload)
 
         if self.verbose:
             print "packet created"
         return payload
     
+    # this function creates a single packet which was network-coded with RLNC
+    # parameters:
+    # generation: the tuple describing the combined packets as returned by protocol_header.rlnc_generation
+    # coded:      the coefficients followed by the coded data
+    # request:    should the packet header include a request?
+    def assemble_rlnc_pkt(self, generation, coded, request, wrap=True):
+        if request == True:
+            req_node = self.current_aim
+        else:
+            req_node = None
+        payload = self.myheader.create_header_rlnc(generation, req_node) + coded
+        self.data_trans += len(payload) - self.HEADER_LEN_RELAY_NC
+        if wrap:
+            return self.wrap_in_frame(payload)
+        return payload
+
+    # this function splits the packets of a node into generations for RLNC
+    # the IDs of the packets of a generation have to fit into the bitmap of the header, duplicates start a new generation
+    # returns a list of generations, each one is a list of (packet ID, payload) sorted by the packet ID
+    def split_generations(self, buffer):
+        size = protocol_header.RLNC_GENERATION_SIZE
+        unpack_header = self.myheader.HEADER.unpack_from
+        generations = []    # entries: [lowest packet ID, {packet ID: payload}]
+        for payload in buffer:
+            packet_id = unpack_header(payload)[1]
+            if (generations == []) or (packet_id - generations[-1][0] < 0) or (packet_id - generations[-1][0] >= size) or (packet_id in generations[-1][1]):
+                generations.append([packet_id, {}])
+            generations[-1][1][packet_id] = payload
+        return [sorted(generation[1].items()) for generation in generations]
+
+    # this function network-codes a generation of packets of both nodes of a pair with RLNC
+    # returns a list of (generation, coded) with the arguments for assemble_rlnc_pkt
+    def rlnc_code_generation(self, generation_a, generation_b):
+        header_len = self.HEADER_LEN_NODE
+        num = max(len(generation_a), len(generation_b)) + self.RLNC_REDUNDANCY    # each node has to decode the packets of the other one
+        sources = [payload[3:ord(payload[3]) + header_len] for (packet_id, payload) in generation_a + generation_b]
+        (coefficients, coded, size) = self.mynetworkcoder.rlnc_encode(sources, num)
+        generation = self.myheader.rlnc_generation([packet_id for (packet_id, payload) in generation_a], [packet_id for (packet_id, payload) in generation_b])
+        return [(generation, coefficients[i].tostring() + coded[i, 0:size].tostring()) for i in range(num)]
+
     # function to set attribute tb_rx
     def set_tb_rx(self, rx):
         self.tb_rx = rx
     
-    def send_data(self):
-        assemble = self.assemble_data_pkt   # making a local reference to the function
+    # this function sends the buffered packets of the given nodes and of their partners, by default the ones of all nodes
+    # with network coding the packets of the two nodes of a pair are combined, the remaining ones are forwarded without coding
+    # with RLNC all packets of a pair are sent as random combinations
+    # if there is nothing to send only a request is sent
+    def send_data(self, nodes = None):
+        start = time.time()
+        if self.RLNC:
+            assemble = self.assemble_rlnc_pkt
+        else:
+            assemble = self.assemble_data_pkt   # making a local reference to the function
         list = []   # a list for holding the packets which are to be sent out
-        buffer_a = self.packet_buffer_A
-        buffer_b = self.packet_buffer_B
-        i = 0
-        if self.NETWORK_CODING:
-            if len(self.packet_buffer_A) >= len(self.packet_buffer_B):
-                more_data = self.packet_buffer_A
-                less_data = self.packet_buffer_B
+        packets = []    # arguments for assemble without the request which is always the third argument
+        peer = self.myheader.peer
+        header_len = self.HEADER_LEN_NODE
+        for first in self.NODES[0::2]:  # the first node of each pair
+            second = peer[first]
+            if (nodes is not None) and (first not in nodes) and (second not in nodes):
+                continue
+            buffer_a = self.packet_buffer[first]
+            if second is None:
+                buffer_b = []
             else:
-                more_data = self.packet_buffer_B
-                less_data = self.packet_buffer_A
-            num = range(len(more_data) - 1)
-            for i in num:
-                try:
-                    data = less_data[i] # this will fail with an IndexError if there is no more data
-                    list.append(assemble(buffer_a[i], True, False, buffer_b[i]))
-                except IndexError:
-                    # there is no more data for network coding
-                    list.append(assemble(more_data[i], False, False))
-            # the last packet has to contain a request
-            try:
-                data = less_data[i] # this will fail with an IndexError if there is no more data
-                list.append(assemble(buffer_a[i], True, True, buffer_b[i]))
-            except IndexError:
-                # there is no more data for network coding
-                list.append(assemble(more_data[i], False, True))
-        else:   # no network coding
-            if len(buffer_a) == 0:   # stored data is from B
-                buffered_data = buffer_b
-            else:   # stored data is from A
-                buffered_data = buffer_a
-            num = len(buffered_data)    # the last packet has to be treated differently
-            # no network coding and no request
-            nc_list = [False]*num
-            request_list = [False] * num
-            # the last packet has to be treated differently
-            request_list[-1] = True     # the last packet in the burst has to contain a request for new data
-            list = map(assemble, buffered_data, nc_list, request_list)
+                buffer_b = self.packet_buffer[second]
+                self.packet_buffer[second] = []
+            self.packet_buffer[first] = []
+            if self.arq_tx is not None:     # keep the forwarded packets until the receiving node acknowledges them
+                self.record_forwarded(buffer_a, second)
+                self.record_forwarded(buffer_b, first)
+            if self.RLNC:
+                generations_a = self.split_generations(buffer_a)
+                generations_b = self.split_generations(buffer_b)
+                for i in range(max(len(generations_a), len(generations_b))):
+                    if i < len(generations_a):
+                        generation_a = generations_a[i]
+                    else:
+                        generation_a = []
+                    if i < len(generations_b):
+                        generation_b = generations_b[i]
+                    else:
+                        generation_b = []
+                    packets.extend(self.rlnc_code_generation(generation_a, generation_b))
+            elif self.NETWORK_CODING:
+                if len(buffer_a) >= len(buffer_b):
+                    more_data = buffer_a
+                else:
+                    more_data = buffer_b
+                num_nc = min(len(buffer_a), len(buffer_b))  # number of packet pairs which can be network-coded
+                # network-code all packet pairs of the burst at once, the parts to combine are the lengths and the useful data
+                # the result is copied as the rows of the burst buffer are reused for the next pair of nodes
+                coded = self.mynetworkcoder.network_code_burst([payload[3:ord(payload[3]) + header_len] for payload in buffer_a[0:num_nc]],
+                                                               [payload[3:ord(payload[3]) + header_len] for payload in buffer_b[0:num_nc]]).copy()
+                for i in range(len(more_data)):
+                    if i < num_nc:
+                        packets.append((buffer_a[i], True, buffer_b[i], coded[i]))
+                    else:
+                        # there is no more data for network coding
+                        packets.append((more_data[i], False, '', None))
+            else:   # no network coding
+                # the stored data is from one node, only packets to retransmit can be from the other one
+                packets.extend([(payload, False, '', None) for payload in buffer_a + buffer_b])
+        if packets == []:
+            self.send_request()
+            return True
+        
+        # with an implicit acknowledgement the request is part of the last data packet, otherwise it is sent in an extra packet after the data
+        # requests to other nodes than A and B are addressed by the packet ID, so they have to be sent in an extra packet as well
+        piggyback = (self.current_aim == 'A' or self.current_aim == 'B') and not (self.ARQ and self.explicit_ack_needed(self.current_aim))
+        num = len(packets)
+        coding = self.coding
+        wrap = coding is None   # with a coding pool the frames of the whole burst are channel encoded in parallel afterwards
+        traces = []
+        tr = tracing.active
+        trace = None
+        for i in range(num):
+            args = packets[i]
+            request = (i == num - 1) and piggyback    # the last packet has to contain a request
+            if tr is not None:
+                trace = tr.begin('tx')
+            frame = assemble(*(args[0:2] + (request,) + args[2:]), wrap=wrap)
+            if tr is not None:
+                if (trace is not None) and wrap:
+                    frame = tr.attach(frame, trace)     # until it is sent
+                tr.end()
+            list.append(frame)
+            traces.append(trace)
+        if not wrap:
+            list = self.wrap_burst(list, traces)
+        self.burst_assembly_time.observe(time.time() - start)
             
-        self.buffered_data = False
-        self.packet_buffer_A = []
-        self.packet_buffer_B = []
         # send the data out
         send = self.send_pkt
         map(send, list)
+        if piggyback:
+            self.request_time = self.tx_idle_time   # the last packet included a request, it is on the air after the whole burst
+        else:
+            self.send_request()
         # all data should be sent out
         return True
+
+    # returns True if both nodes of the pair of node have buffered packets, so they can be network-coded
+    def pair_ready(self, node):
+        partner = self.myheader.peer.get(node)
+        return (partner is not None) and (self.packet_buffer[node] != []) and (self.packet_buffer[partner] != [])
+
+    # this function chooses the node which is requested next
+    # flushed: nodes whose buffers are going to be sent out before the request
+    # the nodes are requested in turn, but with network coding a node whose partner is waiting with buffered packets is preferred
+    # as its packets can be combined with them immediately
+    def next_aim(self, flushed = ()):
+        aim = self.NEXT_AIM[self.current_aim]
+        if self.NETWORK_CODING:
+            buffer = self.packet_buffer
+            peer = self.myheader.peer
+            candidate = aim
+            for i in range(len(self.NEXT_AIM)):
+                partner = peer[candidate]
+                if (partner is not None) and (partner not in flushed) and (buffer[partner] != []) and ((candidate in flushed) or (buffer[candidate] == [])):
+                    return candidate
+                candidate = self.NEXT_AIM[candidate]
+        return aim
+
+    # with ARQ a request without an acknowledgement block acknowledges all packets the node has sent so far
+    # this is only possible if no packet of the node is missing and if the last burst of the node was received up to its end
+    def explicit_ack_needed(self, aim):
+        return self.arq_uncertain[aim] or self.arq_rx[aim].has_gaps()
+
+    # remembers the packets in payloads as sent to the node destination
+    def record_forwarded(self, payloads, destination):
+        if (payloads == []) or (destination not in self.arq_tx):
+            return
+        sent = self.arq_tx[destination].sent
+        unpack_header = self.myheader.HEADER.unpack_from
+        for payload in payloads:
+            sent(unpack_header(payload)[1], payload)
+
+    # processes an acknowledgement block of the node source
+    # the packets which were forwarded to it and got lost are put in front of the buffer of its partner, so they are sent again with the next burst
+    def process_ack(self, source, ack_block):
+        if (self.arq_tx is None) or (source not in self.arq_tx):
+            return  # nothing was forwarded
+        try:
+            (base, bitmap) = protocol_header.ACK_BLOCK.unpack_from(ack_block)
+        except:
+            print "Error: invalid acknowledgement block!"
+            return
+        lost = self.arq_tx[source].ack(base, bitmap)
+        if lost == []:
+            return
+        if self.verbose:
+            print "Retransmitting %d packets to %s" % (len(lost), source)
+        partner = self.myheader.peer[source]
+        self.packet_buffer[partner] = lost + self.packet_buffer[partner]
     
-    # this function is called when a timeout occures
-    def timeout_handler(self, signum, frame):
-        #print 'Signal handler called with signal ' + str(signum)
-        self.timeouts_all += 1
-        print "Timeout occured!"
-        print "Node which did not respond has ID: " + str(self.current_aim)
-        self.timeouts += 1
-        if self.timeouts == self.MAX_TIMEOUTS:
-            print "termination of connection due to timeouts"
-            self.send_pkt(eof=True)
-            self.stop_execution(None, None) # it is also used as a signal handler and therefore it expects two arguments
-        if (self.packet_buffer_A != []) or (self.packet_buffer_B != []):    # if there is buffered data send it out
-            if self.POINT2POINT is not True:    # only send the data if this is not in the point to point communication scenario
-                self.send_data()
+    # registers the metrics of the relay in addition to the common ones
+    def register_metrics(self):
+        network_member.register_metrics(self)
+        metrics = self.metrics
+        metrics.counter('relaying_timeouts_total', 'Expired timeouts', function = lambda: self.timeouts_all)
+        self.response_time = {}
+        for aim in sorted(self.NEXT_AIM.keys()):
+            labels = {'node': aim}
+            self.response_time[aim] = metrics.histogram('relaying_request_response_seconds', 'Time between a request and the first packet of the response', labels)
+            metrics.gauge('relaying_timeout_seconds', 'Current timeout for the response to a request', labels, function = lambda aim = aim: self.rtt[aim].timeout())
+        for current in self.NODES:
+            metrics.gauge('relaying_packet_buffer_packets', 'Received packets which have not been forwarded yet', {'node': current}, function = lambda current = current: len(self.packet_buffer[current]))
+        if self.ARQ:
+            for aim in sorted(self.arq_rx.keys()):
+                labels = {'node': aim}
+                metrics.counter('relaying_arq_duplicates_total', 'Received packets which had been received before', labels, function = lambda aim = aim: self.arq_rx[aim].duplicates)
+                metrics.counter('relaying_arq_skipped_total', 'Packets which were given up by the receiver', labels, function = lambda aim = aim: self.arq_rx[aim].skipped)
+        if self.arq_tx is not None:
+            for aim in sorted(self.arq_tx.keys()):
+                labels = {'node': aim}
+                metrics.gauge('relaying_arq_unacknowledged_packets', 'Forwarded packets which were not acknowledged yet', labels, function = lambda aim = aim: len(self.arq_tx[aim]))
+                metrics.counter('relaying_arq_retransmissions_total', 'Retransmitted packets', labels, function = lambda aim = aim: self.arq_tx[aim].retransmissions)
+                metrics.counter('relaying_arq_dropped_total', 'Packets which were dropped after the maximum number of transmissions', labels, function = lambda aim = aim: self.arq_tx[aim].dropped)
+
+    # the estimates of the round trip times are reported for each node: smoothed round trip time and current timeout (both in ms)
+    def extra_statistics(self):
+        res = []
+        for aim in sorted(self.rtt.keys()):
+            estimate = self.rtt[aim]
+            if estimate.srtt is None:
+                res.append(0)   # not measured yet
+            else:
+                res.append(int(estimate.srtt * 1000))
+            res.append(int(estimate.timeout() * 1000))
+        return res
+
+    # this function (re)starts the timeout for the response to the last request
+    # it runs from the time when the frames queued in the transmitter are estimated to be sent
+    def start_timeout(self):
+        self.timer.cancel(self.timeout_timer)
+        self.timeout_generation += 1
+        queued = max(self.tx_idle_time - time.time(), 0)
+        self.timeout_timer = self.timer.arm(queued + self.rtt[self.current_aim].timeout(), self.timeout_handler, self.timeout_generation)
+
+    # this function stops the timeout
+    def stop_timeout(self):
+        self.timer.cancel(self.timeout_timer)
+        self.timeout_generation += 1
+        self.timeout_timer = None
+
+    # this function is called by the timer thread when a timeout occures
+    # generation: the value of timeout_generation when the timeout was started
+    def timeout_handler(self, generation):
+        self.lock.acquire()
+        try:
+            if generation != self.timeout_generation:
+                return  # a packet was received while this timeout was expiring, so the timeout is not valid anymore
+            self.timeout_timer = None
+            self.timeouts_all += 1
+            print "Timeout occured!"
+            print "Node which did not respond has ID: " + str(self.current_aim)
+            self.timeouts += 1
+            self.rtt[self.current_aim].timeout_expired()  # back off
+            if self.ARQ:
+                self.arq_uncertain[self.current_aim] = True     # we cannot know which packets of the node were lost
+            if self.timeouts == self.MAX_TIMEOUTS:
+                print "termination of connection due to timeouts"
+                self.send_pkt(eof=True)
+                os.kill(os.getpid(), signal.SIGTERM)    # stop_execution has to run in the main thread
+                return
+            if self.POINT2POINT is not True:    # in the point to point communication scenario no data is buffered
+                self.send_data()    # if there is buffered data send it out, otherwise this sends a request
             else:
                 self.send_request()
-        else:   # no data to send, therefore send a request
-            self.send_request()
-        signal.alarm(self.TIMEOUTLIMIT)
+            self.request_time = None    # the response could belong to the former request, so it cannot be used for measuring the round trip time
+            self.start_timeout()
+        finally:
+            self.lock.release()
 # end of class relay
 
 class node (network_member):
-    NODE_ID = 'A'   # the id of the node, NOTE: if the node is intended to send data the assigned id must be part of NEXT_AIM from class relay as it otherwise won't be allowed to send any data
+    NODE_ID = 'A'   # the id of the node, NOTE: the assigned id must be part of the nodes of the network as it otherwise won't be allowed to send any data
 
     RECEIVE_ID_LOWER_LIMIT = None
     RECEIVE_ID_UPPER_LIMIT = None
     SEND_DATA_ID_LOWER_LIMIT = None
     SEND_DATA_ID_UPPER_LIMIT = None
     REQUEST_ID = None
+    FIRST_OF_PAIR = True        # the ID of our packets is the first one in the header of network-coded packets
+    ADDRESSED_REQUEST = False   # requests to us are only recognised by the request address
     
     DATA_SIZE_NO_CHANNEL_CODE = 245   # 255 - 6 (header) - 4 (CRC)
     DATA_SIZE_RS_CODE = 213                     # 223 - 6 (header) - 4 (CRC)
@@ -870,17 +1698,32 @@ class node (network_member):
     VIDEO_STREAMING = False
     TRANSFER_RANDOM_DATA = False
     TRANSFER_CONSTANT_DATA = False
+    TRAFFIC_GENERATOR = False
+    TUNNEL = False
     
     DIRECT_LINK = False
     
     # variables for controlling the size of packet bursts
     BURST_SIZE = 10                     # if the number of continuasly sent packets reaches BURST_SIZE transmission is stopped
     burst_counter = 0
+    burst_control = None                # a burst_controller if the burst size is adapted at runtime, otherwise None
+    burst_sent = False                  # True if we have sent a burst whose outcome has not been evaluated yet
+    backlogged = False                  # True if the source filled all packets of our last burst
+    errors_at_request = 0               # number of frames with errors when the last request was answered
     
     source = None   # source for transmission
     output = None
     last_packets = None
-    last_node_id = 0
+    ARQ = False         # selective-repeat ARQ with the relay
+    arq_tx = None       # our packets which were not acknowledged by the relay yet
+    arq_rx = None       # keeps track of the received packets of the other node
+    retransmit_queue = None     # (packet ID, data) of our packets which the relay is missing, they are sent first in the next burst
+    data_size = 0       # number of bytes of useful data per packet
+    RLNC = False        # the relay network-codes with RLNC instead of XOR
+    rlnc_generations = None     # decoders of the RLNC generations of the current burst of the relay, None for a decoded generation
+    rlnc_decoded = 0    # number of decoded generations
+    rlnc_failed = 0     # number of generations which could not be decoded
+    received_ids = None     # duplicate_filter of the packets of our partner, without ARQ
     myheader = None
     
     # variables for keeping statistical information
@@ -889,8 +1732,8 @@ class node (network_member):
     gui = None
     test = False
     
-    def __init__(self, tb, type_of_transfer,  node_id, nc, direct_link, gui = None, write_pipeline=None, burst_size = 1, channel_code_nr = 0, bidirectional = True, port=1234):
-        network_member.__init__(self, write_pipeline, gui, channel_code_nr)
+    def __init__(self, tb, type_of_transfer,  node_id, nc, direct_link, gui = None, statistics = None, burst_size = 1, channel_code_nr = 0, bidirectional = True, port=1234, window_size = None, arq = False, nodes = 'AB', rlnc = False, adaptive_burst = False, max_burst_size = burst_controller.DEFAULT_MAX_BURST_SIZE, video_delay = data_sinks.video_sink.DELAY, duplicate_window = duplicate_filter.WINDOW, traffic_model = 'saturated', traffic_seed = None, tunnel_listen = tunnel.LISTEN, tunnel_deliver = tunnel.DELIVER, coding_workers = 0, numpy_codec = False):
+        network_member.__init__(self, statistics, gui, channel_code_nr, coding_workers, numpy_codec)
         global verbose
         self.verbose = verbose
         self.tb_tx = tb
@@ -898,17 +1741,16 @@ class node (network_member):
         if type_of_transfer == 'F':
             self.FILE_TRANSFER = True
             if gui is None: # started from command line
-                self.source = open("./transfer_file.txt", 'r')  # take default file as the user cannot have specified what file to take
+                self.source = data_sources.open_file("./transfer_file.txt")  # take default file as the user cannot have specified what file to take
             else:   # started from gui
                 try:
-                    self.source = open(gui.file_source.get(), 'r')  # this can result in an error
+                    self.source = data_sources.open_file(gui.file_source.get())  # this can result in an error
                     print "reading from file:" + gui.file_source.get()
                 except IOError:
                     if (bidirectional == True) or (bidirectional == False and node_id == 'B'):
                         print "File not found!"
                         raise IOError  # end
 
-            self.output = open("./transferred_file", 'w')
             print "Info: Transferring a file!"
         elif type_of_transfer == 'V':
             try:
@@ -919,20 +1761,40 @@ class node (network_member):
                 raise IOError
             self.VIDEO_STREAMING = True
             try:
-                self.source = open("temp.video", "r")
+                self.source = data_sources.open_file("temp.video")
             except:
                 if (bidirectional == True) or (bidirectional == False and node_id == 'B'):
                     print("ERROR: Video File not found!")
                     raise IOError
-            self.output = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             print "Info: Transferring a video stream!"
         elif type_of_transfer == 'R':
             self.TRANSFER_RANDOM_DATA = True
-            self.source = open("/dev/urandom", 'r')     # use a non-blocking random source
+            self.source = data_sources.random_source()
             print "Info: Transferring random data!"
         elif type_of_transfer == 'C':
             self.TRANSFER_CONSTANT_DATA = True
+            self.source = data_sources.constant_source()
             print "Info: Transferring constant data!"
+        elif type_of_transfer == 'G':
+            self.TRAFFIC_GENERATOR = True
+            if traffic_seed is None:    # reproducible, but different for each node
+                traffic_seed = ord(str(node_id)[0])
+            try:
+                self.source = traffic.traffic_source(traffic_model, traffic_seed)
+            except ValueError, error:
+                print "Error: " + str(error)
+                raise KeyboardInterrupt
+            self.output = traffic.traffic_checker()
+            print "Info: Transferring generated traffic (" + traffic_model + ")!"
+        elif type_of_transfer == 'T':
+            self.TUNNEL = True
+            try:
+                self.source = tunnel.tunnel_source(tunnel_listen)
+                self.output = tunnel.tunnel_sink(tunnel_deliver)
+            except (ValueError, IOError), error:
+                print "Error: datagram tunnel could not be opened: " + str(error)
+                raise KeyboardInterrupt
+            print "Info: Tunnelling datagrams from " + tunnel_listen + " to the partner, its datagrams are sent to " + tunnel_deliver + "!"
         else :   #default
             print "Error: no (valid) type of transfer selected!"
             print "Error: Nothing to transfer!"
@@ -940,31 +1802,28 @@ class node (network_member):
             
         if node_id is not None:
             self.NODE_ID = node_id
-            if (node_id in relay(None, None, None, None, None, None, None, channel_code_nr).NEXT_AIM) == False:
-                print "Warning: this node will never be allowed to send!"
-            self.myheader = protocol_header(node_id)
+            self.myheader = protocol_header(node_id, nodes)
         else:
             print "Error: No node-ID given!"
         
-        if node_id == 'A':
-            self.RECEIVE_ID_LOWER_LIMIT = 32769 #129
-            self.RECEIVE_ID_UPPER_LIMIT = 65535 #255
-            self.SEND_DATA_ID_LOWER_LIMIT = 1 #1
-            self.SEND_DATA_ID_UPPER_LIMIT = 32767 #127 
-            self.REQUEST_ID = 0
-            print "start-up as node A"
-        elif node_id == 'B':
-            self.RECEIVE_ID_LOWER_LIMIT = 1 #1
-            self.RECEIVE_ID_UPPER_LIMIT = 32767 #127
-            self.SEND_DATA_ID_LOWER_LIMIT = 32769 #129
-            self.SEND_DATA_ID_UPPER_LIMIT = 65535 #255
-            self.REQUEST_ID = 32768 #128
-            print "start-up as node B"
+        if (node_id is not None) and (node_id in nodes):
+            header = self.myheader
+            (self.SEND_DATA_ID_LOWER_LIMIT, self.SEND_DATA_ID_UPPER_LIMIT) = header.id_range[node_id]
+            partner = header.peer[node_id]
+            if partner is not None:
+                (self.RECEIVE_ID_LOWER_LIMIT, self.RECEIVE_ID_UPPER_LIMIT) = header.id_range[partner]
+            else:
+                print "Warning: this node has no partner, so it will not receive any data!"
+                (self.RECEIVE_ID_LOWER_LIMIT, self.RECEIVE_ID_UPPER_LIMIT) = (header.ID_SPACE, header.ID_SPACE)   # no packet has such an ID
+            self.REQUEST_ID = header.request_address[node_id]
+            self.FIRST_OF_PAIR = (nodes.index(node_id) % 2) == 0
+            self.ADDRESSED_REQUEST = header.MY_REQUEST == (header.RQA | header.RQB)
+            print "start-up as node " + node_id
         else:
             print "this node ID is not configured!"
             sys.exit(1)
         
-        self.last_packets = {self.SEND_DATA_ID_LOWER_LIMIT:''}
+        self.last_packets = packet_store(window_size)   # our packets which may be part of network-coded packets later on
         self.packet_id = self.SEND_DATA_ID_LOWER_LIMIT   # begin to send with the smallest possible ID
         self.gui = gui  # keep a reference to the gui in order to be able to initiate an update of displayed results
         self.DIRECT_LINK = direct_link
@@ -972,30 +1831,91 @@ class node (network_member):
         self.BURST_SIZE = burst_size
         
         self.channel_code_nr = channel_code_nr
+        if channel_code_nr == 0: # no channel coding
+            self.data_size = self.DATA_SIZE_NO_CHANNEL_CODE
+        elif channel_code_nr == 1:   #RS
+            self.data_size = self.DATA_SIZE_RS_CODE
+        else:
+            print "ERROR: no such channel code!"
         
+        self.RLNC = nc and rlnc
+        self.rlnc_generations = {}
+        if self.RLNC:
+            self.data_size -= protocol_header.RLNC_OVERHEAD     # the header of the relay is longer
+        
+        self.ARQ = arq
+        if arq:
+            self.data_size -= protocol_header.ACK_BLOCK.size   # the last packet of a burst has to hold the acknowledgement block as well
+            self.arq_tx = arq_sender(self.SEND_DATA_ID_LOWER_LIMIT, self.SEND_DATA_ID_UPPER_LIMIT)
+            if self.RECEIVE_ID_LOWER_LIMIT < protocol_header.ID_SPACE:
+                self.arq_rx = arq_receiver(self.RECEIVE_ID_LOWER_LIMIT, self.RECEIVE_ID_UPPER_LIMIT)
+            else:   # nothing is received, the acknowledgements are meaningless
+                self.arq_rx = arq_receiver(self.SEND_DATA_ID_LOWER_LIMIT, self.SEND_DATA_ID_UPPER_LIMIT)
+            self.retransmit_queue = []
+        else:   # the packets of our partner may arrive more than once, over the direct link and from the relay
+            self.received_ids = duplicate_filter(self.RECEIVE_ID_LOWER_LIMIT, self.RECEIVE_ID_UPPER_LIMIT, duplicate_window)
+
+        if self.FILE_TRANSFER:  # the data of our partner is written at the position given by its packet ID
+            self.output = data_sinks.file_sink("./transferred_file", self.data_size, self.RECEIVE_ID_LOWER_LIMIT, self.RECEIVE_ID_UPPER_LIMIT)
+        elif self.VIDEO_STREAMING:  # the stream of our partner is sent to the player from a jitter buffer
+            self.output = data_sinks.video_sink(("localhost", port), self.RECEIVE_ID_LOWER_LIMIT, self.RECEIVE_ID_UPPER_LIMIT, video_delay)
+
+        if adaptive_burst:
+            if arq:
+                max_burst_size = min(max_burst_size, arq_receiver.WINDOW)
+            self.burst_control = burst_controller(burst_size, 1, max_burst_size)
+            self.BURST_SIZE = self.burst_control.size
+
         if self.verbose:
             print "burst size: " + str(burst_size)
-        print "Write pipeline: " + str(write_pipeline)
+        self.register_metrics()
             
     # this method is called when the instance of the class is destroid
     def __del__(self):
         # close open files
-        if self.FILE_TRANSFER or self.VIDEO_STREAMING:
+        if self.source is not None:
             self.source.close()
+        if self.FILE_TRANSFER or self.VIDEO_STREAMING or self.TUNNEL:
+            self.output.close()
+
+    # the received data which is still waiting for the writer has to reach the file (or the player) before we stop
+    def stop_execution(self, signum, frame):
+        if (self.FILE_TRANSFER or self.VIDEO_STREAMING) and (self.output is not None):
             self.output.close()
+        if self.TRAFFIC_GENERATOR:
+            print "Generated traffic of the partner: " + self.output.summary()
+        if self.TUNNEL:
+            print "Tunnel: %d datagrams received from the application, %d delivered, %d incomplete, %d not deliverable" % \
+                  (self.source.datagrams, self.output.datagrams, self.output.incomplete, self.output.dropped)
+        network_member.stop_execution(self, signum, frame)
             
     # this function is called when a packet was received
-    def rx_callback(self, payload_coded):
+    # with a coding pool it is called again by the thread of the pool with the decoded frame (payload_with_crc)
+    def rx_callback(self, payload_coded, payload_with_crc = None):
+        if (payload_with_crc is None) and (self.coding is not None):
+            self.coding.decode(payload_coded, self.current_trace())
+            return
+        start = time.time()
         verb = self.verbose
         if verb:
             print "Node got a packet!"
             
-        payload_with_crc = self.mychannelcoder.channel_decode(payload_coded)
+        if payload_with_crc is None:
+            payload_with_crc = self.mychannelcoder.channel_decode(payload_coded)
+        decoded = time.time()
         ok, payload = gru.check_crc32(payload_with_crc)
+        self.frame_decode_time.observe(time.time() - start)
+        self.trace_decoding(start, decoded)
+        if self.capture is not None:
+            if payload_with_crc == '':  # the channel code could not correct the errors
+                self.capture.record(frame_capture.RX, payload_coded, '', False)
+            else:
+                self.capture.record(frame_capture.RX, payload_coded, payload, ok)
             
         try:
-            pid = unpack('!H', payload[1:3])[0]    # with a malformed packet this may result in an error!
+            (header_first, pid, pid_b, length) = self.myheader.parse(payload)    # with a malformed packet this may result in an error!
         except:
+            header_first = None
             pid = 9999  # unused value for marking the error
             ok = False
 
@@ -1003,35 +1923,42 @@ class node (network_member):
         self.n_rcvd += 1
         if ok:
             self.n_right += 1
-            header_first = self.myheader.analyse_header(unpack('!B', payload[0])[0])
             
             if header_first[0]:   #if the packet was sent by the relay
-                if header_first[1]:   #if it is networkcoded
-                    # the packet-id we have to look at depends on which node-id we have
-                    if self.NODE_ID == 'A':
-                        key = int(unpack('!H', payload[1:3])[0])
-                    elif self.NODE_ID == 'B':
-                        key = int(unpack('!H', payload[3:5])[0])
+                if header_first[1] and self.RLNC:    # network-coded with RLNC
+                    self.receive_rlnc(payload)
+                elif header_first[1]:   #if it is networkcoded
+                    # the packet-id we have to look at depends on our position in the pair of nodes
+                    if self.FIRST_OF_PAIR:
+                        key = pid
+                        other_id = pid_b
                     else:
-                        print "This should not happen! Configured NODE-ID not valid."
-                        sys.exit(1)
+                        key = pid_b
+                        other_id = pid
                     if verb:
-                        print "the packet has ID-A: %4d and ID-B: %4d" % (unpack('!H', payload[1:3])[0], unpack('!H', payload[3:5])[0])
-                    # know in key the number of our own packet is stored which is part of the networkcoded packet
-                    if self.last_packets.has_key(key) == True:
-                        our_payload = self.last_packets[key][3:]     #get the payload of our own packet, length inclusive
-                        data = self.mynetworkcoder.network_decode(payload[5:], our_payload)
-                        length = unpack('!B', data[0])[0]
-                        self.data_rcvd += length
-                        self.store_data(data[1:length+1], pid)
+                        print "the packet has ID-A: %4d and ID-B: %4d" % (pid, pid_b)
+                    if (key < self.SEND_DATA_ID_LOWER_LIMIT) or (key > self.SEND_DATA_ID_UPPER_LIMIT):
+                        if verb:
+                            print "It was a network-coded packet for another pair of nodes!"
+                        self.n_other_aim += 1
                     else:
-                        print "Warning: could not decode packet as I have not stored a packet with ID %4d" % (key)
+                        # know in key the number of our own packet is stored which is part of the networkcoded packet
+                        # the relay sends each of our packets only once network-coded, so it is not needed anymore afterwards
+                        # with ARQ the relay may send it again together with another packet if the other node has not received the first one
+                        if self.ARQ:
+                            our_packet = self.last_packets.get(key)
+                        else:
+                            our_packet = self.last_packets.pop(key)
+                        if our_packet is not None:
+                            # the packet is decoded right away, so its data is delivered even if no further packet of the relay arrives
+                            self.decode_coded(payload[5:], our_packet[3:], other_id)    # payload of our own packet, length inclusive
+                        else:
+                            print "Warning: could not decode packet as I have not stored a packet with ID %4d" % (key)
                 elif (pid<= self.RECEIVE_ID_UPPER_LIMIT) and (pid >= self.RECEIVE_ID_LOWER_LIMIT): # we are the aim
                     #do something with the received data
                     # data can be stored as it is
                     if verb:
                         print "The packet was sent to us!"
-                    length = unpack('!B', payload[3])[0]
                     self.store_data(payload[self.HEADER_LEN_RELAY:length+self.HEADER_LEN_RELAY], pid)
                     self.data_rcvd += length
                     if verb:
@@ -1045,18 +1972,22 @@ class node (network_member):
                         print "It was a packet for another one!"
                         print "the packet has ID: %5d" % (pid)
                     self.n_other_aim += 1
+                if header_first[6]:    # the last packet of a burst of the relay includes a request or is followed by a pure request
+                    self.drop_rlnc_generations()
                 # check weather we are requested to send data
-                if header_first[2]:
+                if header_first[2] and ((self.ADDRESSED_REQUEST == False) or (pid == self.REQUEST_ID)):
                     if verb:
                         print "My request flag is set!"
+                    if self.ARQ:
+                        self.process_ack(header_first, payload)
+                    if self.burst_control is not None:
+                        self.adapt_burst_size()
                     self.send_data()
             else:
                 if verb:
                     print "Got a packet which was not sent by the relay!"
                 self.n_other_node += 1
-                if self.DIRECT_LINK == True:
-                    self.last_node_id = pid    # keep track of received packet
-                    length = unpack('!B', payload[3])[0]
+                if (self.DIRECT_LINK == True) and (pid <= self.RECEIVE_ID_UPPER_LIMIT) and (pid >= self.RECEIVE_ID_LOWER_LIMIT):   # the packet was sent by our partner
                     self.store_data(payload[self.HEADER_LEN_NODE:length+self.HEADER_LEN_NODE], pid)
                     self.data_rcvd += length
                 else:
@@ -1064,46 +1995,42 @@ class node (network_member):
         else:
             if verb:
                 print payload
-            try:
-                header_first = self.myheader.analyse_header(unpack('!B', payload[0])[0])
-                if (header_first[2] == True) and (pid == self.REQUEST_ID):
-                    self.send_data()
-                    print "Sent data although CRC was incorrect, but request id and request flag indicated this behaviour!"
-                else:
-                    print "Nothing done with received data as CRC was incorrect!"
-            except:
+            if header_first is None:
                 print "Got a malformed packet, nothing done with its content!"
-        self.update_count += 1
-        if (self.update_count == self.UPDATE) and (self.gui is not None):
-            self.update_statistics()
-            self.update_count = 0
+            elif (header_first[2] == True) and (pid == self.REQUEST_ID):
+                if self.burst_control is not None:
+                    self.adapt_burst_size(False)
+                self.send_data()
+                print "Sent data although CRC was incorrect, but request id and request flag indicated this behaviour!"
+            else:
+                print "Nothing done with received data as CRC was incorrect!"
+        self.update_statistics()
         if verb:
             print "ok = %5s  ID = %4d  n_rcvd = %4d  n_right = %4d n_other_node = %4d  n_other_aim =  %4d  n_for_me = %4d" % (ok, pid, self.n_rcvd, self.n_right, self.n_other_node,  self.n_other_aim,  self.n_right - (self.n_other_aim + self.n_other_node))
+        self.rx_service_time.observe(time.time() - start)
     # end of rx_callback----------------------------------------------------------------
 
     def send_pkt(self, payload='', eof=False):
         self.n_trans += 1
-        if self.channel_code_nr == 0:
-            self.data_trans += self.DATA_SIZE_NO_CHANNEL_CODE
-        elif self.channel_code_nr == 1:
-            self.data_trans += self.DATA_SIZE_RS_CODE
-        else:
-            print ("ERROR: number of info-bytes not defined!")
-        self.update_count += 1
-        if (self.update_count == self.UPDATE) and (self.gui is not None):
-            self.update_statistics()
-            self.update_count = 0
+        self.data_trans += self.data_size
+        self.update_statistics()
 
+        tr = tracing.active
+        if tr is not None:
+            tr.resume(tr.detach(payload))   # the transmitting flow graph records its stages for the trace of the frame
         try:
             res = self.tb_tx.txpath.send_pkt(payload, eof)
         except:
             res = True
             self.output_buffer.append(payload)
+        if tr is not None:
+            tr.end()
         return res
 
     # generate and send packets
     # be careful: this function uses a lot of performance improvement techniques from http://wiki.python.org/moin/PythonSpeed/PerformanceTips
     def send_data(self):
+        start = time.time()
         i = 0
         list = []
         burst_size = self.BURST_SIZE
@@ -1116,25 +2043,66 @@ class node (network_member):
         upper_limit = self.SEND_DATA_ID_UPPER_LIMIT
         lower_limit = self.SEND_DATA_ID_LOWER_LIMIT
         verb = self.verbose
+        arq = self.ARQ
+        if arq:     # packets which the relay is missing are sent before new ones
+            retransmit = self.retransmit_queue[0:burst_size]
+            self.retransmit_queue = self.retransmit_queue[burst_size:]
+        else:
+            retransmit = []
+        num_retransmit = len(retransmit)
+        data_size = self.data_size
+        backlogged = True
+        coding = self.coding
+        traces = []
+        tr = tracing.active
+        trace = None
         for i in amount:
-            data = data_source()
+            if tr is not None:
+                trace = tr.begin('tx')
+            if i < num_retransmit:
+                (packet_id, data) = retransmit[i]
+            else:
+                packet_id = local_packet_id
+                if trace is not None:
+                    source_start = time.time()
+                data = data_source()
+                if trace is not None:
+                    tr.span(trace, 'get_data', source_start)
+                if len(data) < data_size:
+                    backlogged = False  # the source ran dry, a longer burst would not have been filled
+                # increment the packet ID and check for not exceeding the limit
+                local_packet_id += 1
+                if local_packet_id > upper_limit:
+                    local_packet_id =  lower_limit
             if i < (burst_size - 1):
-                header = create_header(local_packet_id, len(data), False)    # use local reference to function
+                header = create_header(packet_id, len(data), False)    # use local reference to function
+                payload = header + data
+            elif arq:   # last packet in burst, it acknowledges the packets of the other node
+                header = create_header(packet_id, len(data), True, True)
+                payload = header + data + protocol_header.ACK_BLOCK.pack(*self.arq_rx.ack())
             else:   # last packet in burst
-                header = create_header(local_packet_id, len(data), True)        # use local reference to function
-            payload = header + data
+                header = create_header(packet_id, len(data), True)        # use local reference to function
+                payload = header + data
             if nc: # network coding enabled?
-                self.last_packets[local_packet_id] = payload     #keep track of the former sent packets
-            payload = self.wrap_in_frame(payload)
+                self.last_packets.put(packet_id, payload)     #keep track of the former sent packets
+            if arq:
+                self.arq_tx.sent(packet_id, (packet_id, data))
+            if coding is None:
+                payload = self.wrap_in_frame(payload)
+                if trace is not None:
+                    payload = tr.attach(payload, trace)     # until it is sent
+            if tr is not None:
+                tr.end()
             list.append(payload)
+            traces.append(trace)
             if verb:
                 print "packet created"
-                
-            # increment the packet ID and check for not exceeding the limit
-            local_packet_id += 1
-            if local_packet_id > upper_limit:
-                local_packet_id =  lower_limit
+        if coding is not None:  # the frames of the whole burst are channel encoded in parallel
+            list = self.wrap_burst(list, traces)
         self.packet_id = local_packet_id # save value
+        self.burst_sent = True
+        self.backlogged = backlogged
+        self.burst_assembly_time.observe(time.time() - start)
         
         # send data out
         map(send, list)
@@ -1142,48 +2110,193 @@ class node (network_member):
             print "burst sent!"
         return
 
+    # adapts the burst size to the outcome of our last burst before the next one is sent
+    # with ARQ the acknowledgement of the relay tells whether packets were lost, otherwise frames with errors received since the last request indicate a bad channel
+    # request_ok: False if the request itself had errors
+    def adapt_burst_size(self, request_ok = True):
+        errors = self.n_rcvd - self.n_right
+        if self.burst_sent:
+            if self.ARQ:
+                lost = self.retransmit_queue != []
+            else:
+                lost = errors > self.errors_at_request
+            if lost or (request_ok == False):
+                self.burst_control.loss()
+            else:
+                self.burst_control.success(self.backlogged)
+            self.BURST_SIZE = self.burst_control.size
+        self.errors_at_request = errors
+        self.burst_sent = False
+
+    # the current burst size is shown by the GUI of a node
+    def extra_statistics(self):
+        return [self.BURST_SIZE]
+
+    # registers the metrics of the node in addition to the common ones
+    def register_metrics(self):
+        network_member.register_metrics(self)
+        metrics = self.metrics
+        metrics.gauge('relaying_burst_size', 'Current number of packets in a burst', function = lambda: self.BURST_SIZE)
+        metrics.gauge('relaying_last_packets', 'Own packets kept for network decoding', function = lambda: len(self.last_packets))
+        metrics.counter('relaying_last_packets_misses_total', 'Own packets which were needed for network decoding but not stored anymore', function = lambda: self.last_packets.misses)
+        if self.VIDEO_STREAMING:
+            metrics.counter('relaying_video_underruns_total', 'Times the jitter buffer of the video output ran empty', function = lambda: self.output.underruns)
+            metrics.counter('relaying_video_late_packets_total', 'Video packets which arrived after their turn', function = lambda: self.output.late)
+            metrics.counter('relaying_video_lost_packets_total', 'Missing video packets which were skipped', function = lambda: self.output.lost)
+            metrics.counter('relaying_video_datagrams_total', 'Datagrams sent to the video player', function = lambda: self.output.datagrams)
+        if self.TRAFFIC_GENERATOR:
+            metrics.counter('relaying_traffic_received_total', 'Correct generated packets of the partner', function = lambda: self.output.received)
+            metrics.counter('relaying_traffic_lost_total', 'Generated packets of the partner which were not received', function = lambda: self.output.lost())
+            metrics.counter('relaying_traffic_corrupted_total', 'Generated packets of the partner with wrong content', function = lambda: self.output.corrupted)
+            metrics.counter('relaying_traffic_overflows_total', 'Generated packets dropped from the backlog', function = lambda: self.source.overflows)
+        if self.TUNNEL:
+            metrics.gauge('relaying_tunnel_queued_bytes', 'Bytes of datagrams waiting to be sent through the tunnel', function = lambda: self.source.queued_bytes)
+            metrics.counter('relaying_tunnel_received_datagrams_total', 'Datagrams received from the local application', function = lambda: self.source.datagrams)
+            metrics.counter('relaying_tunnel_delivered_datagrams_total', 'Datagrams of the partner delivered to the local application', function = lambda: self.output.datagrams)
+            metrics.counter('relaying_tunnel_incomplete_datagrams_total', 'Datagrams of the partner dropped as fragments were missing', function = lambda: self.output.incomplete)
+            metrics.counter('relaying_tunnel_dropped_datagrams_total', 'Datagrams of the partner which could not be delivered', function = lambda: self.output.dropped)
+        if (self.source is not None) and (self.source.remaining() is not None):
+            metrics.gauge('relaying_source_remaining_bytes', 'Bytes of the source which were not sent yet', function = lambda: self.source.remaining())
+        if self.ARQ:
+            metrics.gauge('relaying_arq_unacknowledged_packets', 'Sent packets which were not acknowledged yet', function = lambda: len(self.arq_tx))
+            metrics.gauge('relaying_retransmit_queue_packets', 'Packets waiting for their retransmission', function = lambda: len(self.retransmit_queue))
+            metrics.counter('relaying_arq_retransmissions_total', 'Retransmitted packets', function = lambda: self.arq_tx.retransmissions)
+            metrics.counter('relaying_arq_dropped_total', 'Packets which were dropped after the maximum number of transmissions', function = lambda: self.arq_tx.dropped)
+            metrics.counter('relaying_arq_duplicates_total', 'Received packets which had been received before', function = lambda: self.arq_rx.duplicates)
+        else:
+            metrics.counter('relaying_duplicates_total', 'Received packets which had been received before, e.g. over the direct link', function = lambda: self.received_ids.duplicates)
+        if self.RLNC:
+            metrics.counter('relaying_rlnc_decoded_total', 'Decoded RLNC generations', function = lambda: self.rlnc_decoded)
+            metrics.counter('relaying_rlnc_failed_total', 'RLNC generations which could not be decoded', function = lambda: self.rlnc_failed)
+
+    # this function network decodes a received network-coded packet with our own packet and stores the data of the other node
+    # paramters:
+    # payload:  the network-coded part of the received packet (length inclusive)
+    # mypacket: the part of our own packet (length inclusive) which is part of the network-coded packet
+    # pid:      the ID of the packet of the other node
+    def decode_coded(self, payload, mypacket, pid):
+        decoded = self.mynetworkcoder.network_decode_burst([payload], [mypacket])
+        length = int(decoded[0, 0])
+        self.data_rcvd += length
+        self.store_data(decoded[0, 1:length+1].tostring(), pid)
+
+    # processes the acknowledgement of the relay which is part of a request to us
+    # a request without an acknowledgement block acknowledges all packets we have sent so far
+    def process_ack(self, header_first, payload):
+        if header_first[7]:
+            try:
+                (base, bitmap) = protocol_header.ACK_BLOCK.unpack_from(payload, self.HEADER_LEN_RELAY)
+            except:
+                print "Error: invalid acknowledgement block!"
+                return
+            self.retransmit_queue = self.arq_tx.ack(base, bitmap)
+            if self.verbose:
+                print "The relay is missing %d packets" % (len(self.retransmit_queue))
+        else:
+            self.arq_tx.ack_all()
+            self.retransmit_queue = []
+
+    # this function handles a packet which was network-coded with RLNC
+    # our own packets are removed from the combination, the remaining combination of the packets of our partner is added to the decoder of its generation
+    def receive_rlnc(self, payload):
+        try:
+            (generation, ids_a, ids_b, coefficients, offset) = self.myheader.parse_rlnc(payload)
+        except:
+            print "Got a malformed RLNC packet!"
+            return
+        if ids_a + ids_b == []:
+            return
+        first_id = (ids_a + ids_b)[0]
+        if ((first_id < self.SEND_DATA_ID_LOWER_LIMIT) or (first_id > self.SEND_DATA_ID_UPPER_LIMIT)) and ((first_id < self.RECEIVE_ID_LOWER_LIMIT) or (first_id > self.RECEIVE_ID_UPPER_LIMIT)):
+            if self.verbose:
+                print "It was a network-coded packet for another pair of nodes!"
+            self.n_other_aim += 1
+            return
+        num_a = len(ids_a)
+        if self.FIRST_OF_PAIR:
+            (own_ids, own_coefficients, other_ids, other_coefficients) = (ids_a, coefficients[0:num_a], ids_b, coefficients[num_a:])
+        else:
+            (own_ids, own_coefficients, other_ids, other_coefficients) = (ids_b, coefficients[num_a:], ids_a, coefficients[0:num_a])
+        decoder = self.rlnc_generations.get(generation, False)
+        if (decoder is None) or (other_ids == []):
+            return  # already decoded or there is nothing for us
+        symbol = zeros(256, uint8)
+        coded = payload[offset:]
+        symbol[0:len(coded)] = frombuffer(coded, dtype = uint8)
+        for i in range(len(own_ids)):
+            our_packet = self.last_packets.get(own_ids[i])
+            if our_packet is None:
+                print "Warning: could not decode packet as I have not stored a packet with ID %4d" % (own_ids[i])
+                return
+            own = frombuffer(our_packet, dtype = uint8, count = ord(our_packet[3]) + 1, offset = 3)    # length inclusive
+            add_mul_row(symbol[0:len(own)], own, ord(own_coefficients[i]))
+        if decoder == False:
+            decoder = rlnc_decoder(len(other_ids))
+            self.rlnc_generations[generation] = decoder
+        decoder.add(frombuffer(other_coefficients, dtype = uint8).copy(), symbol)
+        if decoder.complete():
+            self.rlnc_generations[generation] = None
+            self.rlnc_decoded += 1
+            store = self.store_data
+            for i in range(len(other_ids)):
+                length = int(decoder.symbols[i, 0])
+                self.data_rcvd += length
+                store(decoder.symbols[i, 1:length+1].tostring(), other_ids[i])
+
+    # the generations which are not decoded at the end of a burst of the relay cannot be decoded anymore as their combinations are not sent again
+    def drop_rlnc_generations(self):
+        for decoder in self.rlnc_generations.values():
+            if decoder is not None:
+                self.rlnc_failed += 1
+        self.rlnc_generations = {}
+
     # this function gets the data which should be sent out
+    # the source hands out slices of a mapped file or prepared packets, see data_sources.py
     def get_data(self):
-        if (self.FILE_TRANSFER == True) or (self.TRANSFER_RANDOM_DATA == True) or self.VIDEO_STREAMING == True:
-            if self.channel_code_nr == 0: # no channel coding
-                return self.source.read(self.DATA_SIZE_NO_CHANNEL_CODE)
-            elif self.channel_code_nr == 1:   #RS
-                return self.source.read(self.DATA_SIZE_RS_CODE)
-        elif self.TRANSFER_CONSTANT_DATA == True:
-            if self.channel_code_nr == 0: # no channel coding
-                res = '5'*self.DATA_SIZE_NO_CHANNEL_CODE
-            elif self.channel_code_nr == 1:   #RS
-                res = '5'*self.DATA_SIZE_RS_CODE
-            else:
-                print "ERROR: no such channel code!"
-            return res
+        if self.source is not None:
+            return self.source.read(self.data_size)
         else:
             print "Error: No data to send!"
             return ''
 
     # this function stores the data which was received
     def store_data(self, data = '', pid = 0):
-        if (self.DIRECT_LINK == False) or ((self.DIRECT_LINK == True) and (pid != self.last_node_id)):  # only store data if it has not been stored before
-            if self.VIDEO_STREAMING == True:
-                self.output.sendto(data, ("localhost", 1234))
-                if self.verbose:
-                    print "Sent data to VLC media player!"
-            elif self.FILE_TRANSFER == True:
-                self.output.write(data)
-                if self.verbose:
-                    print "Wrote data into file!"
-            elif self.TRANSFER_CONSTANT_DATA == True:
-                if self.verbose:
-                    print data
-                if self.test:
-                    self.output_buffer.append(data)
-            else:
-                print "Nothing to do with received data!"
+        tr = tracing.active
+        if tr is not None:
+            trace = tr.current()
+            if trace is not None:
+                start = time.time()
+        if self.ARQ:
+            if self.arq_rx.receive(pid) == False:
+                return True     # a retransmission of data which has already been stored
+        elif self.received_ids.first(pid) == False:
+            if self.verbose:
+                print "Not storing data as it has already been stored."
+            return True
+        if self.VIDEO_STREAMING == True:
+            self.output.write(pid, data)
+            if self.verbose:
+                print "Sent data to VLC media player!"
+        elif self.FILE_TRANSFER == True:
+            self.output.write(pid, data)
+            if self.verbose:
+                print "Wrote data into file!"
+        elif self.TRANSFER_CONSTANT_DATA == True:
+            if self.verbose:
                 print data
+            if self.test:
+                self.output_buffer.append(data)
+        elif self.TRAFFIC_GENERATOR == True:
+            self.output.check(data)
+        elif self.TUNNEL == True:
+            self.output.write(pid, data)
         else:
-            print "Not storing data as it has already been stored."
-        if (len(data) is not self.DATA_SIZE_NO_CHANNEL_CODE) and (len(data) is not self.DATA_SIZE_RS_CODE):
+            print "Nothing to do with received data!"
+            print data
+        if (len(data) != self.data_size) and not (self.TRAFFIC_GENERATOR and (data == '')) and not self.TUNNEL:   # the generator sends empty packets while nothing arrives, the packets of the tunnel are as long as the waiting fragments
             print "Data has invalid size of: " + str(len(data))
+        if (tr is not None) and (trace is not None):
+            tr.span(trace, 'store_data', start)
         return True
 # end of class node
 
@@ -1201,13 +2314,21 @@ class node (network_member):
     # bidirectional: only relevant for a relay
     # benchmark: only relevant for a relay
     # gui: reference to the GUI, if there is no GUI: None
-    # pipe: write pipeline to the process running the GUI, used for updating the displayed statistical information; if there is no GUI: None
-    # timeout: value for the timeout in seconds, only relevant for a relay
+    # statistics: shared_statistics block which is read by the process running the GUI, used for updating the displayed statistical information; if there is no GUI: None
+    # timeout: value for the timeout in seconds (fractions of a second are possible), only relevant for a relay
+    # metrics_port: TCP port on the local host on which the metrics are served over HTTP, None or 0: not served
+    # trace_every: every trace_every-th packet is traced through the stack and its spans are written to TRACE_FILE, 0: no tracing
+    # capture_file: all sent and received frames are captured into this file (see frame_capture.py), None: no capture
+    # traffic_model: arrival model of the generated traffic (transmission type 'G'), see traffic.py
+    # coding_workers: number of processes for channel coding (see coding_pool.py), 0: coding in the sending and the receiving thread
+    # numpy_codec: True = the Reed-Solomon codec of rs_codec.py is used instead of the reedsolomon module, all stations have to use the same codec
+    # tunnel_listen, tunnel_deliver: local sockets on which the datagrams for the partner are received and to which its datagrams are sent (transmission type 'T'), see tunnel.py
     # node_id: when this is a node, an ID has to be specified; possible values are A and B
     # burst. number of packets inside a burst
     # direct_link: True = direct link used, False = direct link ignored, only relevant for a node
+    # adaptive_burst: True = the burst size of a node is adapted at runtime, starting with burst_size, up to max_burst_size packets
     
-def main(RELAY, side, freq, rate, tx_gain, rx_gain, transmission_type, nc, direct_link, bidirectional, benchmark, gui, write_pipeline, timeout, node_id, burst_size, channel_code_nr):
+def main(RELAY, side, freq, rate, tx_gain, rx_gain, transmission_type, nc, direct_link, bidirectional, benchmark, gui, statistics, timeout, node_id, burst_size, channel_code_nr, arq = False, nodes = 'AB', rlnc = False, adaptive_burst = False, max_burst_size = burst_controller.DEFAULT_MAX_BURST_SIZE, metrics_port = None, trace_every = 0, capture_file = None, traffic_model = 'saturated', tunnel_listen = tunnel.LISTEN, tunnel_deliver = tunnel.DELIVER, coding_workers = 0, numpy_codec = False):
         
     # Using fixed parameters from the parameter class
     myparameters = parameter(side, freq, rate, tx_gain, rx_gain)
@@ -1218,8 +2339,8 @@ def main(RELAY, side, freq, rate, tx_gain, rx_gain, transmission_type, nc, direc
 
     tb_tx = mytx_top_block(mods[options_tx.modulation], options_tx)
 
-    if (gui is not None) and (write_pipeline is None):
-        print "Fatal Error, no write pipeline!"
+    if (gui is not None) and (statistics is None):
+        print "Fatal Error, no block for the statistics!"
         sys.exit(1)
 
     if (gui is None):
@@ -1228,9 +2349,9 @@ def main(RELAY, side, freq, rate, tx_gain, rx_gain, transmission_type, nc, direc
     if RELAY:
         # as we are the relay initialising as relay
         print "start-up as relay"
-        myself = relay(tb_tx, nc, bidirectional, benchmark, gui, write_pipeline, timeout, channel_code_nr)
+        myself = relay(tb_tx, nc, bidirectional, benchmark, gui, statistics, timeout, channel_code_nr, arq, nodes, rlnc, coding_workers, options_tx.bitrate, numpy_codec)
     else:   # we are a node
-        myself = node(tb_tx, transmission_type, node_id, nc, direct_link, gui, write_pipeline, burst_size, channel_code_nr, bidirectional)
+        myself = node(tb_tx, transmission_type, node_id, nc, direct_link, gui, statistics, burst_size, channel_code_nr, bidirectional, arq=arq, nodes=nodes, rlnc=rlnc, adaptive_burst=adaptive_burst, max_burst_size=max_burst_size, traffic_model=traffic_model, tunnel_listen=tunnel_listen, tunnel_deliver=tunnel_deliver, coding_workers=coding_workers, numpy_codec=numpy_codec)
 
     # build the receive graph
     demods = modulation_utils.type_1_demods()   # all types of demodulation
@@ -1238,11 +2359,22 @@ def main(RELAY, side, freq, rate, tx_gain, rx_gain, transmission_type, nc, direc
 
     tb_rx = myrx_top_block(demods[options_rx.modulation], myself.rx_callback, options_rx)
 
-    sys.argv[0] = write_pipeline
-    print sys.argv[0]
-
     if RELAY == True:
         myself.set_tb_rx(tb_rx)
+
+    if metrics_port:
+        try:
+            myself.metrics.start_server(metrics_port)
+        except:
+            print "Warning: metrics could not be served on port " + str(metrics_port)
+
+    if trace_every:
+        tracing.start(TRACE_FILE, trace_every)
+        print "Info: tracing every %d. packet into %s" % (trace_every, TRACE_FILE)
+
+    if capture_file:
+        myself.capture = frame_capture.frame_capture(capture_file, myself.capture_header)
+        print "Info: capturing frames into " + capture_file
     
     r = gr.enable_realtime_scheduling()
     if r != gr.RT_OK:
@@ -1262,8 +2394,10 @@ def main(RELAY, side, freq, rate, tx_gain, rx_gain, transmission_type, nc, direc
     myself.start_time = time.time()     # save time of start-up
     
     if RELAY == True:
+        myself.lock.acquire()   # packets may already be received
         myself.send_request()   # kick-off
-        signal.alarm(timeout) # start first timeout
+        myself.start_timeout() # start first timeout
+        myself.lock.release()
 
     # there is noting which keeps the process alive, so we have to wait here until the communication- thread has been terminated
     try:
@@ -1271,9 +2405,8 @@ def main(RELAY, side, freq, rate, tx_gain, rx_gain, transmission_type, nc, direc
     except:
         pass
 
-if sys.argv[0] == "GUI":
-    pass    # there is a gui which will invoke the main-function when this is neccessary
-elif __name__ == '__main__':
+# when the module is imported (by the GUI or by the tools like replay.py) the importer invokes the main-function if this is neccessary
+if __name__ == '__main__':
     info = dict()
     try:
         relay = True                    # true = station is relay, false = station is node
@@ -1282,18 +2415,29 @@ elif __name__ == '__main__':
         rate='512k'
         tx_gain='20'
         rx_gain='66'
-        transmission_type='C'      # valid values are: 'C': constant data, 'F': file, 'V': video, 'R': random values
+        transmission_type='C'      # valid values are: 'C': constant data, 'F': file, 'V': video, 'R': random values, 'G': generated traffic, 'T': datagram tunnel
         network_coding = True
         direct_link = False
         bidirectional = True
         benchmark = False
         timeout = 1
-        node_id = 'A'                   # valid values are 'A' and 'B'
+        node_id = 'A'                   # valid values are the IDs in nodes
         burst_size = 1
         channel_code_nr = 1
-        main(relay, side, freq, rate, tx_gain, rx_gain, transmission_type, network_coding, direct_link, bidirectional, benchmark, None, None, timeout, burst_size, node_id, channel_code_nr)
+        arq = False                     # selective-repeat ARQ between the relay and the nodes
+        nodes = 'AB'                    # IDs of all nodes of the network, the nodes are paired in this order
+        rlnc = False                    # network coding with random linear combinations instead of XOR
+        adaptive_burst = False          # adapt the burst size of a node at runtime, burst_size is the initial one then
+        max_burst_size = 32
+        metrics_port = None             # e.g. 9100 for serving the metrics on http://127.0.0.1:9100/
+        trace_every = 0                 # e.g. 100 for tracing every 100th packet, 0: no tracing
+        capture_file = None             # e.g. "./frames.cap" for capturing all frames
+        traffic_model = 'saturated'     # for generated traffic: 'saturated', 'cbr:<packets/s>', 'poisson:<packets/s>' or 'onoff:<packets/s>:<mean on s>:<mean off s>'
+        tunnel_listen = 'udp:127.0.0.1:7000'   # for the datagram tunnel: 'udp:<host>:<port>' or 'unix:<path>'
+        tunnel_deliver = 'udp:127.0.0.1:7001'
+        coding_workers = 0              # e.g. 2 for channel coding in 2 processes
+        numpy_codec = False             # True: Reed-Solomon codec of rs_codec.py instead of the reedsolomon module, on all stations
+        main(relay, side, freq, rate, tx_gain, rx_gain, transmission_type, network_coding, direct_link, bidirectional, benchmark, None, None, timeout, burst_size, node_id, channel_code_nr, arq, nodes, rlnc, adaptive_burst, max_burst_size, metrics_port, trace_every, capture_file, traffic_model, tunnel_listen, tunnel_deliver, coding_workers, numpy_codec)
     except KeyboardInterrupt:
         pass
-else:
-    print "This should not happen!"
 
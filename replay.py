@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# offline replay of channel coded frames into the receive callback of a relay or a node without running flow graphs
+# the frames are read from a capture file (see frame_capture.py) or generated by stations which are set up for this purpose
+# they are fed into rx_callback as fast as possible, the frames sent by the station are kept in its output_buffer
+# the throughput and the CPU time per frame of the protocol stack alone are reported
+# timeouts never expire during a replay and the random generators are seeded, so a replay is deterministic
+#
+# examples: replay.py -s R --frames 20000                   relay with synthetic frames of the nodes A and B
+#           replay.py -s A --capture relay.cap --direction tx    node A with the frames a relay has sent in the field
+
+import os, sys, time, random
+from optparse import OptionParser
+import numpy.random
+import relaying
+import frame_capture
+
+PHYSICAL_HEADER_LEN = 4     # the header added by add_physical_header is removed by the framer before rx_callback is called
+
+# replaces the timer_service of a station during a replay, the timers never expire
+class null_timer:
+    armed = 0
+
+    def arm(self, timeout, function, *args):
+        self.armed += 1
+        return None
+
+    def cancel(self, timer):
+        pass
+
+    def stop(self):
+        pass
+# end of class null_timer
+
+# sets up a station without flow graphs, station: 'R' for the relay or the ID of a node
+def make_station(station, options):
+    if station == 'R':
+        member = relaying.relay(None, options.nc, True, False, None, None, 1.0, options.channel_code, options.arq, options.nodes, options.rlnc,
+                                numpy_codec=options.numpy_codec)
+    else:
+        member = relaying.node(None, 'C', station, options.nc, False, None, None, options.burst, options.channel_code, True,
+                               arq=options.arq, nodes=options.nodes, rlnc=options.rlnc, numpy_codec=options.numpy_codec)
+    if member.timer is not None:
+        member.timer.stop()
+        member.timer = null_timer()
+    member.start_time = time.time()
+    return member
+
+# returns the frames sent by a station since the last call, without the physical header
+def take_output(member):
+    frames = [frame[PHYSICAL_HEADER_LEN:] for frame in member.output_buffer if frame]
+    member.output_buffer = []
+    return frames
+
+# returns the frames of a capture file which were sent or received (direction) by the captured station
+def load_capture(path, direction):
+    reader = frame_capture.capture_reader(path)
+    frames = [record[7] for record in reader if record[1] == direction]
+    reader.close()
+    return frames
+
+# returns count frames as they would be received by station
+# a relay and the nodes exchange frames without losses, the frames sent to station are kept
+def synthetic_frames(station, options, count):
+    relay = make_station('R', options)
+    senders = [make_station(current, options) for current in options.nodes]
+    frames = []
+    relay.send_request()
+    while len(frames) < count:
+        moved = False
+        for sender in senders:
+            burst = take_output(sender)
+            if station == 'R':
+                frames.extend(burst)
+            for frame in burst:
+                relay.rx_callback(frame)
+                moved = True
+        burst = take_output(relay)
+        if station != 'R':
+            frames.extend(burst)
+        for frame in burst:
+            for sender in senders:
+                sender.rx_callback(frame)
+            moved = True
+        if not moved:   # no timeouts during the generation, so the relay has to start again
+            relay.send_request()
+    return frames[0:count]
+
+# feeds the frames into the station, returns (wall clock time, user CPU time, system CPU time) in seconds
+def replay(member, frames, repeat):
+    callback = member.rx_callback
+    start_times = os.times()
+    start = time.time()
+    for i in xrange(repeat):
+        for frame in frames:
+            callback(frame)
+    elapsed = time.time() - start
+    end_times = os.times()
+    return (elapsed, end_times[0] - start_times[0], end_times[1] - start_times[1])
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-s", "--station", default='R', help="station to replay into: R for the relay or the ID of a node [default=%default]")
+    parser.add_option("--capture", default=None, help="read the frames from this capture file instead of generating them")
+    parser.add_option("--direction", default='rx', choices=['rx', 'tx'], help="replay the frames the captured station has received (rx) or sent (tx) [default=%default]")
+    parser.add_option("--frames", type="int", default=10000, help="number of synthetic frames [default=%default]")
+    parser.add_option("--repeat", type="int", default=1, help="number of times the frames are replayed [default=%default]")
+    parser.add_option("--nodes", default='AB', help="IDs of the nodes of the network [default=%default]")
+    parser.add_option("--burst", type="int", default=3, help="burst size of the nodes [default=%default]")
+    parser.add_option("--channel-code", type="int", default=1, help="0: no channel code, 1: RS [default=%default]")
+    parser.add_option("--numpy-codec", action="store_true", default=False, help="use the Reed-Solomon codec of rs_codec.py instead of the reedsolomon module")
+    parser.add_option("--no-nc", action="store_false", dest="nc", default=True, help="disable network coding")
+    parser.add_option("--arq", action="store_true", default=False, help="enable the selective-repeat ARQ")
+    parser.add_option("--rlnc", action="store_true", default=False, help="network coding with random linear combinations")
+    parser.add_option("--seed", type="int", default=1, help="seed of the random generators [default=%default]")
+    parser.add_option("--output", default=None, help="capture the frames sent by the station into this file")
+    parser.add_option("--profile", action="store_true", default=False, help="show the functions which take the most time")
+    (options, args) = parser.parse_args()
+    if (options.station != 'R') and (options.station not in options.nodes):
+        parser.error("unknown station " + options.station)
+
+    random.seed(options.seed)
+    numpy.random.seed(options.seed)
+    if options.capture is not None:
+        if options.direction == 'rx':
+            frames = load_capture(options.capture, frame_capture.RX)
+        else:
+            frames = load_capture(options.capture, frame_capture.TX)
+    else:
+        frames = synthetic_frames(options.station, options, options.frames)
+    if frames == []:
+        print "Error: no frames to replay!"
+        sys.exit(1)
+
+    random.seed(options.seed)
+    numpy.random.seed(options.seed)
+    member = make_station(options.station, options)
+    if options.profile:
+        import cProfile, pstats
+        profiler = cProfile.Profile()
+        (elapsed, user, system) = profiler.runcall(replay, member, frames, options.repeat)
+    else:
+        (elapsed, user, system) = replay(member, frames, options.repeat)
+    sent = take_output(member)
+
+    num = len(frames) * options.repeat
+    print "replayed %d frames into %s in %.3f s" % (num, options.station, elapsed)
+    print "  frames per second:    %.0f" % (num / max(elapsed, 1e-9))
+    print "  CPU time per frame:   %.1f us (user %.1f us, system %.1f us)" % ((user + system) * 1e6 / num, user * 1e6 / num, system * 1e6 / num)
+    print "  correct frames:       %d of %d" % (member.n_right, member.n_rcvd)
+    print "  received data:        %d byte" % (member.data_rcvd)
+    print "  sent frames:          %d" % (len(sent))
+    if options.profile:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+    if options.output is not None:
+        capture = frame_capture.frame_capture(options.output, member.capture_header)
+        decode = member.mychannelcoder.channel_decode
+        for frame in sent:
+            capture.record(frame_capture.TX, frame, decode(frame)[0:-4], True)
+        capture.close()
+        print "sent frames captured into " + options.output
+
+if __name__ == '__main__':
+    main()
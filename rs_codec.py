@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# Reed-Solomon codec over GF(2^8) (see gf256.py) written with NumPy, it can be used instead of the reedsolomon module
+# Codec(n, k) has the same encode/decode methods as reedsolomon.Codec, codes with n < 255 are shortened
+# the code is systematic (the data is followed by the n - k parity bytes, the first byte is the coefficient of the highest
+# power) and the roots of the generator polynomial are alpha^FCR ... alpha^(FCR + n - k - 1)
+# stations using this codec and stations using the reedsolomon module only understand each other if the module uses the same
+# parameters, e.g. the ones of rscode, which has not been verified, so a station only uses this codec if it is selected explicitly
+# (numpy_codec of relaying.main) and all stations of a network have to use the same codec
+#
+# encoding and the syndromes are linear in the bytes of a frame, so they are computed with tables holding the contribution of
+# every byte value at every position, a batch of frames is handled by one lookup and one XOR over all positions
+# only frames with non-zero syndromes are corrected one by one (Berlekamp-Massey, Chien search and Forney's algorithm)
+
+from numpy import arange, bitwise_xor, frombuffer, identity, nonzero, ones, uint8, uint32, uint64, zeros
+from gf256 import EXP, LOG, MUL
+
+FCR = 1     # first consecutive root of the generator polynomial
+
+_EXP = [int(value) for value in EXP]
+_LOG = [int(value) for value in LOG]
+_tables = {}    # (n, k, fcr) -> tables, they are shared by all codecs with the same parameters
+
+# returns the widest unsigned integer type into which width bytes can be viewed, so the XOR handles several bytes at once
+def _word_type(width):
+    if width % 8 == 0:
+        return uint64
+    if width % 4 == 0:
+        return uint32
+    return uint8
+
+# XOR of the rows table[position, byte] over all positions of each frame, frames: b x positions, table: positions x 256 x width
+def _xor_lookup(table, frames, word):
+    rows = table[arange(frames.shape[1]), frames]   # b x positions x width
+    return bitwise_xor.reduce(rows.view(word), axis=1).view(uint8)
+
+class Codec:
+
+    def __init__(self, n, k, fcr = FCR):
+        if not (0 < k < n <= 255):
+            raise ValueError("invalid Reed-Solomon code (%d, %d)" % (n, k))
+        self.n = n
+        self.k = k
+        self.nroots = n - k
+        self.fcr = fcr
+        self.word = _word_type(self.nroots)
+        key = (n, k, fcr)
+        if key not in _tables:
+            _tables[key] = self.make_tables()
+        (self.generator, self.parity_table, self.syndrome_table, self.chien) = _tables[key]
+
+    def make_tables(self):
+        n = self.n
+        k = self.k
+        nroots = self.nroots
+        # generator polynomial, the highest power first
+        generator = [1]
+        for i in range(nroots):
+            root = _EXP[(self.fcr + i) % 255]
+            product = generator + [0]
+            for j in range(1, len(product)):
+                if generator[j - 1] != 0:
+                    product[j] ^= _EXP[_LOG[generator[j - 1]] + _LOG[root]]
+            generator = product
+        self.generator = generator
+        # parity of a message which is 1 at a single position, then of every byte value at every position
+        unit = self.remainder(identity(k, uint8))
+        parity_table = MUL[arange(256).reshape(1, 256, 1), unit.reshape(k, 1, nroots)]          # k x 256 x nroots
+        # value of the powers of the roots at every position of a frame, the first byte has the power n - 1
+        powers = (n - 1 - arange(n)).reshape(n, 1) * (self.fcr + arange(nroots)).reshape(1, nroots)
+        unit = EXP[powers % 255].astype(uint8)
+        syndrome_table = MUL[arange(256).reshape(1, 256, 1), unit.reshape(n, 1, nroots)]        # n x 256 x nroots
+        # alpha^(-p * i) for the Chien search at the powers p of the positions of a frame
+        chien = EXP[(255 - (arange(n).reshape(n, 1) * arange(nroots + 1).reshape(1, nroots + 1)) % 255) % 255].astype(uint8)
+        return (generator, parity_table, syndrome_table, chien)
+
+    # returns the parity of a batch of messages (b x k) by the shift register of the generator polynomial, used for the tables
+    def remainder(self, messages):
+        parity = zeros((messages.shape[0], self.nroots), uint8)
+        feedback_products = MUL[arange(256).reshape(256, 1), self.generator[1:]]    # 256 x nroots
+        for j in range(self.k):
+            feedback = messages[:, j] ^ parity[:, 0]
+            parity[:, 0:-1] = parity[:, 1:]
+            parity[:, -1] = 0
+            parity ^= feedback_products[feedback]
+        return parity
+
+    # returns the parity bytes of a batch of messages (b x k uint8 array) as b x (n - k) array
+    def parity(self, messages):
+        return _xor_lookup(self.parity_table, messages, self.word)
+
+    # returns the code words of a batch of messages (b x k uint8 array) as b x n array
+    def encode_batch(self, messages):
+        frames = zeros((messages.shape[0], self.n), uint8)
+        frames[:, 0:self.k] = messages
+        frames[:, self.k:] = self.parity(messages)
+        return frames
+
+    # returns the syndromes of a batch of received frames (b x n uint8 array) as b x (n - k) array, a row of zeros for a correct frame
+    def syndromes(self, frames):
+        return _xor_lookup(self.syndrome_table, frames, self.word)
+
+    # corrects a batch of received frames (b x n uint8 array)
+    # returns (data, ok): the corrected data as b x k array and for each frame True if it could be corrected
+    def decode_batch(self, frames):
+        frames = frames.copy()
+        syndromes = self.syndromes(frames)
+        ok = ones(frames.shape[0], bool)
+        for i in nonzero(syndromes.any(axis=1))[0]:
+            ok[i] = self.correct(frames[i], syndromes[i]) is not None
+        return (frames[:, 0:self.k], ok)
+
+    # corrects a frame (uint8 array of n bytes) in place with its syndromes, returns the list of corrected positions, None if it failed
+    def correct(self, frame, syndromes):
+        exp = _EXP
+        log = _LOG
+        nroots = self.nroots
+        syndromes = [int(value) for value in syndromes]
+        # Berlekamp-Massey: error locator polynomial, the lowest power first
+        locator = [1] + [0] * nroots
+        previous = [1] + [0] * nroots
+        length = 0
+        shift = 1
+        last = 1    # discrepancy when previous was the locator
+        for r in range(nroots):
+            discrepancy = syndromes[r]
+            for i in range(1, length + 1):
+                if (locator[i] != 0) and (syndromes[r - i] != 0):
+                    discrepancy ^= exp[log[locator[i]] + log[syndromes[r - i]]]
+            if discrepancy == 0:
+                shift += 1
+                continue
+            factor = log[discrepancy] - log[last] + 255
+            update = locator[:]
+            for i in range(shift, nroots + 1):
+                if previous[i - shift] != 0:
+                    update[i] ^= exp[(log[previous[i - shift]] + factor) % 255]
+            if 2 * length <= r:
+                length = r + 1 - length
+                previous = locator
+                last = discrepancy
+                shift = 1
+            else:
+                shift += 1
+            locator = update
+        if length > nroots // 2:
+            return None
+        # Chien search: the locator is zero at alpha^(-p) if the byte with the power p is wrong
+        coefficients = zeros(length + 1, uint8)
+        coefficients[:] = locator[0:length + 1]
+        values = bitwise_xor.reduce(MUL[coefficients.reshape(1, length + 1), self.chien[:, 0:length + 1]], axis=1)
+        powers = [int(p) for p in nonzero(values == 0)[0]]
+        if len(powers) != length:
+            return None     # the errors are not in the (shortened) frame
+        # Forney: error evaluator = syndromes * locator mod x^nroots
+        evaluator = [0] * nroots
+        for i in range(nroots):
+            if syndromes[i] == 0:
+                continue
+            for j in range(min(length + 1, nroots - i)):
+                if locator[j] != 0:
+                    evaluator[i + j] ^= exp[log[syndromes[i]] + log[locator[j]]]
+        positions = []
+        for p in powers:
+            inverse = (255 - p) % 255   # logarithm of alpha^(-p)
+            numerator = 0
+            for i in range(nroots):
+                if evaluator[i] != 0:
+                    numerator ^= exp[(log[evaluator[i]] + inverse * i) % 255]
+            denominator = 0     # derivative of the locator, only the odd powers remain
+            for i in range(1, length + 1, 2):
+                if locator[i] != 0:
+                    denominator ^= exp[(log[locator[i]] + inverse * (i - 1)) % 255]
+            if denominator == 0:
+                return None
+            if numerator == 0:
+                continue
+            magnitude = exp[(log[numerator] - log[denominator] + p * (1 - self.fcr)) % 255]
+            position = self.n - 1 - p
+            frame[position] ^= magnitude
+            positions.append(position)
+        if self.syndromes(frame.reshape(1, self.n)).any():
+            return None
+        return positions
+
+    # interface of reedsolomon.Codec
+    # returns the code word of a message of k bytes as string
+    def encode(self, data):
+        if len(data) != self.k:
+            raise ValueError("message has %d bytes instead of %d" % (len(data), self.k))
+        return data + self.parity(frombuffer(data, uint8).reshape(1, self.k)).tostring()
+
+    # returns (data, corrected positions) of a received frame of n bytes, raises ValueError if it cannot be corrected
+    def decode(self, data):
+        if len(data) != self.n:
+            raise ValueError("frame has %d bytes instead of %d" % (len(data), self.n))
+        frame = frombuffer(data, uint8).reshape(1, self.n)
+        syndromes = self.syndromes(frame)[0]
+        if not syndromes.any():
+            return (data[0:self.k], [])
+        frame = frame[0].copy()
+        positions = self.correct(frame, syndromes)
+        if positions is None:
+            raise ValueError("too many errors")
+        return (frame[0:self.k].tostring(), positions)
+# end of class Codec
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# block of statistical counters in shared memory, written by the process running gnuradio and read by the GUI (or any other tool)
+# the block has a fixed layout and is protected by a sequence lock: the writer makes the sequence number odd before it changes the counters
+# and even again afterwards, a reader retries when the sequence number was odd or has changed while it was reading
+# writing needs no system call, so the counters can be updated with every packet
+# layout: sequence number, n_rcvd, n_right, n_trans, data_rcvd, data_trans, timeouts, elapsed time (in s), number of extra values, extra values
+
+import mmap, os, struct
+
+SEQUENCE = struct.Struct('=Q')
+BLOCK = struct.Struct('=6qdQ')
+MAX_EXTRA = 32          # at most this many extra values are kept
+EXTRA_OFFSET = SEQUENCE.size + BLOCK.size
+SIZE = EXTRA_OFFSET + MAX_EXTRA * 8
+
+class shared_statistics:
+
+    # without a path the block is anonymous shared memory, it has to be created before fork() then so that both processes map the same memory
+    # with a path the block is kept in this file, e.g. in /dev/shm, so that unrelated processes can read it
+    def __init__(self, path = None):
+        self.sequence = 0   # only the writer uses its own copy of the sequence number
+        if path is None:
+            self.map = mmap.mmap(-1, SIZE)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0644)
+            try:
+                if os.fstat(fd).st_size < SIZE:
+                    os.ftruncate(fd, SIZE)
+                self.map = mmap.mmap(fd, SIZE)
+            finally:
+                os.close(fd)
+
+    # stores a new set of values, there must be only one writer
+    def write(self, n_rcvd, n_right, n_trans, elapsed_time, data_rcvd, data_trans, timeouts = 0, extra = []):
+        shared = self.map
+        extra = extra[0:MAX_EXTRA]
+        self.sequence += 1      # odd: the values are being changed
+        SEQUENCE.pack_into(shared, 0, self.sequence)
+        BLOCK.pack_into(shared, SEQUENCE.size, n_rcvd, n_right, n_trans, data_rcvd, data_trans, timeouts, elapsed_time, len(extra))
+        if extra != []:
+            struct.pack_into('=%dq' % len(extra), shared, EXTRA_OFFSET, *extra)
+        self.sequence += 1
+        SEQUENCE.pack_into(shared, 0, self.sequence)
+
+    # returns a consistent set of values: (n_rcvd, n_right, n_trans, elapsed_time, data_rcvd, data_trans, timeouts, extra)
+    # in the same order as the arguments of write(), None if nothing was written yet or if the writer kept changing the values
+    def read(self, retries = 100):
+        shared = self.map
+        for i in range(retries):
+            start = SEQUENCE.unpack_from(shared, 0)[0]
+            if start == 0:
+                return None
+            if start & 1:   # the writer is active
+                continue
+            (n_rcvd, n_right, n_trans, data_rcvd, data_trans, timeouts, elapsed_time, num_extra) = BLOCK.unpack_from(shared, SEQUENCE.size)
+            extra = struct.unpack_from('=%dq' % min(num_extra, MAX_EXTRA), shared, EXTRA_OFFSET)
+            if SEQUENCE.unpack_from(shared, 0)[0] == start:
+                return (n_rcvd, n_right, n_trans, elapsed_time, data_rcvd, data_trans, timeouts, list(extra))
+        return None
+
+    def close(self):
+        self.map.close()
+# end of class shared_statistics
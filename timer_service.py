@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+import heapq, os, select, sys, threading, time
+
+# class for running functions after a timeout given in seconds (fractions of a second are possible)
+# all timers are kept in a heap which is handled by a single thread, the functions are also called by this thread
+# timers can be armed and cancelled from any thread
+class timer_service:
+
+    def __init__(self):
+        self.heap = []      # entries: [expiry time, sequence number, function, arguments, active flag]
+        self.lock = threading.Lock()
+        self.sequence = 0   # keeps the order of timers with the same expiry time
+        self.keep_running = True
+        # the thread sleeps in select(), writing to this pipe wakes it up when an earlier timer was armed
+        self.wake_read, self.wake_write = os.pipe()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(1)
+        self.thread.start()
+
+    # arms a timer which calls function(*args) after timeout seconds
+    # returns a reference to the timer which is needed for cancelling it
+    def arm(self, timeout, function, *args):
+        self.lock.acquire()
+        try:
+            self.sequence += 1
+            timer = [time.time() + timeout, self.sequence, function, args, True]
+            heapq.heappush(self.heap, timer)
+            wake = self.heap[0] is timer    # the thread has to recalculate how long it may sleep
+        finally:
+            self.lock.release()
+        if wake:
+            os.write(self.wake_write, 'x')
+        return timer
+
+    # cancels a timer, nothing happens if it has already expired or if timer is None
+    # note: the function of the timer may already be running in the timer thread when this is called
+    def cancel(self, timer):
+        if timer is not None:
+            timer[4] = False    # the entry is dropped when it reaches the top of the heap
+
+    # stops the timer thread, armed timers will not expire anymore
+    def stop(self):
+        self.keep_running = False
+        os.write(self.wake_write, 'x')
+
+    def run(self):
+        heap = self.heap
+        while self.keep_running:
+            self.lock.acquire()
+            timeout = None  # sleep until a timer is armed
+            expired = None
+            while heap != []:
+                timer = heap[0]
+                if timer[4] == False:   # cancelled
+                    heapq.heappop(heap)
+                elif timer[0] <= time.time():
+                    heapq.heappop(heap)
+                    timer[4] = False
+                    expired = timer
+                    break
+                else:
+                    timeout = timer[0] - time.time()
+                    break
+            self.lock.release()
+            if expired is not None:
+                try:
+                    expired[2](*expired[3])
+                except:
+                    print "Error: exception in timer function " + str(expired[2])
+                    print sys.exc_info()[1]
+                continue
+            if timeout is not None and timeout < 0:
+                continue
+            try:
+                readable = select.select([self.wake_read], [], [], timeout)[0]
+            except select.error:   # interrupted by a signal
+                continue
+            if readable != []:
+                os.read(self.wake_read, 512)
+# end of class timer_service
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# optional tracing of packets through the stack
+# every sample_every-th packet gets a trace, each stage it passes records a span (trace ID, direction, stage, start and end time)
+# the spans are kept in a ring buffer which is written to a file by a background thread, so tracing can stay switched on
+# the trace of the packet which is currently handled is kept on a stack per thread, so the stages need not pass it on
+# and a packet which is sent while a received one is handled (e.g. by the node) does not lose the trace of the received one
+# every call of begin() or resume() has to be followed by a call of end()
+# a frame which is assembled now but sent later keeps its trace by attach() and detach(), the trace is stored in the frame
+# itself (see traced_frame), so it is dropped together with a frame which is never sent
+# the stages check the module variable active first, without a tracer there is nothing else to do
+#
+# usage in a stage:
+#   tr = tracing.active
+#   if tr is not None:
+#       trace = tr.current()
+
+import collections, json, threading, time
+
+active = None   # the tracer in use, None if tracing is switched off
+
+# a frame (string) which carries the trace of its packet until it is sent
+class traced_frame(str):
+    trace = None
+# end of class traced_frame
+
+class tracer:
+    SAMPLE_EVERY = 100      # by default one packet out of 100 is traced
+    CAPACITY = 4096         # number of spans in the ring buffer, the oldest ones are dropped when it is full
+    FLUSH_INTERVAL = 1.0    # in seconds
+
+    def __init__(self, path, sample_every = SAMPLE_EVERY, capacity = CAPACITY, flush_interval = FLUSH_INTERVAL):
+        self.sample_every = max(1, sample_every)
+        self.counter = 0    # packets since the last traced one
+        self.next_id = 0
+        self.records = collections.deque(maxlen = capacity)
+        self.dropped = 0    # spans which were overwritten before they were written
+        self.local = threading.local()
+        self.output = open(path, 'a')
+        self.flush_interval = flush_interval
+        self.keep_running = True
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(1)
+        self.thread.start()
+
+    # returns the stack of traces of this thread
+    def stack(self):
+        try:
+            return self.local.stack
+        except AttributeError:
+            self.local.stack = []
+            return self.local.stack
+
+    # has to be called when a packet enters the stack, direction: 'tx' or 'rx'
+    # returns the trace of the packet if it is sampled, otherwise None, the result is also the current trace of this thread
+    def begin(self, direction):
+        self.counter += 1
+        if self.counter < self.sample_every:
+            trace = None
+        else:
+            self.counter = 0
+            self.next_id += 1
+            trace = (self.next_id, direction)
+        self.stack().append(trace)
+        return trace
+
+    # returns the trace of the packet which is handled by this thread, None if it is not traced
+    def current(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack:
+            return stack[-1]
+        return None
+
+    # makes trace (which may be None) the current trace of this thread
+    def resume(self, trace):
+        self.stack().append(trace)
+
+    # has to be called when this thread is done with the packet, the former trace becomes the current one again
+    def end(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack:
+            stack.pop()
+
+    # records that the packet of trace spent the time from start to end (now if it is None) in stage
+    def span(self, trace, stage, start, end = None):
+        if end is None:
+            end = time.time()
+        records = self.records
+        if len(records) == records.maxlen:
+            self.dropped += 1
+        records.append((trace[0], trace[1], stage, start, end))
+
+    # keeps the trace of a frame until it is sent, returns the frame which has to be sent instead of the given one
+    def attach(self, frame, trace):
+        frame = traced_frame(frame)
+        frame.trace = trace
+        return frame
+
+    # returns the trace of a frame which is about to be sent, None if it is not traced
+    def detach(self, frame):
+        return getattr(frame, 'trace', None)
+
+    def run(self):
+        while self.keep_running:
+            self.wake.wait(self.flush_interval)
+            self.flush()
+
+    # writes the recorded spans as lines of JSON
+    def flush(self):
+        records = self.records
+        lines = []
+        while True:
+            try:
+                (trace_id, direction, stage, start, end) = records.popleft()
+            except IndexError:
+                break
+            lines.append(json.dumps({'trace': trace_id, 'direction': direction, 'stage': stage, 'start': start, 'duration': end - start}))
+        if lines != []:
+            self.output.write('\n'.join(lines) + '\n')
+            self.output.flush()
+
+    # stops the background thread and writes the remaining spans
+    def stop(self):
+        self.keep_running = False
+        self.wake.set()
+        self.thread.join()
+        self.flush()
+        if self.dropped > 0:
+            print "Warning: %d spans were dropped as the trace buffer was full" % (self.dropped)
+        self.output.close()
+# end of class tracer
+
+# switches tracing on, returns the tracer
+def start(path, sample_every = tracer.SAMPLE_EVERY, capacity = tracer.CAPACITY, flush_interval = tracer.FLUSH_INTERVAL):
+    global active
+    if active is not None:
+        active.stop()
+    active = tracer(path, sample_every, capacity, flush_interval)
+    return active
+
+# switches tracing off
+def stop():
+    global active
+    if active is not None:
+        tr = active
+        active = None
+        tr.stop()
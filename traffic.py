@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# generated traffic for reproducible load (transfer type 'G' of a node)
+# the packets arrive according to a model and wait in a backlog until the node sends them:
+#   saturated                       a packet is always available
+#   cbr:<rate>                      constant bit rate, rate in packets per second
+#   poisson:<rate>                  exponentially distributed gaps between the packets
+#   onoff:<rate>:<on>:<off>         constant rate during on periods, the on and off periods are exponentially distributed with the given means in seconds
+# when no packet is waiting, an empty one is handed out
+# every packet starts with HEADER (sequence number, time of arrival, CRC32 of the rest), the rest is taken from a pool of
+# pseudo-random bytes which is generated from the seed once, so creating a packet needs no system call
+# traffic_checker counts the received, lost and corrupted packets and the latency without knowing the sent data
+# after a long stall only the arrivals which still fit into the backlog are generated, the models skip the others (see skip())
+
+import collections, math, time, zlib
+from struct import Struct
+from numpy import uint8
+from numpy.random import RandomState
+from duplicate_filter import duplicate_filter
+
+HEADER = Struct('!IdI')
+POOL_SIZE = 64 * 1024
+STRIDE = 211        # offset in the pool between packets with consecutive sequence numbers
+
+# the packets are created when they are needed, there are no arrivals
+class saturated:
+    def __init__(self, rng):
+        pass
+# end of class saturated
+
+class cbr:
+    def __init__(self, rng, rate):
+        self.gap = 1.0 / rate
+        self.mean_gap = self.gap
+
+    # returns the time of the first arrival after the one at time last
+    def next_arrival(self, last):
+        return last + self.gap
+
+    # skips the arrivals from the one at time arrival until time until
+    # returns (time of the first arrival not before until, number of skipped arrivals)
+    def skip(self, arrival, until):
+        steps = max(0, int(math.ceil((until - arrival) / self.gap)))
+        return (arrival + steps * self.gap, steps)
+# end of class cbr
+
+class poisson:
+    def __init__(self, rng, rate):
+        self.rng = rng
+        self.mean_gap = 1.0 / rate
+
+    def next_arrival(self, last):
+        return last + self.rng.exponential(self.mean_gap)
+
+    # the gaps are memoryless, so the number of skipped arrivals is drawn at once and the next one follows until
+    def skip(self, arrival, until):
+        if until <= arrival:
+            return (arrival, 0)
+        return (until + self.rng.exponential(self.mean_gap), 1 + self.rng.poisson((until - arrival) / self.mean_gap))
+# end of class poisson
+
+class on_off:
+    def __init__(self, rng, rate, mean_on, mean_off):
+        self.rng = rng
+        self.gap = 1.0 / rate
+        self.mean_on = mean_on
+        self.mean_off = mean_off
+        self.mean_gap = self.gap * (mean_on + mean_off) / mean_on
+        self.on_end = None  # end of the current on period
+
+    def next_arrival(self, last):
+        if self.on_end is None:
+            self.on_end = last + self.rng.exponential(self.mean_on)
+        arrival = last + self.gap
+        while arrival > self.on_end:    # the next packet arrives in one of the following on periods
+            start = self.on_end + self.rng.exponential(self.mean_off)
+            self.on_end = start + self.rng.exponential(self.mean_on)
+            arrival = start
+        return arrival
+
+    # the arrivals of the skipped on periods are counted without generating them
+    def skip(self, arrival, until):
+        if self.on_end is None:
+            self.on_end = arrival + self.rng.exponential(self.mean_on)
+        skipped = 0
+        while True:
+            if until <= self.on_end:
+                steps = max(0, int(math.ceil((until - arrival) / self.gap)))
+                if arrival + steps * self.gap <= self.on_end:
+                    return (arrival + steps * self.gap, skipped + steps)
+            skipped += int((self.on_end - arrival) / self.gap) + 1     # all arrivals of the current on period
+            arrival = self.on_end + self.rng.exponential(self.mean_off)
+            self.on_end = arrival + self.rng.exponential(self.mean_on)
+# end of class on_off
+
+MODELS = {'saturated': (saturated, 0), 'cbr': (cbr, 1), 'poisson': (poisson, 1), 'onoff': (on_off, 3)}
+
+# returns the arrival model described by spec, e.g. 'poisson:200', raises ValueError if spec is invalid
+def make_model(spec, rng):
+    parts = spec.split(':')
+    if parts[0] not in MODELS:
+        raise ValueError("unknown traffic model: " + parts[0])
+    (model, num) = MODELS[parts[0]]
+    if len(parts) - 1 != num:
+        raise ValueError("traffic model %s needs %d parameters" % (parts[0], num))
+    parameters = [float(value) for value in parts[1:]]
+    for value in parameters:
+        if value <= 0:
+            raise ValueError("the parameters of a traffic model have to be positive")
+    return model(rng, *parameters)
+
+# source of generated packets, it has the methods of the sources in data_sources.py
+class traffic_source:
+    MAX_BACKLOG = 10000     # packets waiting to be sent, the oldest ones are dropped when there are more
+
+    def __init__(self, spec = 'saturated', seed = 0):
+        rng = RandomState(seed)
+        self.model = make_model(spec, rng)
+        self.saturated = isinstance(self.model, saturated)
+        self.pool = rng.randint(0, 256, POOL_SIZE).astype(uint8).tostring()
+        self.pool = self.pool + self.pool   # a packet starting near the end of the pool continues at its beginning
+        self.sequence_number = 0
+        self.backlog = collections.deque()  # arrival times of the waiting packets
+        self.next = None        # time of the next arrival
+        self.overflows = 0      # packets dropped from the backlog
+
+    # moves the packets which have arrived until now into the backlog
+    def arrive(self, now):
+        if self.next is None:
+            self.next = now     # the first packet arrives at the start
+        # the packets arriving before the last MAX_BACKLOG ones (on average) would be dropped anyway, so they are skipped
+        limit = now - self.MAX_BACKLOG * self.model.mean_gap
+        if self.next < limit:
+            (self.next, skipped) = self.model.skip(self.next, limit)
+            self.overflows += skipped
+        backlog = self.backlog
+        next_arrival = self.model.next_arrival
+        arrival = self.next
+        while arrival <= now:
+            backlog.append(arrival)
+            arrival = next_arrival(arrival)
+        self.next = arrival
+        while len(backlog) > self.MAX_BACKLOG:
+            backlog.popleft()
+            self.overflows += 1
+
+    def read(self, size):
+        now = time.time()
+        if self.saturated:
+            arrival = now
+        else:
+            self.arrive(now)
+            if not self.backlog:
+                return ''
+            arrival = self.backlog.popleft()
+        number = self.sequence_number
+        self.sequence_number = number + 1
+        length = min(size - HEADER.size, POOL_SIZE)
+        offset = (number * STRIDE) % POOL_SIZE
+        body = self.pool[offset:offset + length]
+        return HEADER.pack(number & 0xffffffff, arrival, zlib.crc32(body) & 0xffffffff) + body
+
+    def remaining(self):
+        return None
+
+    def close(self):
+        pass
+# end of class traffic_source
+
+# checks the generated packets which were received
+# duplicates are detected within a window of sequence numbers, a packet which is further behind the highest one counts as duplicate
+class traffic_checker:
+    WINDOW = 4096   # sequence numbers behind the highest one which are remembered
+
+    def __init__(self, window = WINDOW):
+        self.received = 0       # correct packets, duplicates are counted once
+        self.duplicates = 0
+        self.corrupted = 0      # packets whose CRC32 is wrong or which are too short
+        self.empty = 0          # packets sent while the generator had nothing to send
+        self.highest = -1       # highest sequence number received so far
+        self.numbers = duplicate_filter(0, 0xffffffff, window)
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+    def check(self, data):
+        if data == '':
+            self.empty += 1
+            return
+        if len(data) < HEADER.size:
+            self.corrupted += 1
+            return
+        (number, arrival, crc) = HEADER.unpack_from(data)
+        if zlib.crc32(data[HEADER.size:]) & 0xffffffff != crc:
+            self.corrupted += 1
+            return
+        if not self.numbers.first(number):
+            self.duplicates += 1
+            return
+        self.received += 1
+        if number > self.highest:
+            self.highest = number
+        latency = time.time() - arrival     # only meaningful if the clocks of both nodes are synchronised
+        self.latency_sum += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+    # packets with a lower sequence number than the highest one which were not received
+    def lost(self):
+        return self.highest + 1 - self.received
+
+    def summary(self):
+        if self.received > 0:
+            mean = self.latency_sum / self.received
+        else:
+            mean = 0.0
+        return "received %d, lost %d, corrupted %d, duplicates %d, latency mean %.1f ms, max %.1f ms" % \
+               (self.received, self.lost(), self.corrupted, self.duplicates, mean * 1000, self.latency_max * 1000)
+# end of class traffic_checker
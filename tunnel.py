@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2010  Sebastian Bittl
+# This file is part of Relaying Schemes Implementation.
+
+# Relaying Schemes Implementation is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# Relaying Schemes Implementation is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with Foobar.  If not, see <http://www.gnu.org/licenses/>.
+
+# tunnel for the datagrams of ordinary applications through the relay network (transfer type 'T' of a node)
+# tunnel_source receives datagrams on a local socket and cuts them into fragments which fill the packets of the node,
+# tunnel_sink on the other node puts the fragments together again and sends the datagrams to a local socket in the order in which
+# they are completed, like UDP the tunnel neither repeats lost datagrams (unless ARQ is used) nor restores their order
+# a socket is given as 'udp:<host>:<port>' or 'unix:<path>'
+# every fragment starts with FRAGMENT (datagram ID, offset in the datagram, length of the datagram, length of the fragment),
+# so a packet can hold the end of one datagram and the beginning of the next one and fragments may arrive in any order
+# the sockets are non-blocking, the source reads all waiting datagrams when the node takes a packet, but only while its
+# queue is not full, so the local socket buffer fills up when the link is too slow (a UNIX socket blocks the application then)
+
+import collections, errno, os, socket, time
+from struct import Struct
+
+FRAGMENT = Struct('!HHHH')
+MAX_DATAGRAM = 65535    # the length of a datagram has to fit into FRAGMENT
+RECEIVE_BUFFER = 4 * 1024 * 1024   # bytes, the socket of the source holds the datagrams which arrive while the node is busy
+LISTEN = 'udp:127.0.0.1:7000'   # default socket of the source
+DELIVER = 'udp:127.0.0.1:7001'  # default socket the sink sends to
+
+# returns (address family, address) of a socket given as 'udp:<host>:<port>' or 'unix:<path>', raises ValueError if it is invalid
+def parse_address(spec):
+    parts = spec.split(':', 1)
+    if (parts[0] == 'unix') and (len(parts) == 2):
+        return (socket.AF_UNIX, parts[1])
+    if parts[0] == 'udp':
+        host_port = spec.split(':')
+        if len(host_port) == 3:
+            return (socket.AF_INET, (host_port[1], int(host_port[2])))
+    raise ValueError("invalid socket address: " + spec)
+
+# receives the datagrams of the applications, it has the methods of the sources in data_sources.py
+class tunnel_source:
+    QUEUE_LIMIT = 256 * 1024    # bytes of datagrams waiting to be sent, no datagrams are read from the socket while there are more
+
+    def __init__(self, spec = LISTEN, queue_limit = QUEUE_LIMIT):
+        (family, address) = parse_address(spec)
+        if (family == socket.AF_UNIX) and os.path.exists(address):
+            os.unlink(address)  # left over from an earlier run
+        self.family = family
+        self.address = address
+        self.socket = socket.socket(family, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)     # limited by the kernel to net.core.rmem_max
+        self.socket.bind(address)
+        self.socket.setblocking(0)
+        self.queue_limit = queue_limit
+        self.queue = collections.deque()    # [datagram ID, datagram, offset of the first byte which was not sent yet]
+        self.queued_bytes = 0
+        self.next_id = 0
+        self.datagrams = 0      # received from the applications
+        self.errors = 0
+
+    # reads the waiting datagrams from the socket until the queue is full
+    def receive(self):
+        receive = self.socket.recv
+        while self.queued_bytes < self.queue_limit:
+            try:
+                datagram = receive(MAX_DATAGRAM)
+            except socket.error, error:
+                if error.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    self.errors += 1
+                break
+            self.queue.append([self.next_id, datagram, 0])
+            self.next_id = (self.next_id + 1) & 0xffff
+            self.queued_bytes += len(datagram)
+            self.datagrams += 1
+
+    # returns a packet with as many fragments as fit into size bytes, '' if no datagram is waiting
+    def read(self, size):
+        self.receive()
+        queue = self.queue
+        parts = []
+        space = size
+        while queue and (space > FRAGMENT.size):
+            entry = queue[0]
+            (datagram_id, datagram, offset) = entry
+            length = min(len(datagram) - offset, space - FRAGMENT.size)
+            parts.append(FRAGMENT.pack(datagram_id, offset, len(datagram), length))
+            parts.append(datagram[offset:offset + length])
+            space -= FRAGMENT.size + length
+            if offset + length == len(datagram):
+                queue.popleft()
+                self.queued_bytes -= len(datagram)
+            else:
+                entry[2] = offset + length
+        return ''.join(parts)
+
+    def remaining(self):
+        return None
+
+    def close(self):
+        self.socket.close()
+        if self.family == socket.AF_UNIX:
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+# end of class tunnel_source
+
+# puts the fragments together again and sends the complete datagrams to a local socket
+class tunnel_sink:
+    TIMEOUT = 2.0       # in seconds, an incomplete datagram is dropped after this time
+    MAX_PENDING = 1024  # incomplete datagrams, the oldest ones are dropped when there are more
+
+    def __init__(self, spec = DELIVER, timeout = TIMEOUT):
+        (family, address) = parse_address(spec)
+        self.address = address
+        self.socket = socket.socket(family, socket.SOCK_DGRAM)
+        self.socket.setblocking(0)
+        self.timeout = timeout
+        self.pending = {}       # datagram ID -> [buffer, received bytes, offsets of the received fragments, time of the first fragment]
+        self.last_expiry = time.time()
+        self.datagrams = 0      # sent to the application
+        self.incomplete = 0     # datagrams which were dropped as fragments were missing
+        self.malformed = 0      # packets whose fragments could not be parsed
+        self.dropped = 0        # complete datagrams which could not be sent, e.g. as nobody listens
+
+    # takes the fragments of a received packet
+    def write(self, packet_id, data):
+        now = time.time()
+        position = 0
+        end = len(data) - FRAGMENT.size
+        pending = self.pending
+        while position <= end:
+            (datagram_id, offset, total, length) = FRAGMENT.unpack_from(data, position)
+            position += FRAGMENT.size
+            fragment = data[position:position + length]
+            position += length
+            if (len(fragment) != length) or (offset + length > total):
+                self.malformed += 1
+                break
+            if length == total:     # the datagram fits into a single fragment
+                self.deliver(fragment)
+                continue
+            entry = pending.get(datagram_id)
+            if (entry is None) or (len(entry[0]) != total) or (now - entry[3] > self.timeout):
+                if entry is not None:
+                    self.incomplete += 1    # the ID is used again
+                entry = [bytearray(total), 0, set(), now]
+                pending[datagram_id] = entry
+            if offset not in entry[2]:  # a fragment may be received twice
+                entry[2].add(offset)
+                entry[0][offset:offset + length] = fragment
+                entry[1] += length
+                if entry[1] == total:
+                    del pending[datagram_id]
+                    self.deliver(str(entry[0]))
+        if (now - self.last_expiry > self.timeout) or (len(pending) > self.MAX_PENDING):
+            self.expire(now)
+
+    # drops the incomplete datagrams which are too old, or the oldest ones if there are too many
+    def expire(self, now):
+        pending = self.pending
+        for datagram_id in pending.keys():
+            if now - pending[datagram_id][3] > self.timeout:
+                del pending[datagram_id]
+                self.incomplete += 1
+        if len(pending) > self.MAX_PENDING:
+            oldest = sorted(pending.keys(), key=lambda datagram_id: pending[datagram_id][3])
+            for datagram_id in oldest[0:len(pending) - self.MAX_PENDING]:
+                del pending[datagram_id]
+                self.incomplete += 1
+        self.last_expiry = now
+
+    def deliver(self, datagram):
+        try:
+            self.socket.sendto(datagram, self.address)
+            self.datagrams += 1
+        except socket.error:
+            self.dropped += 1
+
+    def close(self):
+        self.socket.close()
+# end of class tunnel_sink